@@ -1,8 +1,5 @@
 # MultipleFiles/utils.py
 import os
-import json
-import asyncio
-import httpx # Make sure httpx is in your requirements.py
 from twilio.rest import Client
 
 TWILIO_SID = os.getenv("TWILIO_SID")
@@ -10,11 +7,6 @@ TWILIO_TOKEN = os.getenv("TWILIO_TOKEN")
 TWILIO_FROM = os.getenv("TWILIO_FROM")
 SMS_RECIPIENT = os.getenv("SMS_RECIPIENT")  # comma separated
 
-# This URL points to the HTTP endpoint of our websocket_server.py
-# which will then broadcast the message to all connected WebSocket clients.
-# 'websocket' is the service name in docker-compose.yml
-HTTP_BROADCAST_URL = os.getenv("HTTP_BROADCAST_URL", "http://websocket:8002")
-
 def send_sms_via_twilio(body, to):
     if not (TWILIO_SID and TWILIO_TOKEN and TWILIO_FROM):
         print("Twilio not configured. Skipping SMS.")
@@ -36,32 +28,7 @@ def send_sms_if_needed(alert_id, prob):
         if r.strip():
             send_sms_via_twilio(f"ALERT {alert_id}: coastal threat prob {prob:.2f}", r.strip())
 
-async def _send_to_websocket_server(payload: dict):
-    """Internal helper to send data to the WebSocket server's HTTP endpoint."""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(HTTP_BROADCAST_URL, json=payload, timeout=5)
-            response.raise_for_status() # Raise an exception for 4xx/5xx responses
-            print(f"Successfully sent to WebSocket server: {payload['type']}")
-    except httpx.RequestError as exc:
-        print(f"An error occurred while requesting {exc.request.url!r}: {exc}")
-    except httpx.HTTPStatusError as exc:
-        print(f"Error response {exc.response.status_code} while requesting {exc.request.url!r}: {exc.response.text}")
-    except Exception as e:
-        print(f"Unexpected error sending to WebSocket server: {e}")
-
-def broadcast_alert(payload: dict):
-    """Broadcasts an alert message to connected WebSocket clients."""
-    # We need to run this in the event loop, but from a synchronous context (FastAPI route)
-    # So, we use asyncio.create_task or similar.
-    # For simplicity in this example, we'll assume it's called from a background task.
-    # The ingest.py already uses background_tasks.add_task, which is good.
-    payload["type"] = "alert" # Add type for frontend to distinguish
-    asyncio.create_task(_send_to_websocket_server(payload))
-    print("Scheduled alert broadcast:", payload)
-
-def broadcast_reading(payload: dict):
-    """Broadcasts a sensor reading message to connected WebSocket clients."""
-    payload["type"] = "reading" # Add type for frontend to distinguish
-    asyncio.create_task(_send_to_websocket_server(payload))
-    print("Scheduled reading broadcast:", payload)
+# The relay client lives in app/utils.py; this legacy module re-exports it instead of keeping a copy.
+# It posts to app.utils.HTTP_BROADCAST_URL (default http://localhost:8002/broadcast): docker-compose
+# must set HTTP_BROADCAST_URL=http://websocket:8002 to reach the relay service.
+from app.utils import BroadcastClient, get_broadcast_client, broadcast_alert, broadcast_reading
@@ -0,0 +1,80 @@
+# app/alerts_cache.py
+"""In-process cache of serialized /alerts responses.
+
+Entries are keyed by the request's query parameters. The ETag is a hash of the
+response body, so it is the same in every worker process and across restarts for
+as long as the alerts it lists are unchanged. A poll whose If-None-Match matches a
+cached entry is answered with 304 straight from memory; after a cache miss the query
+runs and a matching tag still gets a 304 without resending the body.
+
+Ingest drops every entry when it commits an Alert. Each process keeps its own
+cache, so entries also expire after ALERTS_CACHE_TTL_S to bound how stale a worker
+can be when alerts are inserted by another process.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ALERTS_CACHE_TTL_S = float(os.getenv("ALERTS_CACHE_TTL_S", "5"))
+ALERTS_CACHE_MAX_ENTRIES = int(os.getenv("ALERTS_CACHE_MAX_ENTRIES", "256"))
+
+def body_etag(body: bytes) -> str:
+    """Returns the (unquoted) entity tag of a serialized response body."""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+class ResponseCache:
+    """Small LRU of (etag, body bytes, headers) keyed by query parameters."""
+
+    def __init__(self, ttl_s=ALERTS_CACHE_TTL_S, max_entries=ALERTS_CACHE_MAX_ENTRIES):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0 # bumped by invalidate()
+
+    @staticmethod
+    def make_key(args) -> tuple:
+        """Normalizes query parameters (a MultiDict or dict) into a hashable key."""
+        items = args.items(multi=True) if hasattr(args, "getlist") else args.items()
+        return tuple(sorted(items))
+
+    def generation(self) -> int:
+        """Snapshot to pass to put(), taken before the database is queried."""
+        with self._lock:
+            return self._generation
+
+    def get(self, key):
+        """Returns (etag, body, headers) of a live cached response, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_s:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2], entry[3]
+
+    def put(self, key, generation: int, etag: str, body: bytes, headers: dict):
+        """Stores a response unless an invalidation happened since `generation` was taken."""
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic(), etag, body, headers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """Drops every cached response; called after a new Alert is committed."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+alerts_cache = ResponseCache()
+
+def invalidate_alerts_cache():
+    """Marks cached /alerts responses stale after an Alert insert."""
+    alerts_cache.invalidate()
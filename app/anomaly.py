@@ -0,0 +1,259 @@
+# app/anomaly.py
+"""Streaming per-source anomaly detection for incoming readings.
+
+For every (source, feature) the detector keeps a running mean and variance
+(Welford), an EWMA and the running statistics of the rate of change between
+consecutive readings. Each reading updates them in constant time and memory, and
+a value or rate more than ANOMALY_Z_THRESHOLD standard deviations from its running
+mean is reported. Nothing is read from the database. State is checkpointed to
+ANOMALY_STATE_PATH so a restart does not have to re-learn every source.
+
+Scoring and learning are separate steps: ingest scores readings with evaluate(),
+which leaves the baselines untouched, and folds them in with record() only once they
+are committed, so a rolled-back transaction never shifts a baseline.
+"""
+import json
+import math
+import os
+import threading
+from datetime import datetime, timezone
+from .models import READING_FEATURES
+
+# Opt-in: the detector writes alerts and a state file, so it stays off unless enabled
+ANOMALY_DETECTION_ENABLED = os.getenv("ANOMALY_DETECTION", "false").lower() in ("1", "true", "yes")
+ANOMALY_Z_THRESHOLD = float(os.getenv("ANOMALY_Z_THRESHOLD", "4"))
+ANOMALY_MIN_SAMPLES = int(os.getenv("ANOMALY_MIN_SAMPLES", "30"))    # readings per source before anything is flagged
+ANOMALY_EWMA_ALPHA = float(os.getenv("ANOMALY_EWMA_ALPHA", "0.1"))
+# Runtime state lives under DATA_DIR (relative to the working directory), not in the package
+DATA_DIR = os.getenv("DATA_DIR", "data")
+ANOMALY_STATE_PATH = os.getenv("ANOMALY_STATE_PATH", os.path.join(DATA_DIR, "anomaly_state.json"))
+ANOMALY_CHECKPOINT_S = float(os.getenv("ANOMALY_CHECKPOINT_S", "30"))  # 0 disables checkpointing
+
+class FeatureStats:
+    """Incremental statistics of one feature of one source."""
+    __slots__ = ("n", "mean", "m2", "ewma", "last_value", "last_ts", "rate_n", "rate_mean", "rate_m2")
+
+    def __init__(self, n=0, mean=0.0, m2=0.0, ewma=None, last_value=None, last_ts=None,
+                 rate_n=0, rate_mean=0.0, rate_m2=0.0):
+        self.n = n
+        self.mean = mean
+        self.m2 = m2
+        self.ewma = ewma
+        self.last_value = last_value
+        self.last_ts = last_ts
+        self.rate_n = rate_n
+        self.rate_mean = rate_mean
+        self.rate_m2 = rate_m2
+
+    @staticmethod
+    def _zscore(value, n, mean, m2, min_samples):
+        if n < min_samples or n < 2:
+            return None
+        std = math.sqrt(m2 / (n - 1))
+        return (value - mean) / std if std > 0 else None
+
+    def copy(self):
+        return FeatureStats(*self.to_list())
+
+    def update(self, value: float, ts: float, min_samples: int, alpha: float):
+        """Folds in one value; returns (zscore, rate, rate_zscore) against the state before it.
+
+        A value older than the newest one already seen is ignored (all three are None),
+        so late readings cannot move last_ts backwards or produce negative-time rates.
+        """
+        if self.last_ts is not None and ts < self.last_ts:
+            return None, None, None
+        zscore = self._zscore(value, self.n, self.mean, self.m2, min_samples)
+
+        # Rate of change per minute since the previous reading of this source
+        rate = rate_zscore = None
+        if self.last_ts is not None and ts > self.last_ts:
+            rate = (value - self.last_value) * 60.0 / (ts - self.last_ts)
+            rate_zscore = self._zscore(rate, self.rate_n, self.rate_mean, self.rate_m2, min_samples)
+            self.rate_n += 1
+            delta = rate - self.rate_mean
+            self.rate_mean += delta / self.rate_n
+            self.rate_m2 += delta * (rate - self.rate_mean)
+
+        # Welford's update of mean and sum of squared deviations
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+        self.ewma = value if self.ewma is None else alpha * value + (1 - alpha) * self.ewma
+        self.last_value = value
+        self.last_ts = ts
+        return zscore, rate, rate_zscore
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.n - 1)) if self.n > 1 else 0.0
+
+    def to_list(self) -> list:
+        return [getattr(self, name) for name in self.__slots__]
+
+class AnomalyDetector:
+    """Per-source streaming detector; evaluate() and record() are safe to call from request threads."""
+
+    def __init__(self, z_threshold=ANOMALY_Z_THRESHOLD, min_samples=ANOMALY_MIN_SAMPLES,
+                 alpha=ANOMALY_EWMA_ALPHA, features=READING_FEATURES):
+        self.z_threshold = z_threshold
+        self.min_samples = min_samples
+        self.alpha = alpha
+        self.features = features
+        self._state = {} # source -> {feature: FeatureStats}
+        self._lock = threading.Lock()
+        self._counts = {"observed": 0, "anomalies": 0}
+
+    def _fold(self, stats: dict, source: str, values: dict, ts: float) -> list:
+        """Folds one reading into a source's {feature: FeatureStats}; returns its anomalies."""
+        anomalies = []
+        for feature in self.features:
+            value = values.get(feature)
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            s = stats.get(feature)
+            if s is None:
+                s = stats[feature] = FeatureStats()
+            zscore, rate, rate_zscore = s.update(float(value), ts, self.min_samples, self.alpha)
+            for kind, score in (("zscore", zscore), ("slope", rate_zscore)):
+                if score is not None and abs(score) > self.z_threshold:
+                    anomalies.append({
+                        "source": source,
+                        "feature": feature,
+                        "kind": kind,
+                        "value": value,
+                        "score": round(score, 2),
+                        "rate_per_min": rate,
+                        "mean": s.mean,
+                        "std": s.std,
+                        "ewma": s.ewma,
+                        "samples": s.n,
+                    })
+        return anomalies
+
+    @staticmethod
+    def _epoch(timestamp: datetime) -> float:
+        return (timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)).timestamp()
+
+    def evaluate(self, readings: list) -> list:
+        """Scores (source, values, timestamp) readings in order without changing any baseline.
+
+        Returns one list of anomalies per reading. Each anomaly is a dict with the feature,
+        its value, the kind ("zscore" for the level, "slope" for the rate of change), the
+        score and the running statistics. Later readings of a source are scored against
+        copies that include the earlier ones, as record() will fold them in.
+        """
+        scratch = {}
+        results = []
+        with self._lock:
+            for source, values, timestamp in readings:
+                stats = scratch.get(source)
+                if stats is None:
+                    stats = scratch[source] = {f: s.copy() for f, s in self._state.get(source, {}).items()}
+                results.append(self._fold(stats, source, values, self._epoch(timestamp)))
+        return results
+
+    def record(self, readings: list, anomalies: int = 0):
+        """Folds committed (source, values, timestamp) readings into the baselines."""
+        with self._lock:
+            for source, values, timestamp in readings:
+                stats = self._state.get(source)
+                if stats is None:
+                    stats = self._state[source] = {}
+                self._fold(stats, source, values, self._epoch(timestamp))
+            self._counts["observed"] += len(readings)
+            self._counts["anomalies"] += anomalies
+
+    def observe(self, source: str, values: dict, timestamp: datetime) -> list:
+        """Scores and records one reading at once; returns the anomalies it shows."""
+        anomalies = self.evaluate([(source, values, timestamp)])[0]
+        self.record([(source, values, timestamp)], len(anomalies))
+        return anomalies
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sources": len(self._state), **self._counts,
+                    "config": {"z_threshold": self.z_threshold, "min_samples": self.min_samples,
+                               "ewma_alpha": self.alpha}}
+
+    def save(self, path=ANOMALY_STATE_PATH):
+        """Writes the state atomically (temp file + rename) so a crash never leaves half a file."""
+        with self._lock:
+            data = {source: {f: s.to_list() for f, s in stats.items()} for source, stats in self._state.items()}
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"slots": list(FeatureStats.__slots__), "state": data}, f)
+        os.replace(tmp, path)
+
+    def load(self, path=ANOMALY_STATE_PATH) -> bool:
+        """Restores a checkpoint written by save(); returns False if there is none."""
+        if not os.path.exists(path):
+            return False
+        with open(path) as f:
+            data = json.load(f)
+        slots = data["slots"]
+        state = {
+            source: {feature: FeatureStats(**dict(zip(slots, values))) for feature, values in stats.items()}
+            for source, stats in data["state"].items()
+        }
+        with self._lock:
+            self._state = state
+        return True
+
+class AnomalyCheckpointJob:
+    """Background thread that periodically saves the detector state."""
+
+    def __init__(self, detector, path=ANOMALY_STATE_PATH, interval_s=ANOMALY_CHECKPOINT_S):
+        self.detector = detector
+        self.path = path
+        self.interval_s = interval_s
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="anomaly-checkpoint", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the thread and writes a final checkpoint."""
+        self._stop.set()
+        self.run_once()
+
+    def run_once(self):
+        try:
+            self.detector.save(self.path)
+        except Exception as e:
+            print(f"Anomaly checkpoint failed: {e}")
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.run_once()
+
+# Process-wide detector, restored from the last checkpoint on first use
+_detector = None
+_detector_lock = threading.Lock()
+_checkpoint_job = None
+
+def get_detector() -> AnomalyDetector:
+    """Returns the shared detector, loading its checkpoint and starting checkpointing on first call."""
+    global _detector, _checkpoint_job
+    if _detector is None:
+        with _detector_lock:
+            if _detector is None:
+                detector = AnomalyDetector()
+                try:
+                    if detector.load():
+                        print(f"Anomaly detector state restored from {ANOMALY_STATE_PATH}")
+                except Exception as e:
+                    print(f"Could not restore anomaly state from {ANOMALY_STATE_PATH}: {e}")
+                if ANOMALY_CHECKPOINT_S > 0:
+                    _checkpoint_job = AnomalyCheckpointJob(detector).start()
+                _detector = detector
+    return _detector
+
+def checkpoint_anomaly_state():
+    """Saves the detector state now (called at shutdown)."""
+    if _checkpoint_job is not None:
+        _checkpoint_job.stop()
@@ -0,0 +1,131 @@
+# app/export.py
+"""Streaming export of sensor readings as NDJSON or CSV, optionally gzip-compressed.
+
+Rows are pulled through a server-side cursor with yield_per and encoded one at a
+time, so memory stays flat however many readings match.
+
+    python -m app.export --format csv --gzip --source tide_gauge_1 --from 2026-01-01 -o readings.csv.gz
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+import zlib
+from sqlalchemy import select
+from .database import SessionLocal
+from .models import SensorReading, READING_FEATURES
+from .timeutils import parse_utc
+
+EXPORT_FORMATS = ("ndjson", "csv")
+EXPORT_CHUNK_ROWS = 1000
+WRITE_CHUNK_BYTES = 64 * 1024
+
+CSV_COLUMNS = ["id", "sensor_type", "source", "timestamp", *READING_FEATURES, "extra"]
+
+def iter_readings(source=None, sensor_type=None, start=None, end=None,
+                  chunk_rows=EXPORT_CHUNK_ROWS, session_factory=SessionLocal):
+    """Yields one dict per matching reading, oldest first, using a server-side cursor."""
+    columns = [SensorReading.id, SensorReading.sensor_type, SensorReading.source, SensorReading.timestamp,
+               *(getattr(SensorReading, f) for f in READING_FEATURES), SensorReading.extra, SensorReading.values]
+    stmt = select(*columns).order_by(SensorReading.id)
+    if source:
+        stmt = stmt.where(SensorReading.source == source)
+    if sensor_type:
+        stmt = stmt.where(SensorReading.sensor_type == sensor_type)
+    if start:
+        stmt = stmt.where(SensorReading.timestamp >= start)
+    if end:
+        stmt = stmt.where(SensorReading.timestamp < end)
+
+    db = session_factory()
+    try:
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_rows))
+        for row in result:
+            record = row._asdict()
+            legacy = record.pop("values")
+            if legacy is not None:
+                # Rows not yet migrated to the typed layout
+                record.update(SensorReading.split_values(legacy))
+            record["timestamp"] = record["timestamp"].isoformat() if record["timestamp"] else None
+            yield record
+    finally:
+        db.close()
+
+def encode_ndjson(records):
+    pending = []
+    size = 0
+    for record in records:
+        values = {k: record[k] for k in READING_FEATURES if record[k] is not None}
+        values.update(record["extra"] or {})
+        line = json.dumps({
+            "id": record["id"],
+            "sensor_type": record["sensor_type"],
+            "source": record["source"],
+            "timestamp": record["timestamp"],
+            "values": values,
+        }).encode("utf-8") + b"\n"
+        pending.append(line)
+        size += len(line)
+        if size >= WRITE_CHUNK_BYTES:
+            yield b"".join(pending)
+            pending = []
+            size = 0
+    if pending:
+        yield b"".join(pending)
+
+def encode_csv(records):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_COLUMNS)
+    for record in records:
+        extra = record["extra"]
+        writer.writerow([record[c] for c in CSV_COLUMNS[:-1]] + [json.dumps(extra) if extra else ""])
+        # Hand the text buffer off in fixed-size pieces so it never grows
+        if buffer.tell() >= WRITE_CHUNK_BYTES:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def gzip_stream(chunks):
+    """Gzip-compresses a byte stream incrementally."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31 writes a gzip header
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+def export_stream(fmt="ndjson", compress=False, **filters):
+    """Returns an iterator of encoded (and optionally gzipped) export bytes."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {EXPORT_FORMATS}")
+    encoder = encode_csv if fmt == "csv" else encode_ndjson
+    stream = encoder(iter_readings(**filters))
+    return gzip_stream(stream) if compress else stream
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream sensor readings to NDJSON or CSV.")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true")
+    parser.add_argument("--source")
+    parser.add_argument("--sensor-type")
+    parser.add_argument("--from", dest="start")
+    parser.add_argument("--to", dest="end")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    stream = export_stream(args.format, args.gzip, source=args.source, sensor_type=args.sensor_type,
+                           start=parse_utc(args.start), end=parse_utc(args.end))
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in stream:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,15 @@
 from flask import Flask, jsonify
 from .routes.ingest import ingest_bp
 from .routes.alerts import alerts_bp
+from .routes.readings import readings_bp
+from .routes.admin import admin_bp
 from .database import Base, engine, SessionLocal
 from . import models # Import models to ensure they are registered with Base
+from .ml.model import get_model, load_model_in_background, model_ready, ModelWatcher, MODEL_WATCH_INTERVAL_S
+from sqlalchemy import inspect
+from .rollups import RollupJob, ROLLUP_INTERVAL_S
+from .anomaly import checkpoint_anomaly_state
+import atexit
 import os
 import asyncio # Required for background tasks in utils.py
 
@@ -13,27 +20,56 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'a_very_secret_key_for_dev')
 # Register blueprints
 app.register_blueprint(ingest_bp)
 app.register_blueprint(alerts_bp)
+app.register_blueprint(readings_bp)
+app.register_blueprint(admin_bp)
 
 # Create database tables if they don't exist
 # In a production environment, you'd use migrations (e.g., Alembic)
 with app.app_context():
     Base.metadata.create_all(bind=engine)
+    # Columns added since a table was created come from the migration tool, not from startup
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        missing = {c.name for c in table.columns} - {c["name"] for c in inspector.get_columns(table.name)}
+        if missing:
+            print(f"[WARN] {table.name} is missing columns {sorted(missing)}; run `python -m app.migrate_readings`")
+    # create_all skips existing tables, so add any indexes introduced since they were created
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("Database tables checked/created.")
 
+# Load and warm the ML model off the import path so the server can start accepting
+# connections immediately; /ready reports when scoring is warm.
+load_model_in_background()
+
+# Hot-reload the model when the registry's CURRENT pointer changes (MODEL_WATCH_INTERVAL_S=0 disables)
+model_watcher = ModelWatcher().start() if MODEL_WATCH_INTERVAL_S > 0 else None
+
+# Keep the 1m/1h/1d reading rollups current in the background (ROLLUP_INTERVAL_S=0 disables)
+rollup_job = RollupJob().start() if ROLLUP_INTERVAL_S > 0 else None
+
+# Persist the streaming anomaly statistics on shutdown so a restart stays warm
+atexit.register(checkpoint_anomaly_state)
+
 @app.route("/")
 def root():
     return jsonify({"service": "coastal-threat-backend", "status": "ok"})
 
+@app.route("/ready")
+def ready():
+    """Readiness probe: 200 once the ML model is loaded and warm, 503 while it is still loading."""
+    if not model_ready():
+        return jsonify({"status": "loading"}), 503
+    model = get_model()
+    return jsonify({"status": "ready", "backend": model.backend, "model_version": model.version}), 200
+
 if __name__ == "__main__":
     try:
         print("[INFO] Starting backend application...")
-        # Train the ML model if it doesn't exist
-        from .ml.train_model import build_and_train
-        if not os.path.exists("app/ml/saved_model"):
-            print("[INFO] ML model not found. Training a new one...")
-            build_and_train()
-        else:
-            print("[INFO] ML model found. Skipping training.")
+        # Training never runs in the serving process; use `python -m app.ml.train_model`
+        if not model_ready():
+            print("[INFO] ML model is loading in the background; see /ready.")
 
         print("[INFO] Running Flask app on http://0.0.0.0:5000 ...")
         app.run(host="0.0.0.0", port=5000, debug=True)
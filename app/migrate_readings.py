@@ -0,0 +1,104 @@
+# app/migrate_readings.py
+"""Migrates sensor_readings from the JSON `values` blob to typed feature columns.
+
+Adds any missing typed columns and the (source, timestamp) index, then backfills
+existing rows in id-ordered chunks so the table is never locked or loaded whole.
+Also adds columns introduced on other tables since (alerts.model_version).
+Safe to re-run: only rows that still carry a `values` payload are touched, and with
+--keep-json only those whose typed columns are still all empty.
+
+    python -m app.migrate_readings --chunk-size 5000
+"""
+import argparse
+from sqlalchemy import inspect, select, update, bindparam, text, null
+from .database import engine, SessionLocal
+from .models import SensorReading, Alert
+
+TYPED_COLUMNS = {
+    "sea_level": "FLOAT",
+    "wind_speed": "FLOAT",
+    "salinity": "FLOAT",
+    "temp": "FLOAT",
+    "chl_a": "FLOAT",
+    "extra": "JSON",
+}
+
+def add_typed_columns(bind=engine):
+    """Adds missing typed columns and the composite index to an existing table."""
+    existing = {c["name"] for c in inspect(bind).get_columns(SensorReading.__tablename__)}
+    with bind.begin() as conn:
+        for name, sql_type in TYPED_COLUMNS.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE {SensorReading.__tablename__} ADD COLUMN {name} {sql_type}"))
+                print(f"Added column {name}")
+    for index in SensorReading.__table__.indexes:
+        index.create(bind=bind, checkfirst=True)
+
+def add_alert_columns(bind=engine):
+    """Adds alerts.model_version to a table created before model versioning; old rows stay NULL."""
+    existing = {c["name"] for c in inspect(bind).get_columns(Alert.__tablename__)}
+    if "model_version" not in existing:
+        with bind.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {Alert.__tablename__} ADD COLUMN model_version VARCHAR"))
+        print("Added column alerts.model_version")
+
+def backfill(chunk_size=5000, keep_json=False, session_factory=SessionLocal):
+    """Moves JSON payloads into typed columns chunk by chunk; returns the number of rows converted.
+
+    With keep_json the payload stays, so rows whose typed columns are already filled
+    are skipped; a payload with no values at all is converted again on every run.
+    """
+    table = SensorReading.__table__
+    pending = [table.c["values"].is_not(None)]
+    if keep_json:
+        pending += [table.c[name].is_(None) for name in TYPED_COLUMNS]
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values({name: bindparam(f"new_{name}") for name in TYPED_COLUMNS}
+                | ({} if keep_json else {"values": null()}))
+    )
+
+    converted = 0
+    last_id = 0
+    while True:
+        db = session_factory()
+        try:
+            # Keyset pagination on id keeps every chunk an index range scan
+            rows = db.execute(
+                select(table.c.id, table.c["values"])
+                .where(table.c.id > last_id, *pending)
+                .order_by(table.c.id)
+                .limit(chunk_size)
+            ).all()
+            if not rows:
+                break
+
+            params = []
+            for row_id, values in rows:
+                columns = {name: None for name in TYPED_COLUMNS}
+                columns.update(SensorReading.split_values(values))
+                params.append({"row_id": row_id, **{f"new_{k}": v for k, v in columns.items()}})
+            db.execute(stmt, params)
+            db.commit()
+        finally:
+            db.close()
+
+        converted += len(rows)
+        last_id = rows[-1][0]
+        print(f"Converted {converted} rows (last id {last_id})")
+    return converted
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert sensor_readings JSON payloads to typed columns.")
+    parser.add_argument("--chunk-size", type=int, default=5000)
+    parser.add_argument("--keep-json", action="store_true", help="leave the legacy `values` payload in place")
+    args = parser.parse_args()
+
+    add_typed_columns()
+    add_alert_columns()
+    total = backfill(chunk_size=args.chunk_size, keep_json=args.keep_json)
+    print(f"Done: {total} rows converted")
+
+if __name__ == "__main__":
+    main()
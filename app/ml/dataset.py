@@ -0,0 +1,121 @@
+# app/ml/dataset.py
+"""Streams sensor_readings out of the database as training chunks.
+
+Rows are read in id-ordered chunks (keyset pagination, like migrate_readings), each
+in its own short session, so memory stays bounded by the chunk size however many
+years of readings the table holds. Nothing here needs TensorFlow: train_model wraps
+these generators in a tf.data pipeline.
+
+Chunks come out in id (roughly time) order, so shuffle_chunks() re-mixes them through
+a row pool spanning several chunks before they reach the model.
+
+Readings carry no ground truth. Labels default to threat_label(), the same formula the
+synthetic data uses, so training on sensor_readings with it only exercises the pipeline
+(streaming, history features, fine-tuning) and re-learns that formula: it does not
+learn from real outcomes. Pass a label function backed by observed outcomes for that.
+"""
+import os
+import numpy as np
+from sqlalchemy import select
+from ..database import SessionLocal
+from ..models import SensorReading, READING_FEATURES
+from ..timeutils import as_utc
+from .temporal import TemporalFeatureStore, TEMPORAL_FEATURE_KEYS
+
+# Rows fetched per database round trip while streaming
+TRAIN_CHUNK_ROWS = int(os.getenv("TRAIN_CHUNK_ROWS", "50000"))
+
+# Rows held back by shuffle_chunks to mix neighbouring chunks (default: four chunks' worth)
+TRAIN_SHUFFLE_ROWS = int(os.getenv("TRAIN_SHUFFLE_ROWS", str(4 * TRAIN_CHUNK_ROWS)))
+
+def threat_label(X: np.ndarray) -> np.ndarray:
+    """Synthetic target probability per row; the temporal rule applies when X has the history columns."""
+    sea, wind, chl = X[:, 0], X[:, 1], X[:, 4]
+    y = (sea*0.6 + (wind/50)*0.3 + (chl/2)*0.4) / 2.0
+    if X.shape[1] > len(READING_FEATURES):
+        # Rising water over the last hour and sustained wind add to the threat
+        n_base = len(READING_FEATURES)
+        y = y + np.maximum(X[:, n_base + 2], 0)*1.5 + (X[:, n_base + 3]/50)*0.1
+    return np.clip(y, 0, 1) # Ensure probability is between 0 and 1
+
+def iter_reading_chunks(chunk_size=TRAIN_CHUNK_ROWS, since=None, until=None, session_factory=SessionLocal):
+    """Yields (sources, epoch_seconds, X) per chunk of readings, in id order.
+
+    X is an (n, len(READING_FEATURES)) float64 array with NaN for missing values.
+    Legacy rows that still keep their payload in the JSON `values` column are read
+    from it. `since`/`until` bound the reading timestamps (until is exclusive).
+    """
+    table = SensorReading.__table__
+    features = [table.c[name] for name in READING_FEATURES]
+    last_id = 0
+    while True:
+        stmt = select(table.c.id, table.c.source, table.c.timestamp, table.c["values"], *features) \
+            .where(table.c.id > last_id)
+        if since is not None:
+            stmt = stmt.where(table.c.timestamp >= since)
+        if until is not None:
+            stmt = stmt.where(table.c.timestamp < until)
+        db = session_factory()
+        try:
+            rows = db.execute(stmt.order_by(table.c.id).limit(chunk_size)).all()
+        finally:
+            db.close()
+        if not rows:
+            return
+
+        n = len(rows)
+        X = np.fromiter((np.nan if v is None else v for row in rows for v in row[4:]),
+                        dtype=np.float64, count=n * len(READING_FEATURES)).reshape(n, len(READING_FEATURES))
+        for i, row in enumerate(rows):
+            payload = row[3]
+            if payload: # not yet migrated to the typed columns
+                X[i] = [payload.get(k) if isinstance(payload.get(k), (int, float)) else np.nan
+                        for k in READING_FEATURES]
+        epochs = np.fromiter(
+            (as_utc(ts).timestamp() if ts else np.nan
+             for ts in (row[2] for row in rows)),
+            dtype=np.float64, count=n)
+        sources = [row[1] or "unknown" for row in rows]
+        last_id = rows[-1][0]
+        yield sources, epochs, X
+
+def with_history(sources, epochs, X, store: TemporalFeatureStore) -> np.ndarray:
+    """Appends the temporal feature columns, replaying the chunk through the per-source rings.
+
+    Must see chunks in order with one store per pass: history carries over between chunks.
+    """
+    n_base = len(READING_FEATURES)
+    out = np.zeros((len(X), n_base + len(TEMPORAL_FEATURE_KEYS)))
+    out[:, :n_base] = X
+    sea, wind = np.nan_to_num(X[:, 0]), np.nan_to_num(X[:, 1])
+    for i, source in enumerate(sources):
+        if not np.isnan(epochs[i]):
+            store.observe(source, epochs[i], sea[i], wind[i], out=out[i], offset=n_base)
+    return out
+
+def shuffle_chunks(chunks, buffer_rows=TRAIN_SHUFFLE_ROWS, seed=None):
+    """Re-mixes a stream of row chunks through a pool of `buffer_rows` rows.
+
+    Each incoming chunk joins the pool, the pool is shuffled and everything above
+    `buffer_rows` is emitted, so an emitted chunk draws on several source chunks (and
+    rows can linger for longer) rather than being one id range. Memory stays bounded by
+    the pool plus one chunk. The remainder is emitted, shuffled, at the end.
+    """
+    rng = np.random.default_rng(seed)
+    pool = None
+    for X in chunks:
+        pool = X if pool is None else np.concatenate([pool, X])
+        if len(pool) > buffer_rows:
+            pool = pool[rng.permutation(len(pool))]
+            yield pool[buffer_rows:]
+            pool = pool[:buffer_rows]
+    if pool is not None and len(pool):
+        yield pool[rng.permutation(len(pool))]
+
+def parse_chunk(X: np.ndarray, label_fn=threat_label):
+    """Turns a raw chunk into float32 (features, labels); stateless, so it can run in parallel.
+
+    Missing values become 0.0, as at serving time.
+    """
+    X = np.nan_to_num(np.asarray(X, dtype=np.float64), nan=0.0)
+    return X.astype(np.float32), label_fn(X).astype(np.float32)
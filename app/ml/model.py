@@ -1,42 +1,323 @@
 # app/ml/model.py
-import tensorflow as tf
 import numpy as np
 import os
+import threading
+import time
+from collections.abc import Mapping
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from queue import Queue, Empty
+from .numpy_engine import NumpyThreatEngine, NUMPY_MODEL_PATH
+from .temporal import TEMPORAL_FEATURE_KEYS, get_temporal_store
+from . import registry
+
+# Feature order used for training and inference: must match synthetic.synth_data
+FEATURE_KEYS = ["sea_level", "wind_speed", "salinity", "temp", "chl_a"]
+
+# Inputs of the temporal model variant (train_model --temporal): current values, then history features
+EXTENDED_FEATURE_KEYS = FEATURE_KEYS + TEMPORAL_FEATURE_KEYS
 
 # Path to the saved model, configurable via environment variable
-MODEL_PATH = os.getenv("MODEL_PATH", "app/ml/saved_model")
+# (train_model writes Keras's native .keras format; used only when the registry is empty)
+MODEL_PATH = os.getenv("MODEL_PATH", "app/ml/saved_model.keras")
+
+# Hot reload: how often to poll the registry's CURRENT pointer (0 disables), and how long
+# a replaced model keeps its micro-batch worker for requests that already hold it
+MODEL_WATCH_INTERVAL_S = float(os.getenv("MODEL_WATCH_INTERVAL_S", "5"))
+MODEL_RETIRE_GRACE_S = float(os.getenv("MODEL_RETIRE_GRACE_S", "5"))
+# Upper bound on the watcher's backoff between retries of a version that failed to load
+MODEL_RELOAD_RETRY_MAX_S = float(os.getenv("MODEL_RELOAD_RETRY_MAX_S", "300"))
+
+# Micro-batching: concurrent predict() calls share one forward pass
+MICROBATCH_ENABLED = os.getenv("MODEL_MICROBATCH", "false").lower() in ("1", "true", "yes")
+MICROBATCH_MAX_SIZE = int(os.getenv("MODEL_MICROBATCH_MAX_SIZE", "64"))
+MICROBATCH_WAIT_MS = float(os.getenv("MODEL_MICROBATCH_WAIT_MS", "2"))
+# Longest a request waits for its batch before predict() falls back to the heuristic
+MICROBATCH_TIMEOUT_S = float(os.getenv("MODEL_MICROBATCH_TIMEOUT_S", "5"))
+
+# Rows per forward pass in predict_batch, bounding activation memory on very large inputs
+PREDICT_CHUNK_ROWS = int(os.getenv("MODEL_PREDICT_CHUNK_ROWS", "65536"))
+
+def feature_matrix(features, keys=FEATURE_KEYS) -> np.ndarray:
+    """Builds the (n, len(keys)) float matrix for predict_batch.
+
+    Accepts a list of feature dicts (missing or None values become 0.0), a 2-D array
+    whose columns are already in `keys` order, or a mapping of feature name to a
+    column of values (missing columns become 0.0).
+    """
+    if isinstance(features, np.ndarray):
+        x = np.asarray(features, dtype=np.float64)
+        if x.ndim != 2 or x.shape[1] != len(keys):
+            raise ValueError(f"Expected an (n, {len(keys)}) array, got shape {x.shape}")
+        return x
+    if isinstance(features, Mapping):
+        columns = {k: np.asarray(v, dtype=np.float64) for k, v in features.items() if k in keys}
+        lengths = {len(c) for c in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All feature columns must have the same length")
+        n = lengths.pop() if lengths else 0
+        x = np.zeros((n, len(keys)))
+        for j, k in enumerate(keys):
+            if k in columns:
+                x[:, j] = columns[k]
+        return x
+    # One pass over the dicts straight into a preallocated buffer
+    n = len(features)
+    flat = np.fromiter((f.get(k) or 0.0 for f in features for k in keys),
+                       dtype=np.float64, count=n * len(keys))
+    return flat.reshape(n, len(keys))
+
+def _epoch(timestamp) -> float:
+    """Seconds since the epoch for a datetime (naive means UTC), a number, or now if None."""
+    if timestamp is None:
+        return time.time()
+    if isinstance(timestamp, datetime):
+        return (timestamp if timestamp.tzinfo else timestamp.replace(tzinfo=timezone.utc)).timestamp()
+    return float(timestamp)
+
+def _history_samples(x, sources, timestamps) -> list:
+    sea, wind = FEATURE_KEYS.index("sea_level"), FEATURE_KEYS.index("wind_speed")
+    return [(source, _epoch(timestamp), x[i, sea], x[i, wind])
+            for i, (source, timestamp) in enumerate(zip(sources, timestamps))]
+
+def record_history(features, sources, timestamps):
+    """Adds committed readings (feature dicts, in order) to the per-source history."""
+    x = feature_matrix(features)
+    get_temporal_store().record(_history_samples(x, sources, timestamps))
+
+class MicroBatcher:
+    """Collects single-row requests from many threads and runs them as one batch.
+
+    The worker blocks for the first request, then keeps collecting until either
+    max_size rows are queued or wait_ms has elapsed since that first request.
+    Once closed, submit() scores its row inline, so a request still holding a
+    retired model finishes instead of waiting on a stopped worker.
+    """
+
+    def __init__(self, forward, max_size=MICROBATCH_MAX_SIZE, wait_ms=MICROBATCH_WAIT_MS,
+                 timeout_s=MICROBATCH_TIMEOUT_S):
+        self.forward = forward # callable: 2-D array -> 1-D array of probabilities
+        self.max_size = max_size
+        self.wait_s = wait_ms / 1000.0
+        self.timeout_s = timeout_s
+        self._queue = Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "batches": 0, "max_batch_size": 0,
+                       "total_wait_s": 0.0, "max_wait_s": 0.0}
+        self._worker = threading.Thread(target=self._run, name="model-microbatcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, row) -> float:
+        """Queues one feature row and blocks until its probability is ready.
+
+        Raises concurrent.futures.TimeoutError if the batch takes longer than timeout_s.
+        """
+        future = Future()
+        with self._lock:
+            # Checked under the lock so nothing is queued behind close()'s sentinel: the
+            # queue is FIFO, so the worker drains every queued row before it stops
+            queued = not self._closed
+            if queued:
+                self._queue.put((row, time.perf_counter(), future))
+        if not queued:
+            return float(self.forward(np.array([row]))[0])
+        return future.result(timeout=self.timeout_s)
+
+    def close(self):
+        """Stops the worker once the rows already queued have been scored."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            closing = False
+            deadline = time.perf_counter() + self.wait_s
+            while len(batch) < self.max_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                batch.append(item)
+            self._process(batch)
+            if closing:
+                return
+
+    def _process(self, batch):
+        started = time.perf_counter()
+        waits = [started - enqueued for _, enqueued, _ in batch]
+        try:
+            probs = self.forward(np.array([row for row, _, _ in batch]))
+            for (_, _, future), prob in zip(batch, probs):
+                future.set_result(float(prob))
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+
+        with self._lock:
+            self._stats["requests"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size"] = max(self._stats["max_batch_size"], len(batch))
+            self._stats["total_wait_s"] += sum(waits)
+            self._stats["max_wait_s"] = max(self._stats["max_wait_s"], max(waits))
+
+    def stats(self) -> dict:
+        """Returns batch-size and queue-wait statistics since startup."""
+        with self._lock:
+            s = dict(self._stats)
+        return {
+            "requests": s["requests"],
+            "batches": s["batches"],
+            "avg_batch_size": s["requests"] / s["batches"] if s["batches"] else 0.0,
+            "max_batch_size": s["max_batch_size"],
+            "avg_queue_wait_ms": 1000.0 * s["total_wait_s"] / s["requests"] if s["requests"] else 0.0,
+            "max_queue_wait_ms": 1000.0 * s["max_wait_s"],
+            "queue_depth": self._queue.qsize(),
+            "config": {"max_size": self.max_size, "wait_ms": self.wait_s * 1000.0},
+        }
 
 class CoastalThreatModel:
-    def __init__(self, model_path=MODEL_PATH):
+    def __init__(self, model_path=MODEL_PATH, microbatch=MICROBATCH_ENABLED, numpy_path=NUMPY_MODEL_PATH,
+                 version=None):
         self.model = None
-        if os.path.exists(model_path):
+        self.backend = "heuristic"
+        self.batcher = None
+        # Prefer the exported NumPy weights: they need no TensorFlow import at all
+        if numpy_path and os.path.exists(numpy_path):
             try:
+                self.model = NumpyThreatEngine.load(numpy_path)
+                self.backend = "numpy"
+                print(f"NumPy model loaded from {numpy_path}")
+            except Exception as e:
+                print(f"Error loading NumPy model from {numpy_path}: {e}")
+        if self.model is None and os.path.exists(model_path):
+            try:
+                import tensorflow as tf # Only imported when no NumPy export is available
                 self.model = tf.keras.models.load_model(model_path)
+                self.backend = "keras"
                 print(f"ML model loaded from {model_path}")
             except Exception as e:
                 print(f"Error loading ML model from {model_path}: {e}")
                 print("Falling back to heuristic model.")
-        else:
+        elif self.model is None:
             print(f"ML model not found at {model_path}. Falling back to heuristic model.")
 
-    def predict(self, features: dict) -> float:
+        # Recorded on predictions and alerts: a registry version, "unversioned" for the
+        # legacy MODEL_PATH/NUMPY_MODEL_PATH files, or "heuristic"
+        if self.backend == "heuristic":
+            self.version = "heuristic"
+        else:
+            self.version = version or "unversioned"
+
+        # The temporal variant takes per-source history features after the current values
+        n_inputs = len(FEATURE_KEYS)
+        if self.backend == "numpy":
+            n_inputs = self.model.n_features
+        elif self.backend == "keras":
+            n_inputs = self.model.input_shape[-1]
+        self.temporal = n_inputs == len(EXTENDED_FEATURE_KEYS)
+        self.feature_keys = EXTENDED_FEATURE_KEYS if self.temporal else FEATURE_KEYS
+
+        # Batching only pays off for the Keras path; NumPy and the heuristic are already cheap per row
+        if self.backend == "keras" and microbatch:
+            self.batcher = MicroBatcher(self._forward)
+
+    def _forward(self, x):
+        """Runs one forward pass (Keras or NumPy) over a 2-D feature array."""
+        if len(x) <= PREDICT_CHUNK_ROWS:
+            return self.model.predict(x, batch_size=len(x), verbose=0)[:, 0]
+        out = np.empty(len(x))
+        for start in range(0, len(x), PREDICT_CHUNK_ROWS):
+            chunk = x[start:start + PREDICT_CHUNK_ROWS]
+            out[start:start + len(chunk)] = self.model.predict(chunk, batch_size=len(chunk), verbose=0)[:, 0]
+        return out
+
+    def predict(self, features: dict, source: str = None, timestamp=None) -> float:
         # Convert features dict to a numpy array in the expected order
         # Ensure the order matches the training data: sea_level, wind_speed, salinity, temp, chl_a
-        keys = ["sea_level", "wind_speed", "salinity", "temp", "chl_a"]
-        x = np.array([[features.get(k, 0.0) for k in keys]])
+        # (followed by the history features for the temporal variant)
+        x = np.array([[features.get(k) or 0.0 for k in self.feature_keys]], dtype=np.float64)
+
+        if source is not None and self.temporal:
+            # History features as of now; ingest records the reading once it is committed
+            self._with_history(x, [source], [timestamp])
 
         if self.model:
             try:
+                if self.batcher:
+                    return self.batcher.submit(x[0])
                 prob = self.model.predict(x, verbose=0) # verbose=0 to suppress output
                 return float(prob[0][0]) # Return the probability as a float
             except Exception as e:
                 print(f"Error during ML model prediction: {e}. Falling back to heuristic.")
 
+        return self._heuristic(features)
+
+    def predict_batch(self, features, sources=None, timestamps=None) -> np.ndarray:
+        """Scores many rows at once and returns a 1-D float array of probabilities.
+
+        `features` may be a list of feature dicts, a 2-D array in `feature_keys` order
+        or a mapping of feature name to column (see feature_matrix). With `sources`
+        (and optionally `timestamps`), the temporal variant's history features are taken
+        from the per-source history, each row seeing the rows before it; without them
+        those columns come from the input itself (0.0 when absent). Nothing is recorded:
+        see record_history().
+        """
+        x = feature_matrix(features, self.feature_keys)
+        if len(x) == 0:
+            return np.empty(0)
+        if sources is not None and self.temporal:
+            self._with_history(x, sources, timestamps or [None] * len(x))
+
+        if self.model:
+            try:
+                return np.asarray(self._forward(x), dtype=np.float64)
+            except Exception as e:
+                print(f"Error during ML batch prediction: {e}. Falling back to heuristic.")
+
+        return self._heuristic_batch(x)
+
+    def _with_history(self, x, sources, timestamps):
+        """Fills the temporal columns in place from the per-source rings."""
+        get_temporal_store().features(_history_samples(x, sources, timestamps), x, offset=len(FEATURE_KEYS))
+
+    def stats(self) -> dict:
+        """Reports which inference path is active plus micro-batching statistics."""
+        return {
+            "version": self.version,
+            "backend": self.backend,
+            "temporal": self.temporal,
+            "feature_keys": self.feature_keys,
+            "history": get_temporal_store().stats(),
+            "microbatch": self.batcher.stats() if self.batcher else None,
+        }
+
+    def close(self):
+        """Releases the micro-batch worker; called when a reload replaces this model."""
+        if self.batcher:
+            self.batcher.close()
+
+    @staticmethod
+    def _heuristic(features: dict) -> float:
         # Fallback heuristic model if ML model is not loaded or fails
         # This is a simplified rule for demonstration
-        sea_level = features.get("sea_level", 0)
-        wind_speed = features.get("wind_speed", 0)
-        chl_a = features.get("chl_a", 0)
+        # Missing or null values count as 0.0, as in feature_matrix
+        sea_level = features.get("sea_level") or 0.0
+        wind_speed = features.get("wind_speed") or 0.0
+        chl_a = features.get("chl_a") or 0.0
 
         # Normalize values to contribute to a 0-1 score
         # Assuming typical ranges: sea_level (0-2m), wind_speed (0-50m/s), chl_a (0-2)
@@ -46,4 +327,154 @@ class CoastalThreatModel:
 
         # Simple weighted sum for heuristic probability
         heuristic_score = (normalized_sea * 0.4 + normalized_wind * 0.3 + normalized_chl * 0.3)
-        return min(max(heuristic_score, 0.0), 1.0) # Ensure score is between 0 and 1
\ No newline at end of file
+        return min(max(heuristic_score, 0.0), 1.0) # Ensure score is between 0 and 1
+
+    @staticmethod
+    def _heuristic_batch(x: np.ndarray) -> np.ndarray:
+        """Array form of _heuristic over a feature matrix; same weights and clipping."""
+        sea_level = x[:, FEATURE_KEYS.index("sea_level")]
+        wind_speed = x[:, FEATURE_KEYS.index("wind_speed")]
+        chl_a = x[:, FEATURE_KEYS.index("chl_a")]
+        score = (np.minimum(sea_level / 2.0, 1.0) * 0.4
+                 + np.minimum(wind_speed / 50.0, 1.0) * 0.3
+                 + np.minimum(chl_a / 2.0, 1.0) * 0.3)
+        return np.clip(score, 0.0, 1.0)
+
+def load_version(version=None) -> CoastalThreatModel:
+    """Builds a model for a registry version (default: CURRENT), else from the legacy paths."""
+    version = version or registry.current_version()
+    if version:
+        keras_path, numpy_path = registry.version_paths(version)
+        return CoastalThreatModel(model_path=keras_path, numpy_path=numpy_path, version=version)
+    return CoastalThreatModel()
+
+def _warm(model: CoastalThreatModel):
+    model.predict_batch([{}]) # Warm-up pass so the first real request is not slow
+
+# Process-wide model instance, created on first use or by a background warm-up thread.
+# Requests read the global once per call, so swapping it is atomic for them: a request
+# finishes on whichever model it started with.
+_model = None
+_model_lock = threading.Lock()
+_model_ready = threading.Event()
+
+_reload_lock = threading.Lock()
+_reload_status = {"state": "idle", "target": None, "error": None, "started_at": None, "finished_at": None}
+
+def get_model() -> CoastalThreatModel:
+    """Returns the shared model, loading and warming it on first call."""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                started = time.perf_counter()
+                model = load_version()
+                _warm(model)
+                _model = model
+                _model_ready.set()
+                print(f"Model ready ({model.backend}, {model.version}) in {time.perf_counter() - started:.2f}s")
+    return _model
+
+def load_model_in_background() -> threading.Thread:
+    """Starts loading the shared model without blocking the caller."""
+    thread = threading.Thread(target=get_model, name="model-loader", daemon=True)
+    thread.start()
+    return thread
+
+def model_ready() -> bool:
+    """True once the shared model has been loaded and warmed up."""
+    return _model_ready.is_set()
+
+def reload_status() -> dict:
+    with _reload_lock:
+        return dict(_reload_status)
+
+def reload_model(version=None, activate=False) -> bool:
+    """Loads and warms a model version in the background, then swaps it in.
+
+    The current model keeps serving until the new one is warm; if loading fails it
+    stays in place and the error is kept in reload_status(). Returns False when a
+    reload is already running. With activate=True the version is made CURRENT, but
+    only once this reload holds the slot, so a refused request changes nothing.
+    """
+    with _reload_lock:
+        if _reload_status["state"] == "loading":
+            return False
+        if activate and version:
+            registry.activate(version)
+        version = version or registry.current_version()
+        _reload_status.update(state="loading", target=version, error=None,
+                              started_at=datetime.now(timezone.utc).isoformat(), finished_at=None)
+    threading.Thread(target=_reload, args=(version,), name="model-reload", daemon=True).start()
+    return True
+
+def _reload(version):
+    global _model
+    started = time.perf_counter()
+    try:
+        model = load_version(version)
+        if version and model.version != version:
+            raise RuntimeError(f"Model {version} could not be loaded (got {model.version})")
+        _warm(model)
+    except Exception as e:
+        print(f"Model reload failed: {e}")
+        with _reload_lock:
+            _reload_status.update(state="failed", error=str(e), finished_at=datetime.now(timezone.utc).isoformat())
+        return
+
+    with _model_lock:
+        old, _model = _model, model
+        _model_ready.set()
+    if old is not None:
+        # Requests that fetched the old model just before the swap may still be submitting to it
+        timer = threading.Timer(MODEL_RETIRE_GRACE_S, old.close)
+        timer.daemon = True
+        timer.start()
+    with _reload_lock:
+        _reload_status.update(state="idle", finished_at=datetime.now(timezone.utc).isoformat())
+    print(f"Model reloaded ({model.backend}, {model.version}) in {time.perf_counter() - started:.2f}s")
+
+class ModelWatcher:
+    """Background thread that reloads the model when the registry's CURRENT changes.
+
+    A version that fails to load stays pending and is retried with exponential
+    backoff (up to MODEL_RELOAD_RETRY_MAX_S) until it loads or CURRENT moves on.
+    """
+
+    def __init__(self, interval_s=MODEL_WATCH_INTERVAL_S, retry_max_s=MODEL_RELOAD_RETRY_MAX_S):
+        self.interval_s = interval_s
+        self.retry_max_s = retry_max_s
+        self._failures = 0
+        self._retry_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        current = registry.current_version()
+        if not current or _model is None or _model.version == current:
+            return
+        status = reload_status()
+        if status["target"] == current:
+            if status["state"] == "loading" or time.monotonic() < self._retry_at:
+                return
+            print(f"Reload of {current} failed ({status['error']}); retrying")
+        else:
+            self._failures = 0
+            print(f"Registry now points at {current}; reloading")
+        if reload_model(current):
+            self._retry_at = time.monotonic() + min(self.interval_s * 2 ** self._failures, self.retry_max_s)
+            self._failures += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Model watch failed: {e}")
@@ -0,0 +1,117 @@
+# app/ml/numpy_engine.py
+"""Pure-NumPy inference for the Dense threat model.
+
+The network from train_model.build_and_train is a plain stack of Dense layers,
+so the forward pass is a handful of matmuls. Exporting the weights to a small
+.npz lets the serving process score readings without importing TensorFlow.
+
+    python -m app.ml.numpy_engine app/ml/saved_model.keras app/ml/saved_model.npz
+"""
+import argparse
+import os
+import numpy as np
+
+# Path to the exported weights, configurable via environment variable
+NUMPY_MODEL_PATH = os.getenv("NUMPY_MODEL_PATH", "app/ml/saved_model.npz")
+
+# Maximum absolute difference from Keras accepted by verify_against_keras
+DEFAULT_TOLERANCE = 1e-5
+
+def _sigmoid(z):
+    # tanh form avoids overflow warnings from exp() on large negative inputs
+    return 0.5 * (1.0 + np.tanh(0.5 * z))
+
+ACTIVATIONS = {
+    "linear": lambda z: z,
+    "relu": lambda z: np.maximum(z, 0.0),
+    "sigmoid": _sigmoid,
+    "tanh": np.tanh,
+}
+
+def export_weights(keras_model, path=NUMPY_MODEL_PATH):
+    """Writes the kernels, biases and activations of a Dense-only Keras model to an .npz file."""
+    arrays = {}
+    activations = []
+    for i, layer in enumerate(layer for layer in keras_model.layers if layer.get_weights()):
+        activation = getattr(getattr(layer, "activation", None), "__name__", None)
+        if type(layer).__name__ != "Dense" or activation not in ACTIVATIONS:
+            raise ValueError(f"Unsupported layer for NumPy export: {layer.name} ({type(layer).__name__}, {activation})")
+        kernel, bias = layer.get_weights()
+        arrays[f"kernel_{i}"] = kernel.astype(np.float32)
+        arrays[f"bias_{i}"] = bias.astype(np.float32)
+        activations.append(activation)
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    np.savez_compressed(path, activations=np.array(activations), **arrays)
+    print("Exported NumPy weights to", path)
+    return path
+
+class NumpyThreatEngine:
+    """Runs the exported Dense stack as NumPy matmuls.
+
+    predict() mirrors the keras.Model.predict signature so the engine can stand in
+    for a loaded Keras model inside CoastalThreatModel.
+    """
+
+    def __init__(self, layers):
+        self.layers = layers # list of (kernel, bias, activation_fn)
+
+    @property
+    def n_features(self) -> int:
+        """Input width of the first layer (5 for the base model, more for the temporal variant)."""
+        return self.layers[0][0].shape[0]
+
+    @classmethod
+    def load(cls, path=NUMPY_MODEL_PATH):
+        with np.load(path) as data:
+            activations = [str(a) for a in data["activations"]]
+            layers = [
+                (data[f"kernel_{i}"], data[f"bias_{i}"], ACTIVATIONS[name])
+                for i, name in enumerate(activations)
+            ]
+        return cls(layers)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        """Returns an (n, 1) array of probabilities for an (n, features) input."""
+        h = np.asarray(x, dtype=np.float32)
+        if h.ndim == 1:
+            h = h[np.newaxis, :]
+        for kernel, bias, activation in self.layers:
+            h = activation(h @ kernel + bias)
+        return h
+
+    def predict_row(self, row) -> float:
+        """Scores a single feature row."""
+        return float(self.predict(row)[0, 0])
+
+def verify_against_keras(keras_model, engine, n=1000, tolerance=DEFAULT_TOLERANCE, seed=0):
+    """Checks the engine against Keras on synthetic inputs; returns the max absolute difference."""
+    from .synthetic import synth_data, synth_temporal_data
+
+    # A local generator, so verifying mid-training leaves the global NumPy RNG untouched
+    rng = np.random.default_rng(seed)
+    X, _ = synth_data(n, rng=rng) if engine.n_features == 5 else synth_temporal_data(steps=n // 10 + 1, rng=rng)
+    X = X[:n]
+    expected = keras_model.predict(X, batch_size=n, verbose=0)
+    actual = engine.predict(X)
+    max_diff = float(np.max(np.abs(expected - actual)))
+    if max_diff > tolerance:
+        raise AssertionError(f"NumPy engine differs from Keras by {max_diff:.2e} (tolerance {tolerance:.0e})")
+    return max_diff
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained Keras threat model to NumPy weights.")
+    parser.add_argument("keras_path", nargs="?", default="app/ml/saved_model.keras")
+    parser.add_argument("out_path", nargs="?", default=NUMPY_MODEL_PATH)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    import tensorflow as tf
+
+    keras_model = tf.keras.models.load_model(args.keras_path)
+    export_weights(keras_model, args.out_path)
+    max_diff = verify_against_keras(keras_model, NumpyThreatEngine.load(args.out_path), tolerance=args.tolerance)
+    print(f"Verified against Keras: max abs diff {max_diff:.2e}")
+
+if __name__ == "__main__":
+    main()
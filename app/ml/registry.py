@@ -0,0 +1,101 @@
+# app/ml/registry.py
+"""Versioned on-disk model registry.
+
+    app/ml/registry/
+        v0001/model.keras, model.npz, metadata.json
+        v0002/...
+        CURRENT            <- name of the active version
+
+A version directory is written under a temporary name and renamed into place, and
+CURRENT is replaced atomically, so a process watching the registry never sees a
+half-written model. Serving processes poll CURRENT (see model.ModelWatcher) and
+hot-reload when it changes.
+"""
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+MODEL_REGISTRY_DIR = os.getenv("MODEL_REGISTRY_DIR", "app/ml/registry")
+
+CURRENT_FILE = "CURRENT"
+KERAS_FILE = "model.keras"
+NUMPY_FILE = "model.npz"
+METADATA_FILE = "metadata.json"
+
+_VERSION_RE = re.compile(r"v\d{4,}")
+
+def list_versions(registry_dir=MODEL_REGISTRY_DIR) -> list:
+    """Metadata of every published version, oldest first."""
+    if not os.path.isdir(registry_dir):
+        return []
+    versions = []
+    names = [name for name in os.listdir(registry_dir) if _VERSION_RE.fullmatch(name)]
+    for name in sorted(names, key=lambda name: int(name[1:])): # v10000 after v9999
+        metadata = {"version": name}
+        try:
+            with open(os.path.join(registry_dir, name, METADATA_FILE)) as f:
+                metadata.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        versions.append(metadata)
+    return versions
+
+def has_version(version: str, registry_dir=MODEL_REGISTRY_DIR) -> bool:
+    return bool(_VERSION_RE.fullmatch(version or "")) and os.path.isdir(os.path.join(registry_dir, version))
+
+def current_version(registry_dir=MODEL_REGISTRY_DIR):
+    """Name of the active version, or None when nothing has been published."""
+    try:
+        with open(os.path.join(registry_dir, CURRENT_FILE)) as f:
+            version = f.read().strip()
+    except OSError:
+        return None
+    return version if has_version(version, registry_dir) else None
+
+def version_paths(version: str, registry_dir=MODEL_REGISTRY_DIR):
+    """Returns (keras_path, numpy_path) of a version."""
+    root = os.path.join(registry_dir, version)
+    return os.path.join(root, KERAS_FILE), os.path.join(root, NUMPY_FILE)
+
+def activate(version: str, registry_dir=MODEL_REGISTRY_DIR):
+    """Points CURRENT at a published version."""
+    if not has_version(version, registry_dir):
+        raise ValueError(f"Unknown model version {version!r}")
+    tmp = os.path.join(registry_dir, f".{CURRENT_FILE}.tmp")
+    with open(tmp, "w") as f:
+        f.write(version + "\n")
+    os.replace(tmp, os.path.join(registry_dir, CURRENT_FILE))
+
+def publish(keras_model, registry_dir=MODEL_REGISTRY_DIR, make_current=True, metadata=None) -> str:
+    """Saves a trained Keras model (and its NumPy export) as the next version; returns its name."""
+    from .numpy_engine import export_weights, verify_against_keras, NumpyThreatEngine
+
+    os.makedirs(registry_dir, exist_ok=True)
+    numbers = [int(v["version"][1:]) for v in list_versions(registry_dir)]
+    version = f"v{(max(numbers) + 1 if numbers else 1):04d}"
+    staging = os.path.join(registry_dir, f".staging-{version}")
+    os.makedirs(staging)
+
+    keras_path = os.path.join(staging, KERAS_FILE)
+    numpy_path = os.path.join(staging, NUMPY_FILE)
+    keras_model.save(keras_path)
+    export_weights(keras_model, numpy_path)
+    max_diff = verify_against_keras(keras_model, NumpyThreatEngine.load(numpy_path))
+    print(f"NumPy export matches Keras (max abs diff {max_diff:.2e})")
+
+    info = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "n_features": int(keras_model.input_shape[-1]),
+        "numpy_max_abs_diff": max_diff,
+        **(metadata or {}),
+    }
+    with open(os.path.join(staging, METADATA_FILE), "w") as f:
+        json.dump(info, f, indent=2)
+
+    os.rename(staging, os.path.join(registry_dir, version))
+    print(f"Published model {version} to {registry_dir}")
+    if make_current:
+        activate(version, registry_dir)
+        print(f"Activated model {version}")
+    return version
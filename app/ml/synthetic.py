@@ -0,0 +1,47 @@
+# app/ml/synthetic.py
+"""Synthetic training data; NumPy only, so the registry can verify exports without TensorFlow."""
+import numpy as np
+from .temporal import TemporalFeatureStore, TEMPORAL_FEATURE_KEYS
+from .dataset import threat_label
+
+def synth_data(n=2000, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    # features: sea_level, wind_speed, salinity, temp, chl_a
+    sea = rng.normal(0.5, 0.5, n)
+    wind = np.abs(rng.normal(10, 8, n))
+    sal = rng.normal(34, 2, n)
+    temp = rng.normal(25, 3, n)
+    chl = np.abs(rng.normal(0.5, 0.4, n))
+
+    X = np.stack([sea, wind, sal, temp, chl], axis=1)
+    # target: probability of threat — synthetic rule (shared with training on stored readings)
+    return X, threat_label(X)
+
+def synth_temporal_data(n_sources=20, steps=600, interval_s=300, rng=None):
+    # Time series per source every interval_s seconds: a slow random walk in sea level with
+    # occasional storm surges (sea level and wind climbing over an hour or two).
+    # Features: the five current values, then the history features in TEMPORAL_FEATURE_KEYS,
+    # built with the same ring buffers the server uses.
+    rng = rng if rng is not None else np.random.default_rng()
+    store = TemporalFeatureStore(capacity=max(64, 2 * 3600 // interval_s))
+    n_base = 5
+    X = np.zeros((n_sources * steps, n_base + len(TEMPORAL_FEATURE_KEYS)))
+    row = 0
+    for s in range(n_sources):
+        sea, surge, wind = rng.normal(0.5, 0.3), 0.0, abs(rng.normal(10, 5))
+        for t in range(steps):
+            if surge <= 0 and rng.random() < 0.01:
+                surge = rng.uniform(0.01, 0.05) # metres per step while the surge lasts
+            elif surge > 0 and rng.random() < 0.05:
+                surge = -surge # ebbing
+            elif surge < 0 and rng.random() < 0.1:
+                surge = 0.0
+            sea += surge + rng.normal(0, 0.01)
+            wind = abs(wind + 0.1 * (10 - wind) + (2.0 if surge > 0 else 0.0) + rng.normal(0, 1.0))
+            X[row, :n_base] = [sea, wind, rng.normal(34, 2), rng.normal(25, 3),
+                               abs(rng.normal(0.5, 0.4))]
+            store.observe(f"source_{s}", t * interval_s, sea, wind, out=X[row], offset=n_base)
+            row += 1
+
+    # Same base rule as synth_data, plus a rising-water trend and sustained wind
+    return X, threat_label(X)
@@ -0,0 +1,184 @@
+# app/ml/temporal.py
+"""Per-source history for lagged and windowed model features.
+
+Each source gets a fixed-size ring of (timestamp, sea_level, wind_speed) in
+preallocated NumPy arrays, plus an array-backed monotonic queue that tracks the
+maximum wind speed over the window. Updating a source and reading its features
+touches only those arrays (a binary search per lag, amortised O(1) for the max),
+so nothing is allocated per reading and sensor_readings is never queried.
+
+Serving reads features with features() and adds samples with record() once the
+readings are committed, so a rolled-back insert never enters the history.
+
+Training builds its features through the same class, so serving and training
+agree on what a "10 minute delta" means.
+"""
+import os
+import threading
+from collections import Counter
+import numpy as np
+
+# Extra model inputs appended after FEATURE_KEYS by the temporal model variant
+SEA_LEVEL_LAGS_S = (600, 1800, 3600)
+WIND_MAX_WINDOW_S = 3600
+TEMPORAL_FEATURE_KEYS = [f"sea_level_delta_{lag // 60}m" for lag in SEA_LEVEL_LAGS_S] + \
+                        [f"wind_speed_max_{WIND_MAX_WINDOW_S // 60}m"]
+
+# Samples kept per source; must cover the longest window at the fastest reporting rate
+TEMPORAL_RING_SIZE = int(os.getenv("TEMPORAL_RING_SIZE", "4096"))
+
+class SourceHistory:
+    """Ring buffer of one source's recent samples, oldest at `start`."""
+    __slots__ = ("ts", "sea", "wind", "start", "count", "max_idx", "max_start", "max_count")
+
+    def __init__(self, capacity=TEMPORAL_RING_SIZE):
+        self.ts = np.zeros(capacity)
+        self.sea = np.zeros(capacity)
+        self.wind = np.zeros(capacity)
+        self.start = 0
+        self.count = 0
+        # Monotonic queue of ring positions with decreasing wind speed
+        self.max_idx = np.zeros(capacity, dtype=np.int64)
+        self.max_start = 0
+        self.max_count = 0
+
+    def copy(self):
+        other = SourceHistory.__new__(SourceHistory)
+        for name in self.__slots__:
+            value = getattr(self, name)
+            setattr(other, name, value.copy() if isinstance(value, np.ndarray) else value)
+        return other
+
+    @property
+    def last_ts(self):
+        return self.ts[(self.start + self.count - 1) % len(self.ts)] if self.count else None
+
+    def push(self, ts: float, sea: float, wind: float):
+        capacity = len(self.ts)
+        # Samples arrive in time order, so entries older than this one's window are done with
+        cutoff = ts - WIND_MAX_WINDOW_S
+        while self.max_count and self.ts[self.max_idx[self.max_start]] < cutoff:
+            self.max_start = (self.max_start + 1) % capacity
+            self.max_count -= 1
+        if self.count == capacity:
+            # Overwrite the oldest sample; retire it from the max queue if it is at the front
+            if self.max_count and self.max_idx[self.max_start] == self.start:
+                self.max_start = (self.max_start + 1) % capacity
+                self.max_count -= 1
+            self.start = (self.start + 1) % capacity
+            self.count -= 1
+        pos = (self.start + self.count) % capacity
+        self.ts[pos] = ts
+        self.sea[pos] = sea
+        self.wind[pos] = wind
+        self.count += 1
+
+        # Drop queued positions whose wind can never be the maximum again
+        while self.max_count:
+            back = (self.max_start + self.max_count - 1) % capacity
+            if self.wind[self.max_idx[back]] > wind:
+                break
+            self.max_count -= 1
+        self.max_idx[(self.max_start + self.max_count) % capacity] = pos
+        self.max_count += 1
+
+    def _position_at_or_before(self, target: float) -> int:
+        """Ring position of the newest sample with ts <= target, else the oldest sample."""
+        capacity = len(self.ts)
+        lo, hi = 0, self.count # binary search over logical order
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(self.start + mid) % capacity] <= target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return (self.start + max(lo - 1, 0)) % capacity
+
+    def fill(self, now: float, sea: float, wind: float, out, offset: int):
+        """Writes the temporal features for a sample at `now` into out[offset:].
+
+        Lags reach back to the newest sample at least `lag` seconds old; while a source
+        has less history than that, its oldest sample is used instead. Read-only: the
+        wind queue is trimmed by push().
+        """
+        capacity = len(self.ts)
+        for j, lag in enumerate(SEA_LEVEL_LAGS_S):
+            out[offset + j] = sea - self.sea[self._position_at_or_before(now - lag)] if self.count else 0.0
+
+        # Skip queue entries that fell out of the wind window
+        cutoff = now - WIND_MAX_WINDOW_S
+        k = 0
+        while k < self.max_count and self.ts[self.max_idx[(self.max_start + k) % capacity]] < cutoff:
+            k += 1
+        out[offset + len(SEA_LEVEL_LAGS_S)] = max(wind, self.wind[self.max_idx[(self.max_start + k) % capacity]]) \
+            if k < self.max_count else wind
+
+class TemporalFeatureStore:
+    """Source -> SourceHistory, shared by the ingest threads."""
+
+    def __init__(self, capacity=TEMPORAL_RING_SIZE):
+        self.capacity = capacity
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def observe(self, source: str, ts: float, sea: float, wind: float, out=None, offset: int = 0):
+        """Records a sample and, if `out` is given, writes its temporal features there first.
+
+        Features are computed from history before the sample is added, and samples older
+        than the source's newest one are scored but not recorded.
+        """
+        with self._lock:
+            history = self._sources.get(source)
+            if history is None:
+                history = self._sources[source] = SourceHistory(self.capacity)
+            if out is not None:
+                history.fill(ts, sea, wind, out, offset)
+            self._push(history, ts, sea, wind)
+
+    def features(self, samples: list, out, offset: int = 0):
+        """Writes the temporal features of (source, ts, sea, wind) samples into out[i, offset:].
+
+        Nothing is recorded. Later samples of a source in the list see the earlier ones,
+        as they will once record() adds them; only sources that repeat are copied for that.
+        """
+        remaining = Counter(source for source, _, _, _ in samples)
+        scratch = {}
+        with self._lock:
+            for i, (source, ts, sea, wind) in enumerate(samples):
+                history = scratch.get(source) or self._sources.get(source)
+                if history is not None:
+                    history.fill(ts, sea, wind, out[i], offset)
+                else:
+                    out[i, offset:offset + len(SEA_LEVEL_LAGS_S)] = 0.0
+                    out[i, offset + len(SEA_LEVEL_LAGS_S)] = wind
+                remaining[source] -= 1
+                if remaining[source]:
+                    if source not in scratch:
+                        scratch[source] = history.copy() if history is not None else SourceHistory(self.capacity)
+                    self._push(scratch[source], ts, sea, wind)
+
+    def record(self, samples: list):
+        """Adds committed (source, ts, sea, wind) samples to the history, in order."""
+        with self._lock:
+            for source, ts, sea, wind in samples:
+                history = self._sources.get(source)
+                if history is None:
+                    history = self._sources[source] = SourceHistory(self.capacity)
+                self._push(history, ts, sea, wind)
+
+    @staticmethod
+    def _push(history: SourceHistory, ts: float, sea: float, wind: float):
+        # Samples older than the source's newest one would break the ring's time order
+        if history.count == 0 or ts >= history.last_ts:
+            history.push(ts, sea, wind)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"sources": len(self._sources), "capacity": self.capacity,
+                    "samples": sum(h.count for h in self._sources.values())}
+
+# Process-wide store; it outlives model swaps so a newly loaded model starts warm
+_store = TemporalFeatureStore()
+
+def get_temporal_store() -> TemporalFeatureStore:
+    return _store
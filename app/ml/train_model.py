@@ -1,37 +1,137 @@
 # app/ml/train_model.py
-import numpy as np
+import argparse
 import tensorflow as tf
-import os
-
-def synth_data(n=2000):
-    # features: sea_level, wind_speed, salinity, temp, chl_a
-    sea = np.random.normal(0.5, 0.5, n)
-    wind = np.abs(np.random.normal(10, 8, n))
-    sal = np.random.normal(34, 2, n)
-    temp = np.random.normal(25, 3, n)
-    chl = np.abs(np.random.normal(0.5, 0.4, n))
-
-    X = np.stack([sea, wind, sal, temp, chl], axis=1)
-    # target: probability of threat — synthetic rule
-    y = (sea*0.6 + (wind/50)*0.3 + (chl/2)*0.4) / 2.0
-    y = np.clip(y, 0, 1) # Ensure probability is between 0 and 1
-    return X, y
-
-def build_and_train(save_path="app/ml/saved_model.keras"):
-    # Ensure the directory exists
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
-
-    X, y = synth_data()
-    model = tf.keras.Sequential([
-        tf.keras.layers.Input(shape=(5,)), # 5 features
+from .registry import publish, current_version, version_paths, MODEL_REGISTRY_DIR
+from .temporal import TemporalFeatureStore, TEMPORAL_FEATURE_KEYS
+from .dataset import iter_reading_chunks, with_history, shuffle_chunks, parse_chunk, threat_label, \
+    TRAIN_CHUNK_ROWS, TRAIN_SHUFFLE_ROWS
+from .synthetic import synth_data, synth_temporal_data
+from ..models import READING_FEATURES
+from ..timeutils import parse_utc
+
+def db_dataset(temporal=False, batch_size=512, chunk_size=TRAIN_CHUNK_ROWS, since=None, until=None, seen=None,
+               shuffle_rows=TRAIN_SHUFFLE_ROWS, label_fn=threat_label):
+    """tf.data pipeline over sensor_readings: DB chunks -> shuffle pool -> parallel parsing -> batches, prefetched.
+
+    The generator is re-run every epoch, so each epoch streams the table again (in a new
+    order) and only the shuffle pool and a few chunks are in memory at once.
+    `seen["rows"]` counts the rows of the latest pass.
+    """
+    n_features = len(READING_FEATURES) + (len(TEMPORAL_FEATURE_KEYS) if temporal else 0)
+    seen = seen if seen is not None else {}
+
+    def rows():
+        # History is sequential state, so it is built here in id order rather than in the parallel map
+        store = TemporalFeatureStore() if temporal else None
+        seen["rows"] = 0
+        for sources, epochs, X in iter_reading_chunks(chunk_size, since, until):
+            seen["rows"] += len(X)
+            yield with_history(sources, epochs, X, store) if temporal else X
+
+    def chunks():
+        # Rows already carry their history features, so mixing them across chunks is safe
+        yield from shuffle_chunks(rows(), shuffle_rows)
+
+    def parse(x):
+        features, labels = tf.numpy_function(lambda x: parse_chunk(x, label_fn), [x], (tf.float32, tf.float32))
+        features.set_shape((None, n_features))
+        labels.set_shape((None,))
+        return features, labels
+
+    return (tf.data.Dataset.from_generator(chunks, output_signature=tf.TensorSpec((None, n_features), tf.float64))
+            .prefetch(2) # Fetch the next chunks from the database while earlier ones are parsed
+            .map(parse, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+            .flat_map(lambda x, y: tf.data.Dataset.from_tensor_slices((x, y)).batch(batch_size))
+            .prefetch(tf.data.AUTOTUNE))
+
+def build_model(n_features):
+    return tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(n_features,)), # 5 features, or 5 + history features
         tf.keras.layers.Dense(32, activation="relu"),
         tf.keras.layers.Dense(16, activation="relu"),
         tf.keras.layers.Dense(1, activation="sigmoid") # Output a probability
     ])
-    model.compile(optimizer="adam", loss="binary_crossentropy", metrics=["AUC"])
-    model.fit(X, y, epochs=10, batch_size=32, validation_split=0.1, verbose=1)
-    model.save(save_path)
-    print("Saved model to", save_path)
+
+def load_current_model(registry_dir=MODEL_REGISTRY_DIR):
+    """Returns (version, Keras model) of the registry's CURRENT version, the base for fine-tuning."""
+    version = current_version(registry_dir)
+    if version is None:
+        raise SystemExit(f"No CURRENT model in {registry_dir} to fine-tune; train one first")
+    keras_path, _ = version_paths(version, registry_dir)
+    print(f"Fine-tuning {version} from {keras_path}")
+    return version, tf.keras.models.load_model(keras_path)
+
+def build_and_train(registry_dir=MODEL_REGISTRY_DIR, temporal=False, activate=True, from_db=False,
+                    fine_tune=False, epochs=10, batch_size=None, learning_rate=None,
+                    chunk_size=TRAIN_CHUNK_ROWS, since=None, until=None, shuffle_rows=TRAIN_SHUFFLE_ROWS):
+    # The temporal variant adds per-source history features; the server detects it by input width
+    n_features = len(READING_FEATURES) + (len(TEMPORAL_FEATURE_KEYS) if temporal else 0)
+    parent = None
+    if fine_tune:
+        parent, model = load_current_model(registry_dir)
+        if model.input_shape[-1] != n_features:
+            raise SystemExit(f"{parent} takes {model.input_shape[-1]} inputs, not {n_features}; "
+                             f"{'drop' if temporal else 'pass'} --temporal to match it")
+    else:
+        model = build_model(n_features)
+    # Fine-tuning takes smaller steps so it adapts the current weights rather than overwriting them
+    learning_rate = learning_rate or (1e-4 if fine_tune else 1e-3)
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate), loss="binary_crossentropy", metrics=["AUC"])
+
+    if from_db:
+        if next(iter_reading_chunks(1, since, until), None) is None:
+            raise SystemExit("No sensor_readings in range to train on")
+        print("Labels come from the synthetic threat_label rule: this exercises the pipeline, "
+              "it does not learn from real outcomes")
+        seen = {}
+        dataset = db_dataset(temporal, batch_size or 512, chunk_size, since, until, seen, shuffle_rows)
+        history = model.fit(dataset, epochs=epochs, verbose=1)
+        samples = seen["rows"]
+    else:
+        X, y = synth_temporal_data() if temporal else synth_data()
+        history = model.fit(X, y, epochs=epochs, batch_size=batch_size or 32, validation_split=0.1, verbose=1)
+        samples = len(X)
+
+    metadata = {
+        "temporal": temporal,
+        "data": "sensor_readings" if from_db else "synthetic",
+        "labels": "threat_label", # synthetic rule; readings carry no ground truth
+        "samples": int(samples),
+        "epochs": epochs,
+        "learning_rate": learning_rate,
+        "parent": parent,
+        "loss": float(history.history["loss"][-1]),
+    }
+    if "val_loss" in history.history:
+        metadata["val_loss"] = float(history.history["val_loss"][-1])
+    if from_db:
+        metadata.update(since=since.isoformat() if since else None, until=until.isoformat() if until else None)
+
+    # Publish as the next registry version (Keras model + verified NumPy export); running
+    # servers pick it up through their registry watcher once it is made CURRENT
+    return publish(model, registry_dir, make_current=activate, metadata=metadata)
 
 if __name__ == "__main__":
-    build_and_train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the coastal threat model and publish it to the model registry.")
+    parser.add_argument("--temporal", action="store_true",
+                        help="train the variant that also uses sea-level deltas and max wind from recent history")
+    parser.add_argument("--registry", default=MODEL_REGISTRY_DIR, help="registry directory (MODEL_REGISTRY_DIR)")
+    parser.add_argument("--no-activate", action="store_true",
+                        help="publish without making it CURRENT (activate later via POST /admin/model/reload)")
+    parser.add_argument("--from-db", action="store_true",
+                        help="stream sensor_readings from the database instead of using synthetic data")
+    parser.add_argument("--fine-tune", action="store_true",
+                        help="continue training the registry's CURRENT model instead of starting from scratch")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, help="default 32 for synthetic data, 512 with --from-db")
+    parser.add_argument("--learning-rate", type=float, help="default 1e-3, or 1e-4 with --fine-tune")
+    parser.add_argument("--chunk-size", type=int, default=TRAIN_CHUNK_ROWS, help="rows per database round trip")
+    parser.add_argument("--since", help="only readings at or after this ISO-8601 time (with --from-db)")
+    parser.add_argument("--until", help="only readings before this ISO-8601 time (with --from-db)")
+    parser.add_argument("--shuffle-rows", type=int, default=TRAIN_SHUFFLE_ROWS,
+                        help="rows pooled to shuffle across chunks (with --from-db)")
+    args = parser.parse_args()
+    build_and_train(registry_dir=args.registry, temporal=args.temporal, activate=not args.no_activate,
+                    from_db=args.from_db, fine_tune=args.fine_tune, epochs=args.epochs,
+                    batch_size=args.batch_size, learning_rate=args.learning_rate, chunk_size=args.chunk_size,
+                    since=parse_utc(args.since), until=parse_utc(args.until), shuffle_rows=args.shuffle_rows)
\ No newline at end of file
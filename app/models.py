@@ -1,15 +1,56 @@
 # app/models.py
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Index
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 from .database import Base
 
+# Model features stored as real columns; any other reading value goes to SensorReading.extra
+READING_FEATURES = ("sea_level", "wind_speed", "salinity", "temp", "chl_a")
+
 class SensorReading(Base):
     __tablename__ = "sensor_readings"
     id = Column(Integer, primary_key=True, index=True)
     sensor_type = Column(String, index=True)  # e.g., tide, weather, salinity
     source = Column(String, default="unknown")  # e.g., tide_gauge_1
-    values = Column(JSON)  # store raw payload (e.g., {"sea_level": 1.2, "wind_speed": 30})
+    values = Column(JSON)  # legacy raw payload; new rows use the typed columns below
     timestamp = Column(DateTime(timezone=True), server_default=func.now())
+    sea_level = Column(Float)
+    wind_speed = Column(Float)
+    salinity = Column(Float)
+    temp = Column(Float)
+    chl_a = Column(Float)
+    extra = Column(JSON(none_as_null=True))  # overflow for non-feature values (e.g., latitude, longitude)
+
+    # Time-range queries for one gauge become index range scans
+    __table_args__ = (
+        Index("ix_sensor_readings_source_timestamp", "source", "timestamp"),
+    )
+
+    @staticmethod
+    def split_values(values: dict) -> dict:
+        """Splits a raw payload into typed feature columns plus an overflow dict (None if empty)."""
+        columns = {}
+        extra = {}
+        for key, value in (values or {}).items():
+            if key in READING_FEATURES and isinstance(value, (int, float)) and not isinstance(value, bool):
+                columns[key] = float(value)
+            else:
+                extra[key] = value
+        columns["extra"] = extra or None
+        return columns
+
+    @classmethod
+    def from_values(cls, values: dict, **kwargs):
+        """Builds a reading whose payload is stored in the typed layout."""
+        return cls(**cls.split_values(values), **kwargs)
+
+    def to_values(self) -> dict:
+        """Reassembles the original payload from the typed columns (or the legacy JSON)."""
+        if self.values is not None:
+            return dict(self.values)
+        values = {k: getattr(self, k) for k in READING_FEATURES if getattr(self, k) is not None}
+        values.update(self.extra or {})
+        return values
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -18,7 +59,34 @@ class Alert(Base):
     severity = Column(String)   # e.g., "high", "medium", "low"
     message = Column(String)
     payload = Column(JSON)      # The sensor data that triggered the alert
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    model_version = Column(String, nullable=True) # Registry version that scored the reading (threat alerts only)
+    # Python-side default keeps sub-second precision (and one storage format on SQLite) for keyset paging
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), server_default=func.now())
+
+    # Keyset pagination orders by (created_at, id); deep pages seek instead of scanning
+    __table_args__ = (
+        Index("ix_alerts_created_at_id", "created_at", "id"),
+    )
+
+class ReadingRollup(Base):
+    """Per-source, per-feature aggregate of readings over one fixed-width time bucket."""
+    __tablename__ = "reading_rollups"
+    bucket = Column(String, primary_key=True)  # "1m", "1h" or "1d"
+    source = Column(String, primary_key=True)
+    feature = Column(String, primary_key=True)
+    bucket_start = Column(DateTime(timezone=True), primary_key=True)
+    count = Column(Integer, nullable=False)
+    min = Column(Float, nullable=False)
+    max = Column(Float, nullable=False)
+    sum = Column(Float, nullable=False)  # mean = sum / count
+    last = Column(Float, nullable=False)
+    last_timestamp = Column(DateTime(timezone=True), nullable=False)
+
+class RollupState(Base):
+    """Watermark of the last sensor_readings id folded into the rollups."""
+    __tablename__ = "rollup_state"
+    name = Column(String, primary_key=True)
+    last_reading_id = Column(Integer, nullable=False, default=0)
 
 # Example User model for demonstration
 class User(Base):
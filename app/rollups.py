@@ -0,0 +1,157 @@
+# app/rollups.py
+"""Incrementally maintained 1-minute, 1-hour and 1-day rollups of sensor readings.
+
+A background job folds readings newer than a stored id watermark into the
+reading_rollups table: each pass reads only the new rows, merges their
+min/max/sum/count/last into the existing buckets and advances the watermark
+in the same transaction, so nothing is ever recomputed from scratch.
+
+Every app process runs the job, so a pass first claims its chunk by moving the
+watermark with a conditional UPDATE; a process that loses the race rolls back
+without touching the buckets. The id watermark assumes ids become visible in
+order, which holds on SQLite (one writer at a time). On a database with
+concurrent writers a row committed after a higher id could be skipped.
+"""
+import os
+import threading
+from datetime import datetime, timezone
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError, OperationalError
+from .database import SessionLocal
+from .models import SensorReading, ReadingRollup, RollupState, READING_FEATURES
+from .timeutils import as_utc
+
+# Rollup bucket widths in seconds, finest first
+ROLLUP_BUCKETS = {"1m": 60, "1h": 3600, "1d": 86400}
+
+ROLLUP_INTERVAL_S = float(os.getenv("ROLLUP_INTERVAL_S", "10"))
+ROLLUP_CHUNK_SIZE = int(os.getenv("ROLLUP_CHUNK_SIZE", "5000"))
+
+_STATE_NAME = "reading_rollups"
+
+def bucket_start(ts: datetime, width_s: int) -> datetime:
+    """Floors a timestamp to the start of its bucket."""
+    epoch = int(as_utc(ts).timestamp())
+    return datetime.fromtimestamp(epoch - epoch % width_s, tz=timezone.utc)
+
+def _fold(acc: dict, key, value: float, ts: datetime):
+    """Merges one value into an in-memory aggregate."""
+    agg = acc.get(key)
+    if agg is None:
+        acc[key] = {"count": 1, "min": value, "max": value, "sum": value, "last": value, "last_timestamp": ts}
+        return
+    agg["count"] += 1
+    agg["min"] = min(agg["min"], value)
+    agg["max"] = max(agg["max"], value)
+    agg["sum"] += value
+    if ts >= agg["last_timestamp"]:
+        agg["last"] = value
+        agg["last_timestamp"] = ts
+
+def update_rollups(db, chunk_size=ROLLUP_CHUNK_SIZE) -> int:
+    """Folds up to chunk_size new readings into the rollups; returns how many were processed."""
+    last_id = db.execute(
+        select(RollupState.last_reading_id).where(RollupState.name == _STATE_NAME)
+    ).scalar()
+    if last_id is None:
+        try:
+            db.add(RollupState(name=_STATE_NAME, last_reading_id=0))
+            db.commit()
+        except IntegrityError:
+            db.rollback() # Another process created it first
+        last_id = 0
+
+    columns = [getattr(SensorReading, f) for f in READING_FEATURES]
+    rows = db.execute(
+        select(SensorReading.id, SensorReading.source, SensorReading.timestamp, *columns)
+        .where(SensorReading.id > last_id)
+        .order_by(SensorReading.id)
+        .limit(chunk_size)
+    ).all()
+    if not rows:
+        db.rollback()
+        return 0
+
+    # Claim the chunk before reading any bucket: the UPDATE takes the write lock, and only
+    # one process can move the watermark from last_id, so no reading is folded in twice
+    try:
+        claimed = db.execute(
+            update(RollupState)
+            .where(RollupState.name == _STATE_NAME, RollupState.last_reading_id == last_id)
+            .values(last_reading_id=rows[-1].id)
+        ).rowcount
+    except OperationalError as e:
+        if "locked" not in str(e):
+            raise
+        claimed = 0 # SQLite refuses the lock outright when another process is mid-claim
+    if claimed != 1:
+        db.rollback()
+        return 0
+
+    # Aggregate the chunk in memory first so each bucket row is touched once
+    acc = {}
+    for row in rows:
+        ts = as_utc(row.timestamp)
+        starts = {name: bucket_start(ts, width) for name, width in ROLLUP_BUCKETS.items()}
+        for feature in READING_FEATURES:
+            value = getattr(row, feature)
+            if value is None:
+                continue
+            for name, start in starts.items():
+                _fold(acc, (name, row.source, feature, start), value, ts)
+
+    for key, agg in acc.items():
+        rollup = db.get(ReadingRollup, key)
+        if rollup is None:
+            name, source, feature, start = key
+            db.add(ReadingRollup(bucket=name, source=source, feature=feature, bucket_start=start, **agg))
+            continue
+        rollup.count += agg["count"]
+        rollup.min = min(rollup.min, agg["min"])
+        rollup.max = max(rollup.max, agg["max"])
+        rollup.sum += agg["sum"]
+        if agg["last_timestamp"] >= as_utc(rollup.last_timestamp):
+            rollup.last = agg["last"]
+            rollup.last_timestamp = agg["last_timestamp"]
+
+    db.commit()
+    return len(rows)
+
+class RollupJob:
+    """Background thread that keeps the rollups current."""
+
+    def __init__(self, interval_s=ROLLUP_INTERVAL_S, session_factory=SessionLocal):
+        self.interval_s = interval_s
+        self.session_factory = session_factory
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rollup-job", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self) -> int:
+        """Processes every pending reading; returns how many were folded in.
+
+        Stops early when another process claims the next chunk; it carries on from there.
+        """
+        total = 0
+        while True:
+            db = self.session_factory()
+            try:
+                processed = update_rollups(db)
+            finally:
+                db.close()
+            total += processed
+            if processed == 0:
+                return total
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Rollup update failed: {e}")
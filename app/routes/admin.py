@@ -0,0 +1,45 @@
+# app/routes/admin.py
+from flask import Blueprint, request, jsonify
+from ..ml import registry
+from ..ml.model import get_model, model_ready, reload_model, reload_status
+import hmac
+import os
+
+# Create a Blueprint for admin routes
+admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+# Admin requests must carry it in the X-Admin-Token header; unset disables the admin API
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+@admin_bp.before_request
+def require_token():
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Admin API is disabled: set ADMIN_TOKEN to enable it"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Invalid or missing X-Admin-Token"}), 401
+
+@admin_bp.route("/model", methods=["GET"])
+def model_info():
+    """API endpoint showing the serving model, the registry's versions and the last reload."""
+    return jsonify({
+        "serving": get_model().version if model_ready() else None,
+        "current": registry.current_version(),
+        "versions": registry.list_versions(),
+        "reload": reload_status(),
+    }), 200
+
+@admin_bp.route("/model/reload", methods=["POST"])
+def model_reload():
+    """API endpoint to hot-reload the model.
+
+    With {"version": "v0003"} that version is made CURRENT first (so other worker
+    processes follow through their registry watchers); without a body CURRENT is reloaded.
+    Loading and warm-up run in the background: poll GET /admin/model for the outcome.
+    """
+    version = (request.get_json(silent=True) or {}).get("version")
+    if version is not None and not registry.has_version(version):
+        return jsonify({"error": f"Unknown model version {version!r}"}), 404
+    # CURRENT only moves once this request holds the reload slot
+    if not reload_model(version, activate=version is not None):
+        return jsonify({"error": "A reload is already in progress", "reload": reload_status()}), 409
+    return jsonify({"status": "reloading", "reload": reload_status()}), 202
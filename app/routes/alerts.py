@@ -1,13 +1,22 @@
 # app/routes/alerts.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
+from sqlalchemy import tuple_
 from ..database import SessionLocal
 from .. import models
 from ..schemas import AlertOut
+from ..alerts_cache import alerts_cache, body_etag
+from ..timeutils import as_utc, parse_utc
 from typing import List
+from datetime import datetime
+import base64
+import json
 
 # Create a Blueprint for alerts routes
 alerts_bp = Blueprint('alerts', __name__, url_prefix='/alerts')
 
+# Upper bound on the page size a client may request
+MAX_PAGE_SIZE = 500
+
 def get_db():
     """Dependency to get a database session."""
     db = SessionLocal()
@@ -16,14 +25,64 @@ def get_db():
     finally:
         db.close()
 
+def encode_cursor(created_at: datetime, alert_id: int) -> str:
+    """Encodes the (created_at, id) position of the last alert on a page as an opaque token."""
+    raw = json.dumps([created_at.isoformat(), alert_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError on a malformed token."""
+    try:
+        created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return as_utc(datetime.fromisoformat(created_at)), int(alert_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
 @alerts_bp.route("/", methods=["GET"])
 def list_alerts():
-    """API endpoint to list recent alerts."""
+    """API endpoint to list recent alerts, newest first.
+
+    Supports keyset pagination via `cursor` (the X-Next-Cursor header of the previous page)
+    and filtering by `severity`, `alert_type`, `from` and `to` (ISO-8601 created_at bounds).
+    Responses are cached per query string and revalidated with ETag / If-None-Match.
+    """
+    cache_key = alerts_cache.make_key(request.args)
+    cached = alerts_cache.get(cache_key)
+    if cached is not None:
+        etag, body, headers = cached
+        if request.if_none_match.contains(etag):
+            # Nothing inserted since the client's copy: answer without touching the database
+            return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+        return Response(body, status=200, mimetype="application/json", headers=headers)
+    generation = alerts_cache.generation()
+
+    limit = min(max(request.args.get('limit', 50, type=int), 1), MAX_PAGE_SIZE)
+    try:
+        cursor = decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        start = parse_utc(request.args.get('from'))
+        end = parse_utc(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
     db = next(get_db()) # Get a database session
-    limit = request.args.get('limit', 50, type=int)
 
-    # Query alerts, order by creation time descending, and limit
-    alerts = db.query(models.Alert).order_by(models.Alert.created_at.desc()).limit(limit).all()
+    query = db.query(models.Alert)
+    if request.args.get('severity'):
+        query = query.filter(models.Alert.severity == request.args['severity'])
+    if request.args.get('alert_type'):
+        query = query.filter(models.Alert.alert_type == request.args['alert_type'])
+    if start:
+        query = query.filter(models.Alert.created_at >= start)
+    if end:
+        query = query.filter(models.Alert.created_at < end)
+    if cursor:
+        # Seek past the last row of the previous page on the (created_at, id) index
+        query = query.filter(tuple_(models.Alert.created_at, models.Alert.id) < tuple_(*cursor))
+
+    # Query alerts, order by creation time descending, and fetch one extra row to detect a next page
+    alerts = query.order_by(models.Alert.created_at.desc(), models.Alert.id.desc()).limit(limit + 1).all()
+    has_more = len(alerts) > limit
+    alerts = alerts[:limit]
 
     # Convert SQLAlchemy objects to Pydantic models for consistent output
     # and proper serialization (e.g., datetime to ISO string)
@@ -35,7 +94,18 @@ def list_alerts():
             severity=alert.severity,
             message=alert.message,
             payload=alert.payload,
-            created_at=alert.created_at.isoformat()
+            created_at=alert.created_at.isoformat(),
+            model_version=alert.model_version
         ))
 
-    return jsonify([alert.model_dump() for alert in response_alerts]), 200 # Use model_dump() for Pydantic v2
\ No newline at end of file
+    # Serialize once; the cached bytes are reused until the next alert is inserted
+    body = json.dumps([alert.model_dump() for alert in response_alerts]).encode("utf-8") # Use model_dump() for Pydantic v2
+    # Tag from the content, so it matches across worker processes and after cache expiry
+    etag = body_etag(body)
+    headers = {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    if has_more:
+        headers["X-Next-Cursor"] = encode_cursor(alerts[-1].created_at, alerts[-1].id)
+    alerts_cache.put(cache_key, generation, etag, body, headers)
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={"ETag": f'"{etag}"', "Cache-Control": "no-cache"})
+    return Response(body, status=200, mimetype="application/json", headers=headers)
@@ -1,18 +1,29 @@
 # app/routes/ingest.py
 from flask import Blueprint, request, jsonify
+from pydantic import ValidationError
 from ..schemas import ReadingIn
 from ..database import SessionLocal
 from .. import models
-from ..ml.model import CoastalThreatModel
-from ..utils import broadcast_alert, send_sms_if_needed, broadcast_reading
+from ..models import READING_FEATURES
+from ..ml.model import get_model, record_history
+from ..utils import broadcast_alert, send_sms_if_needed, broadcast_reading, get_broadcast_client
+from ..alerts_cache import invalidate_alerts_cache
+from ..timeutils import parse_utc
+from ..write_behind import WRITE_BEHIND_ENABLED, WRITE_BEHIND_ACK, get_write_buffer
+from ..anomaly import ANOMALY_DETECTION_ENABLED, ANOMALY_Z_THRESHOLD, get_detector
 import json
-from datetime import datetime
+import os
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 
 # Create a Blueprint for ingest routes
 ingest_bp = Blueprint('ingest', __name__, url_prefix='/ingest')
 
-# Initialize the ML model globally to avoid reloading on each request
-model = CoastalThreatModel()
+# Upper bound on readings accepted by a single /ingest/readings request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "5000"))
+
+# Runs broadcasts/SMS for write-behind rows acknowledged before their flush
+_notify_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ingest-notify")
 
 def get_db():
     """Dependency to get a database session."""
@@ -22,73 +33,398 @@ def get_db():
     finally:
         db.close()
 
+def classify_threat(prob: float):
+    """Maps a threat probability to (severity, message), or (None, None) below the alert threshold."""
+    if prob > 0.7:
+        return "high", f"High coastal threat detected ({prob:.2f})"
+    elif prob > 0.4:
+        return "medium", f"Medium coastal threat detected ({prob:.2f})"
+    return None, None
+
+def check_feature_values(values: dict):
+    """Raises ValueError unless every model feature present in `values` is a number (or null)."""
+    bad = [k for k in READING_FEATURES
+           if values.get(k) is not None and (isinstance(values[k], bool) or not isinstance(values[k], (int, float)))]
+    if bad:
+        raise ValueError(f"non-numeric feature values: {', '.join(bad)}")
+
+def detect_anomalies(observations: list) -> list:
+    """Scores (source, values, timestamp) readings with the streaming detector; returns Alert rows.
+
+    The detector's baselines are left untouched: call record_observations() once the
+    readings are committed.
+    """
+    if not ANOMALY_DETECTION_ENABLED:
+        return []
+    alerts = []
+    scored = get_detector().evaluate(observations)
+    for (source, _, timestamp), anomalies in zip(observations, scored):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc) # SQLite hands back naive UTC
+        for anomaly in anomalies:
+            what = "rate of change" if anomaly["kind"] == "slope" else "level"
+            alerts.append(models.Alert(
+                alert_type="anomaly",
+                severity="high" if abs(anomaly["score"]) > 2 * ANOMALY_Z_THRESHOLD else "medium",
+                message=f"Anomalous {anomaly['feature']} {what} at {source} (z={anomaly['score']})",
+                payload=anomaly,
+                created_at=timestamp,
+            ))
+    return alerts
+
+def record_observations(observations: list, anomaly_alerts: list):
+    """Folds committed readings into the detector's baselines."""
+    if ANOMALY_DETECTION_ENABLED:
+        get_detector().record(observations, len(anomaly_alerts))
+
+def _alert_message(alert_id, alert: models.Alert, created_at: datetime) -> dict:
+    return {
+        "id": alert_id,
+        "alert_type": alert.alert_type,
+        "severity": alert.severity,
+        "message": alert.message,
+        "payload": alert.payload,
+        "created_at": created_at.isoformat(),
+        "model_version": alert.model_version
+    }
+
+def _store_anomaly_alerts(alerts: list):
+    """Commits anomaly alerts in their own short transaction and broadcasts them."""
+    db = next(get_db()) # Get a database session
+    try:
+        db.add_all(alerts)
+        db.flush()
+        messages = [_alert_message(alert.id, alert, alert.created_at) for alert in alerts]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"Failed to store anomaly alerts: {e}")
+        return
+    invalidate_alerts_cache()
+    for message in messages:
+        broadcast_alert(message)
+
 @ingest_bp.route("/reading", methods=["POST"])
 def ingest_reading():
     """API endpoint to ingest sensor readings and predict threat."""
     try:
         # Validate incoming data using Pydantic schema
         reading_data = ReadingIn(**request.json)
+        check_feature_values(reading_data.values)
     except Exception as e:
         return jsonify({"error": f"Invalid input data: {e}"}), 400
 
-    db = next(get_db()) # Get a database session
+    if WRITE_BEHIND_ENABLED:
+        return _ingest_reading_write_behind(reading_data)
+
+    # Stamp the reading client-side so it can be scored before anything is committed
+    now = datetime.now(timezone.utc)
+
+    # Run threat prediction first: a scoring error must not leave a stored reading without its alert.
+    # Keep the model reference so the version recorded is the one that scored, even across a hot reload.
+    model = get_model()
+    prob = model.predict(reading_data.values, source=reading_data.source, timestamp=now)
+    severity, alert_message = classify_threat(prob)
+
+    # Score against the source's running statistics; flagged readings become "anomaly" alerts
+    observations = [(reading_data.source, reading_data.values, now)]
+    anomaly_alerts = detect_anomalies(observations)
 
-    # Save the raw sensor reading to the database
-    db_reading = models.SensorReading(
+    db_reading = models.SensorReading.from_values(
+        reading_data.values,
         sensor_type=reading_data.sensor_type,
         source=reading_data.source,
-        values=reading_data.values,
-        # timestamp is set by server_default=func.now() if not provided
+        timestamp=now,
     )
-    db.add(db_reading)
-    db.commit()
-    db.refresh(db_reading) # Get the generated ID and timestamp
+    alert = None
+    if alert_message:
+        alert = models.Alert(
+            alert_type="coastal_threat",
+            severity=severity,
+            message=alert_message,
+            payload=reading_data.values,
+            created_at=now,
+            model_version=model.version
+        )
+
+    # Save the reading and its alerts in one transaction
+    db = next(get_db()) # Get a database session
+    try:
+        db.add(db_reading)
+        if alert is not None:
+            db.add(alert)
+        db.add_all(anomaly_alerts)
+        db.flush()
+        alert_id = alert.id if alert is not None else None
+        anomaly_messages = [_alert_message(a.id, a, a.created_at) for a in anomaly_alerts]
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"Failed to store reading: {e}"}), 500
+
+    # Only committed readings enter the in-memory history and the detector's baselines
+    record_history([reading_data.values], [reading_data.source], [now])
+    record_observations(observations, anomaly_alerts)
+    if alert_id is not None or anomaly_messages:
+        invalidate_alerts_cache()
 
     # Broadcast the raw reading to the dashboard for real-time charts
-    # Note: Flask's BackgroundTasks are not as direct as FastAPI's.
-    # We'll use asyncio.create_task directly in utils.py for simplicity here,
-    # assuming an event loop is available (e.g., when running with Gunicorn/ASGI server).
+    # This only queues the message; utils.BroadcastClient delivers it from its own thread.
     broadcast_reading({
         "sensor_type": reading_data.sensor_type,
         "source": reading_data.source,
         "values": reading_data.values,
-        "timestamp": db_reading.timestamp.isoformat() # Convert datetime to string
+        "timestamp": now.isoformat() # Convert datetime to string
     })
 
-    # Run threat prediction
-    prob = model.predict(reading_data.values)
+    if alert_id is not None:
+        # Broadcast the alert and send SMS in the background
+        broadcast_alert({
+            "id": alert_id,
+            "alert_type": "coastal_threat",
+            "severity": severity,
+            "message": alert_message,
+            "payload": reading_data.values,
+            "created_at": now.isoformat(),
+            "model_version": model.version
+        })
+        send_sms_if_needed(alert_id, prob)
 
-    # Define thresholds and create alerts
-    alert_message = None
-    severity = None
+    for message in anomaly_messages:
+        broadcast_alert(message)
 
-    if prob > 0.7:
-        severity = "high"
-        alert_message = f"High coastal threat detected ({prob:.2f})"
-    elif prob > 0.4:
-        severity = "medium"
-        alert_message = f"Medium coastal threat detected ({prob:.2f})"
+    return jsonify({"status": "ok", "probability": prob, "model_version": model.version}), 200
 
+def _ingest_reading_write_behind(reading_data):
+    """Scores a reading and hands its rows to the group-commit buffer instead of committing inline."""
+    # Stamp rows client-side so nothing has to be refreshed after the group commit
+    now = datetime.now(timezone.utc)
+    model = get_model()
+    prob = model.predict(reading_data.values, source=reading_data.source, timestamp=now)
+    severity, alert_message = classify_threat(prob)
+
+    db_reading = models.SensorReading.from_values(
+        reading_data.values,
+        sensor_type=reading_data.sensor_type,
+        source=reading_data.source,
+        timestamp=now,
+    )
+    alert = None
     if alert_message:
         alert = models.Alert(
             alert_type="coastal_threat",
             severity=severity,
             message=alert_message,
-            payload=reading_data.values
+            payload=reading_data.values,
+            created_at=now,
+            model_version=model.version,
         )
-        db.add(alert)
+    observations = [(reading_data.source, reading_data.values, now)]
+    anomaly_alerts = detect_anomalies(observations)
+
+    def notify(reading_id, alert_id):
+        # Only runs once the row is committed, so neither the history nor the detector learns a lost reading
+        record_history([reading_data.values], [reading_data.source], [now])
+        record_observations(observations, anomaly_alerts)
+        broadcast_reading({
+            "sensor_type": reading_data.sensor_type,
+            "source": reading_data.source,
+            "values": reading_data.values,
+            "timestamp": now.isoformat()
+        })
+        if alert_id is not None:
+            invalidate_alerts_cache()
+            broadcast_alert({
+                "id": alert_id,
+                "alert_type": "coastal_threat",
+                "severity": severity,
+                "message": alert_message,
+                "payload": reading_data.values,
+                "created_at": now.isoformat(),
+                "model_version": model.version
+            })
+            send_sms_if_needed(alert_id, prob)
+        if anomaly_alerts:
+            # Rare enough that a separate commit beats widening the write-behind row format
+            _store_anomaly_alerts(anomaly_alerts)
+
+    future = get_write_buffer().submit(db_reading, alert)
+
+    if WRITE_BEHIND_ACK == "before_flush":
+        # Notifications wait for the commit but must not block the writer thread (SMS is slow)
+        def on_flushed(f):
+            if f.exception() is not None:
+                # The request was already acknowledged; the log is the only trace of the lost row
+                print(f"Write-behind reading from {reading_data.source} was not stored, "
+                      f"notifications skipped: {f.exception()}")
+                return
+            _notify_executor.submit(notify_logged, *f.result())
+
+        def notify_logged(reading_id, alert_id):
+            try:
+                notify(reading_id, alert_id)
+            except Exception as e:
+                print(f"Notifications for reading {reading_id} failed: {e}")
+        future.add_done_callback(on_flushed)
+        return jsonify({"status": "accepted", "probability": prob, "model_version": model.version}), 202
+
+    try:
+        reading_id, alert_id = future.result()
+    except Exception as e:
+        return jsonify({"error": f"Failed to store reading: {e}"}), 500
+    notify(reading_id, alert_id)
+    return jsonify({"status": "ok", "probability": prob, "model_version": model.version,
+                    "id": reading_id, "alert_id": alert_id}), 200
+
+@ingest_bp.route("/write-behind/stats", methods=["GET"])
+def write_behind_stats():
+    """API endpoint exposing group-commit statistics of the write-behind buffer."""
+    if not WRITE_BEHIND_ENABLED:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, "ack": WRITE_BEHIND_ACK, **get_write_buffer().stats()}), 200
+
+@ingest_bp.route("/broadcast/stats", methods=["GET"])
+def broadcast_stats():
+    """API endpoint exposing buffering and backpressure counters of the relay broadcast client."""
+    return jsonify(get_broadcast_client().stats()), 200
+
+@ingest_bp.route("/anomaly/stats", methods=["GET"])
+def anomaly_stats():
+    """API endpoint exposing the streaming anomaly detector's counters and settings."""
+    if not ANOMALY_DETECTION_ENABLED:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **get_detector().stats()}), 200
+
+@ingest_bp.route("/model/stats", methods=["GET"])
+def model_stats():
+    """API endpoint exposing the inference backend and micro-batching statistics."""
+    return jsonify(get_model().stats()), 200
+
+def _parse_batch_body(raw: bytes) -> list:
+    """Decodes a batch body as either a JSON array or NDJSON (one object per line)."""
+    text = raw.decode("utf-8").strip()
+    if text.startswith("["):
+        items = json.loads(text)
+    else:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if not all(isinstance(item, dict) for item in items):
+        raise ValueError("every batch item must be a JSON object")
+    return items
+
+@ingest_bp.route("/readings", methods=["POST"])
+def ingest_readings():
+    """API endpoint to ingest a batch of sensor readings (JSON array or NDJSON) in one transaction."""
+    try:
+        items = _parse_batch_body(request.get_data())
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"Invalid batch body: {e}"}), 400
+
+    if not items:
+        return jsonify({"status": "ok", "count": 0, "results": []}), 200
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch too large: {len(items)} > {MAX_BATCH_SIZE}"}), 413
+
+    # Validate the whole batch up front so that nothing is written if any item is bad
+    readings = []
+    errors = []
+    for i, item in enumerate(items):
+        try:
+            reading = ReadingIn(**item)
+            check_feature_values(reading.values)
+            readings.append((reading, parse_utc(reading.timestamp)))
+        except (ValidationError, ValueError, TypeError) as e:
+            errors.append({"index": i, "error": str(e)})
+    if errors:
+        return jsonify({"error": "Invalid input data", "items": errors}), 400
+
+    # Stamp rows client-side so the bulk insert does not need a refresh per row
+    now = datetime.now(timezone.utc)
+
+    # Score the whole batch with a single model call; each row sees the earlier rows' history
+    model = get_model()
+    batch_values = [reading.values for reading, _ in readings]
+    batch_sources = [reading.source for reading, _ in readings]
+    batch_timestamps = [ts or now for _, ts in readings]
+    probs = model.predict_batch(batch_values, sources=batch_sources, timestamps=batch_timestamps).tolist()
+    db_readings = [
+        models.SensorReading.from_values(
+            reading.values,
+            sensor_type=reading.sensor_type,
+            source=reading.source,
+            timestamp=ts or now,
+        )
+        for reading, ts in readings
+    ]
+
+    # Alerts carry the index of the reading that triggered them
+    threats = [classify_threat(prob) for prob in probs]
+    db_alerts = []
+    for i, ((reading, _), prob, (severity, alert_message)) in enumerate(zip(readings, probs, threats)):
+        if alert_message:
+            db_alerts.append((i, prob, models.Alert(
+                alert_type="coastal_threat",
+                severity=severity,
+                message=alert_message,
+                payload=reading.values,
+                created_at=now,
+                model_version=model.version,
+            )))
+
+    # Readings reach the detector in batch order, so per-source rates stay meaningful
+    observations = [(reading.source, reading.values, ts or now) for reading, ts in readings]
+    anomaly_alerts = detect_anomalies(observations)
+
+    db = next(get_db()) # Get a database session
+    try:
+        # Bulk insert readings and alerts; flush assigns primary keys, commit is the single fsync
+        db.add_all(db_readings)
+        db.add_all(alert for _, _, alert in db_alerts)
+        db.add_all(anomaly_alerts)
+        db.flush()
+        reading_ids = [r.id for r in db_readings]
+        alert_ids = [alert.id for _, _, alert in db_alerts]
+        anomaly_messages = [_alert_message(alert.id, alert, alert.created_at) for alert in anomaly_alerts]
         db.commit()
-        db.refresh(alert)
+    except Exception as e:
+        db.rollback()
+        return jsonify({"error": f"Failed to store batch: {e}"}), 500
+    # Rows enter the per-source history in order, and only once they are stored
+    record_history(batch_values, batch_sources, batch_timestamps)
+    record_observations(observations, anomaly_alerts)
+    if alert_ids or anomaly_messages:
+        invalidate_alerts_cache()
 
-        # Broadcast the alert and send SMS in the background
+    results = [
+        {"id": reading_id, "probability": prob, "severity": None, "alert_id": None}
+        for reading_id, prob in zip(reading_ids, probs)
+    ]
+
+    # Broadcast from the validated input rather than the ORM rows, which are expired after commit
+    for reading, ts in readings:
+        broadcast_reading({
+            "sensor_type": reading.sensor_type,
+            "source": reading.source,
+            "values": reading.values,
+            "timestamp": (ts or now).isoformat()
+        })
+
+    for (i, prob, _), alert_id in zip(db_alerts, alert_ids):
+        severity, alert_message = threats[i]
+        results[i]["severity"] = severity
+        results[i]["alert_id"] = alert_id
         broadcast_alert({
-            "id": alert.id,
-            "alert_type": alert.alert_type,
-            "severity": alert.severity,
-            "message": alert.message,
-            "payload": alert.payload,
-            "created_at": alert.created_at.isoformat()
+            "id": alert_id,
+            "alert_type": "coastal_threat",
+            "severity": severity,
+            "message": alert_message,
+            "payload": readings[i][0].values,
+            "created_at": now.isoformat(),
+            "model_version": model.version
         })
-        send_sms_if_needed(alert.id, prob)
+        send_sms_if_needed(alert_id, prob)
+
+    for message in anomaly_messages:
+        broadcast_alert(message)
 
-    return jsonify({"status": "ok", "probability": prob}), 200
\ No newline at end of file
+    return jsonify({"status": "ok", "count": len(results), "model_version": model.version, "results": results,
+                    "anomalies": len(anomaly_messages)}), 200
@@ -0,0 +1,167 @@
+# app/routes/readings.py
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from sqlalchemy import select
+from ..database import SessionLocal
+from .. import models
+from ..rollups import ROLLUP_BUCKETS, ROLLUP_INTERVAL_S, bucket_start
+from ..timeutils import as_utc, parse_utc
+from ..export import EXPORT_FORMATS, export_stream
+from datetime import datetime, timedelta, timezone
+import re
+
+# Create a Blueprint for reading history routes
+readings_bp = Blueprint('readings', __name__, url_prefix='/readings')
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def get_db():
+    """Dependency to get a database session."""
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+def parse_bucket(value: str) -> int:
+    """Parses a bucket width such as '30s', '15m', '6h' or '1d' into seconds."""
+    match = re.fullmatch(r"(\d+)([smhd])", value or "")
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Invalid bucket {value!r}; expected e.g. 1m, 15m, 6h, 1d")
+    return int(match.group(1)) * _UNITS[match.group(2)]
+
+def choose_rollup(width_s: int):
+    """Returns the coarsest rollup whose buckets tile the requested width, or None for raw rows."""
+    best = None
+    for name, rollup_s in ROLLUP_BUCKETS.items():
+        if rollup_s <= width_s and width_s % rollup_s == 0:
+            best = name
+    return best
+
+def _fold(out: dict, start, count, lo, hi, total, last, last_ts):
+    agg = out.get(start)
+    if agg is None:
+        out[start] = {"count": count, "min": lo, "max": hi, "sum": total, "last": last, "last_timestamp": last_ts}
+        return
+    agg["count"] += count
+    agg["min"] = min(agg["min"], lo)
+    agg["max"] = max(agg["max"], hi)
+    agg["sum"] += total
+    if last_ts >= agg["last_timestamp"]:
+        agg["last"] = last
+        agg["last_timestamp"] = last_ts
+
+@readings_bp.route("/aggregate", methods=["GET"])
+def aggregate_readings():
+    """API endpoint returning min/max/mean/count/last of one feature per time bucket for one source."""
+    source = request.args.get("source")
+    feature = request.args.get("feature", "sea_level")
+    if not source:
+        return jsonify({"error": "source is required"}), 400
+    if feature not in models.READING_FEATURES:
+        return jsonify({"error": f"feature must be one of {list(models.READING_FEATURES)}"}), 400
+    try:
+        width_s = parse_bucket(request.args.get("bucket", "1h"))
+        end = parse_utc(request.args.get("to"), datetime.now(timezone.utc))
+        start = parse_utc(request.args.get("from"), end - timedelta(days=1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rollup = choose_rollup(width_s)
+    db = next(get_db()) # Get a database session
+    out = {}
+
+    # Rollup buckets only cover whole rollup widths: the unaligned edges of [from, to)
+    # are read from raw rows so both paths count exactly the same readings
+    inner_start = inner_end = start
+    if rollup:
+        rollup_s = ROLLUP_BUCKETS[rollup]
+        inner_start = bucket_start(start, rollup_s)
+        if inner_start < start:
+            inner_start += timedelta(seconds=rollup_s)
+        inner_end = max(bucket_start(end, rollup_s), inner_start)
+
+    if inner_start < inner_end:
+        # Range scan on the rollup primary key (bucket, source, feature, bucket_start)
+        rows = db.execute(
+            select(models.ReadingRollup)
+            .where(
+                models.ReadingRollup.bucket == rollup,
+                models.ReadingRollup.source == source,
+                models.ReadingRollup.feature == feature,
+                models.ReadingRollup.bucket_start >= inner_start,
+                models.ReadingRollup.bucket_start < inner_end,
+            )
+            .order_by(models.ReadingRollup.bucket_start)
+        ).scalars()
+        for r in rows:
+            _fold(out, bucket_start(r.bucket_start, width_s), r.count, r.min, r.max, r.sum,
+                  r.last, as_utc(r.last_timestamp))
+        edges = [(start, inner_start), (inner_end, end)]
+    else:
+        # Finer than any rollup (or shorter than one rollup bucket): raw readings only
+        rollup = None
+        edges = [(start, end)]
+
+    # Raw rows through the (source, timestamp) index
+    column = getattr(models.SensorReading, feature)
+    for lo, hi in edges:
+        if lo >= hi:
+            continue
+        rows = db.execute(
+            select(models.SensorReading.timestamp, column)
+            .where(
+                models.SensorReading.source == source,
+                models.SensorReading.timestamp >= lo,
+                models.SensorReading.timestamp < hi,
+                column.is_not(None),
+            )
+            .order_by(models.SensorReading.timestamp)
+        )
+        for ts, value in rows:
+            ts = as_utc(ts)
+            _fold(out, bucket_start(ts, width_s), 1, value, value, value, value, ts)
+
+    buckets = [
+        {
+            "bucket_start": key.isoformat(),
+            "count": agg["count"],
+            "min": agg["min"],
+            "max": agg["max"],
+            "mean": agg["sum"] / agg["count"],
+            "last": agg["last"],
+        }
+        for key, agg in sorted(out.items())
+    ]
+    return jsonify({
+        "source": source,
+        "feature": feature,
+        "bucket_seconds": width_s,
+        "rollup": rollup or "raw",
+        # Rollups are folded in every ROLLUP_INTERVAL_S, so the newest readings may be missing from them
+        "rollup_lag_seconds": ROLLUP_INTERVAL_S if rollup else 0,
+        "from": start.isoformat(),
+        "to": end.isoformat(),
+        "buckets": buckets,
+    }), 200
+
+@readings_bp.route("/export", methods=["GET"])
+def export_readings():
+    """API endpoint streaming readings as NDJSON or CSV (gzip with ?gzip=1), filtered by
+    source, sensor_type, from and to. Memory use does not depend on the number of rows."""
+    fmt = request.args.get("format", "ndjson")
+    compress = request.args.get("gzip", "0").lower() in ("1", "true", "yes")
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of {list(EXPORT_FORMATS)}"}), 400
+    try:
+        start = parse_utc(request.args.get("from"))
+        end = parse_utc(request.args.get("to"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    stream = export_stream(fmt, compress, source=request.args.get("source"),
+                           sensor_type=request.args.get("sensor_type"), start=start, end=end)
+    filename = f"sensor_readings.{'csv' if fmt == 'csv' else 'ndjson'}{'.gz' if compress else ''}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    # Served as a .gz file rather than Content-Encoding so clients keep the compressed download
+    mimetype = "application/gzip" if compress else ("text/csv" if fmt == "csv" else "application/x-ndjson")
+    return Response(stream_with_context(stream), mimetype=mimetype, headers=headers)
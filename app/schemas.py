@@ -14,4 +14,5 @@ class AlertOut(BaseModel):
     severity: str
     message: str
     payload: Dict[str, Any]
-    created_at: str # Will be ISO formatted string
\ No newline at end of file
+    created_at: str # Will be ISO formatted string
+    model_version: Optional[str] = None
\ No newline at end of file
@@ -0,0 +1,17 @@
+# app/timeutils.py
+"""Timestamp helpers shared by the API, export and training code.
+
+SQLite keeps DateTime values as wall-clock strings and drops any UTC offset, so
+every bound has to be converted to UTC before it reaches a query.
+"""
+from datetime import datetime, timezone
+
+def as_utc(ts: datetime) -> datetime:
+    """Converts an aware datetime to UTC; naive datetimes (as returned by SQLite) are taken as UTC."""
+    return ts.astimezone(timezone.utc) if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+def parse_utc(value, default=None):
+    """Parses an optional ISO-8601 timestamp into an aware UTC datetime (naive means UTC)."""
+    if not value:
+        return default
+    return as_utc(datetime.fromisoformat(value))
@@ -10,6 +10,8 @@ def get_db():
 import os
 import json
 import asyncio
+import threading
+from collections import deque
 import httpx # Make sure httpx is in your requirements.txt
 from twilio.rest import Client
 
@@ -48,29 +50,178 @@ def send_sms_if_needed(alert_id: int, prob: float):
     for r in recipients:
         send_sms_via_twilio(f"ALERT {alert_id}: Coastal threat probability {prob:.2f}", r)
 
-async def _send_to_websocket_server(payload: dict):
-    """Internal helper to send data to the WebSocket server's HTTP endpoint."""
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(HTTP_BROADCAST_URL, json=payload, timeout=5)
+# Broadcast client tuning: bounded buffer, batch size and how long to wait for a batch to fill
+BROADCAST_BUFFER_SIZE = int(os.getenv("BROADCAST_BUFFER_SIZE", "10000"))
+BROADCAST_MAX_BATCH = int(os.getenv("BROADCAST_MAX_BATCH", "500"))
+BROADCAST_LINGER_MS = float(os.getenv("BROADCAST_LINGER_MS", "5"))
+# Alerts are only dropped past this many queued (e.g. a long relay outage); readings go first
+BROADCAST_MAX_ALERTS = int(os.getenv("BROADCAST_MAX_ALERTS", "100000"))
+# Backoff between retries after a failed POST, doubling from the minimum up to the maximum
+BROADCAST_RETRY_MIN_S = float(os.getenv("BROADCAST_RETRY_MIN_S", "0.1"))
+BROADCAST_RETRY_MAX_S = float(os.getenv("BROADCAST_RETRY_MAX_S", "5"))
+
+class BroadcastClient:
+    """Long-lived relay client running on its own background thread and event loop.
+
+    Request threads call submit(), which only appends to a bounded buffer, so ingest
+    latency never depends on the relay. The sender coalesces whatever is queued into
+    one JSON-array POST over a pooled keep-alive connection.
+
+    When the buffer is full the oldest reading makes room; alerts are kept, and only
+    beyond max_alerts queued alerts is the oldest alert dropped. If a POST fails, its
+    alerts go back to the front of the buffer and are retried with exponential backoff,
+    while its readings (stale by the time the relay is back) are dropped. Every drop is
+    counted in stats().
+    """
+
+    def __init__(self, url=HTTP_BROADCAST_URL, buffer_size=BROADCAST_BUFFER_SIZE,
+                 max_batch=BROADCAST_MAX_BATCH, linger_ms=BROADCAST_LINGER_MS,
+                 max_alerts=BROADCAST_MAX_ALERTS, retry_min_s=BROADCAST_RETRY_MIN_S,
+                 retry_max_s=BROADCAST_RETRY_MAX_S):
+        self.url = url
+        self.buffer_size = buffer_size
+        self.max_batch = max_batch
+        self.linger_s = linger_ms / 1000.0
+        self.max_alerts = max_alerts
+        self.retry_min_s = retry_min_s
+        self.retry_max_s = retry_max_s
+        self._buffer = deque()
+        self._alerts = 0 # alerts currently in the buffer
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "sent": 0, "dropped": 0, "dropped_alerts": 0, "retried_alerts": 0,
+                       "batches": 0, "failed_batches": 0, "max_depth": 0}
+        self._loop = asyncio.new_event_loop()
+        self._wakeup = None
+        ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(ready,), name="broadcast-client", daemon=True)
+        self._thread.start()
+        ready.wait()
+
+    def submit(self, payload: dict):
+        """Queues a message for the relay without blocking."""
+        is_alert = payload.get("type") == "alert"
+        with self._lock:
+            self._stats["submitted"] += 1
+            if len(self._buffer) >= self.buffer_size and not self._drop_oldest_reading():
+                # Only alerts are queued: a reading gives way, an alert still gets in
+                if not is_alert:
+                    self._stats["dropped"] += 1
+                    return
+                if self._alerts >= self.max_alerts:
+                    self._drop_oldest_alert()
+            self._buffer.append(payload)
+            self._alerts += is_alert
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._buffer))
+        self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _drop_oldest_reading(self) -> bool:
+        # Caller holds the lock
+        for i, message in enumerate(self._buffer):
+            if message.get("type") != "alert":
+                del self._buffer[i]
+                self._stats["dropped"] += 1
+                return True
+        return False
+
+    def _drop_oldest_alert(self):
+        # Caller holds the lock; only called when the buffer holds nothing but alerts
+        self._buffer.popleft()
+        self._alerts -= 1
+        self._stats["dropped"] += 1
+        self._stats["dropped_alerts"] += 1
+
+    def _take_batch(self) -> list:
+        with self._lock:
+            n = min(len(self._buffer), self.max_batch)
+            batch = [self._buffer.popleft() for _ in range(n)]
+            self._alerts -= sum(1 for m in batch if m.get("type") == "alert")
+            return batch
+
+    def _requeue_alerts(self, batch) -> int:
+        """Puts a failed batch's alerts back at the front, in order; returns how many."""
+        alerts = [m for m in batch if m.get("type") == "alert"]
+        with self._lock:
+            self._buffer.extendleft(reversed(alerts))
+            self._alerts += len(alerts)
+            self._stats["retried_alerts"] += len(alerts)
+            self._stats["dropped"] += len(batch) - len(alerts)
+        return len(alerts)
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        ready.set()
+        self._loop.run_until_complete(self._send_loop())
+
+    async def _send_loop(self):
+        # One pooled client for the life of the process: connections are reused across POSTs
+        async with httpx.AsyncClient(timeout=5) as client:
+            while True:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                if self.linger_s:
+                    await asyncio.sleep(self.linger_s) # Let a burst accumulate into one POST
+                backoff = self.retry_min_s
+                while True:
+                    batch = self._take_batch()
+                    if not batch:
+                        break
+                    if await self._post(client, batch):
+                        backoff = self.retry_min_s
+                    elif self._requeue_alerts(batch):
+                        await asyncio.sleep(backoff) # Give the relay time to come back
+                        backoff = min(backoff * 2, self.retry_max_s)
+
+    async def _post(self, client, batch) -> bool:
+        try:
+            response = await client.post(self.url, json=batch)
             response.raise_for_status() # Raise an exception for 4xx/5xx responses
-            print(f"Successfully sent to WebSocket server: {payload.get('type', 'unknown')}")
-    except httpx.RequestError as exc:
-        print(f"An error occurred while requesting {exc.request.url!r}: {exc}")
-    except httpx.HTTPStatusError as exc:
-        print(f"Error response {exc.response.status_code} from {exc.request.url!r}: {exc.response.text}")
-    except Exception as e:
-        print(f"Unexpected error sending to WebSocket server: {e}")
+            ok = True
+        except httpx.RequestError as exc:
+            print(f"An error occurred while requesting {exc.request.url!r}: {exc}")
+            ok = False
+        except httpx.HTTPStatusError as exc:
+            print(f"Error response {exc.response.status_code} from {exc.request.url!r}: {exc.response.text}")
+            ok = False
+        except Exception as e:
+            print(f"Unexpected error sending to WebSocket server: {e}")
+            ok = False
+        with self._lock:
+            if ok:
+                self._stats["sent"] += len(batch)
+                self._stats["batches"] += 1
+            else:
+                self._stats["failed_batches"] += 1
+        return ok
+
+    def stats(self) -> dict:
+        """Returns buffering and backpressure counters."""
+        with self._lock:
+            s = dict(self._stats)
+            s["depth"] = len(self._buffer)
+            s["alerts_depth"] = self._alerts
+        s["avg_batch_size"] = s["sent"] / s["batches"] if s["batches"] else 0.0
+        return s
+
+_broadcast_client = None
+_broadcast_client_lock = threading.Lock()
+
+def get_broadcast_client() -> BroadcastClient:
+    """Returns the process-wide broadcast client, starting it on first use."""
+    global _broadcast_client
+    if _broadcast_client is None:
+        with _broadcast_client_lock:
+            if _broadcast_client is None:
+                _broadcast_client = BroadcastClient()
+    return _broadcast_client
 
 def broadcast_alert(payload: dict):
     """Broadcasts an alert message to connected WebSocket clients."""
     payload["type"] = "alert" # Add type for frontend to distinguish
-    # Use asyncio.create_task to run the async HTTP request in the background
-    asyncio.create_task(_send_to_websocket_server(payload))
+    get_broadcast_client().submit(payload)
     print("Scheduled alert broadcast:", payload)
 
 def broadcast_reading(payload: dict):
     """Broadcasts a sensor reading message to connected WebSocket clients."""
     payload["type"] = "reading" # Add type for frontend to distinguish
-    asyncio.create_task(_send_to_websocket_server(payload))
-    print("Scheduled reading broadcast:", payload)
\ No newline at end of file
+    get_broadcast_client().submit(payload)
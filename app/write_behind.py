@@ -0,0 +1,112 @@
+# app/write_behind.py
+"""Group-commit write-behind buffer for sensor readings and alerts.
+
+Request threads hand ORM rows to the buffer instead of committing them one by one.
+A single writer thread flushes everything queued as one multi-row INSERT per table
+inside one transaction, either every WRITE_BEHIND_MAX_ROWS readings or after
+WRITE_BEHIND_MAX_DELAY_MS, whichever comes first.
+
+WRITE_BEHIND_ACK picks the crash-safety trade-off:
+  after_flush  - the request waits for the commit that contains its rows (durable, gets IDs)
+  before_flush - the request returns immediately; rows queued at crash time are lost
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from .database import SessionLocal
+
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+WRITE_BEHIND_MAX_ROWS = int(os.getenv("WRITE_BEHIND_MAX_ROWS", "500"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "50"))
+WRITE_BEHIND_ACK = os.getenv("WRITE_BEHIND_ACK", "after_flush")
+
+ACK_MODES = ("after_flush", "before_flush")
+
+class WriteBehindBuffer:
+    """Buffers (reading, alert) row pairs and commits them in groups."""
+
+    def __init__(self, session_factory=SessionLocal, max_rows=WRITE_BEHIND_MAX_ROWS,
+                 max_delay_ms=WRITE_BEHIND_MAX_DELAY_MS):
+        self.session_factory = session_factory
+        self.max_rows = max_rows
+        self.max_delay_s = max_delay_ms / 1000.0
+        self._queue = Queue()
+        self._lock = threading.Lock()
+        self._stats = {"rows": 0, "flushes": 0, "failed_flushes": 0, "max_group_size": 0}
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def submit(self, reading, alert=None) -> Future:
+        """Queues a SensorReading (and optional Alert) row.
+
+        The returned future resolves to (reading_id, alert_id) once the group commit
+        containing the rows succeeds, or raises the commit error.
+        """
+        future = Future()
+        self._queue.put((reading, alert, future))
+        return future
+
+    def _run(self):
+        while True:
+            group = [self._queue.get()]
+            deadline = time.perf_counter() + self.max_delay_s
+            while len(group) < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    group.append(self._queue.get(timeout=remaining))
+                except Empty:
+                    break
+            self._flush(group)
+
+    def _flush(self, group):
+        db = self.session_factory()
+        try:
+            db.add_all(reading for reading, _, _ in group)
+            db.add_all(alert for _, alert, _ in group if alert is not None)
+            db.flush() # Assigns primary keys via multi-row INSERT ... RETURNING
+            ids = [(reading.id, alert.id if alert is not None else None) for reading, alert, _ in group]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"Write-behind flush of {len(group)} rows failed: {e}")
+            with self._lock:
+                self._stats["failed_flushes"] += 1
+            for _, _, future in group:
+                future.set_exception(e)
+            return
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["rows"] += len(group)
+            self._stats["flushes"] += 1
+            self._stats["max_group_size"] = max(self._stats["max_group_size"], len(group))
+        for (_, _, future), row_ids in zip(group, ids):
+            future.set_result(row_ids)
+
+    def stats(self) -> dict:
+        """Returns group-commit statistics since startup."""
+        with self._lock:
+            s = dict(self._stats)
+        s["avg_group_size"] = s["rows"] / s["flushes"] if s["flushes"] else 0.0
+        s["queue_depth"] = self._queue.qsize()
+        return s
+
+# Process-wide buffer, started on first use
+_buffer = None
+_buffer_lock = threading.Lock()
+
+def get_write_buffer() -> WriteBehindBuffer:
+    """Returns the shared write-behind buffer, starting its writer thread on first call."""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                if WRITE_BEHIND_ACK not in ACK_MODES:
+                    raise ValueError(f"WRITE_BEHIND_ACK must be one of {ACK_MODES}, got {WRITE_BEHIND_ACK!r}")
+                _buffer = WriteBehindBuffer()
+    return _buffer
@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, Float, String, DateTime, JSON
+from sqlalchemy import Column, Integer, Float, String, DateTime, JSON, Index
 from sqlalchemy.sql import func
 from .database import Base
 
@@ -19,3 +19,6 @@ class Alert(Base):
     message = Column(String)
     payload = Column(JSON)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # matches the (created_at, id) keyset used by GET /alerts
+    __table_args__ = (Index("ix_alerts_created_at_id", "created_at", "id"),)
@@ -1,13 +1,19 @@
 # alerts.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from ..database import SessionLocal
+from sqlalchemy import tuple_
 from sqlalchemy.orm import Session
 from .. import models
 from ..schemas import AlertOut
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import base64
+import json
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
 
+MAX_PAGE_SIZE = 500
+
 def get_db():
     db = SessionLocal()
     try:
@@ -15,7 +21,39 @@ def get_db():
     finally:
         db.close()
 
+def encode_cursor(created_at: datetime, alert_id: int) -> str:
+    # opaque token for the (created_at, id) position of the last alert on a page
+    raw = json.dumps([created_at.isoformat(), alert_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, alert_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(alert_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
 @router.get("/", response_model=List[AlertOut])
-def list_alerts(limit: int = 50, db: Session = Depends(get_db)):
-    q = db.query(models.Alert).order_by(models.Alert.created_at.desc()).limit(limit)
-    return q.all()
+def list_alerts(response: Response, limit: int = 50, cursor: Optional[str] = None,
+                severity: Optional[str] = None, alert_type: Optional[str] = None,
+                start: Optional[datetime] = Query(None, alias="from"),
+                end: Optional[datetime] = Query(None, alias="to"),
+                db: Session = Depends(get_db)):
+    # keyset pagination on (created_at, id): pass the X-Next-Cursor header back as ?cursor=
+    limit = min(max(limit, 1), MAX_PAGE_SIZE)
+    q = db.query(models.Alert)
+    if severity:
+        q = q.filter(models.Alert.severity == severity)
+    if alert_type:
+        q = q.filter(models.Alert.alert_type == alert_type)
+    if start:
+        q = q.filter(models.Alert.created_at >= start)
+    if end:
+        q = q.filter(models.Alert.created_at < end)
+    if cursor:
+        q = q.filter(tuple_(models.Alert.created_at, models.Alert.id) < tuple_(*decode_cursor(cursor)))
+    alerts = q.order_by(models.Alert.created_at.desc(), models.Alert.id.desc()).limit(limit + 1).all()
+    if len(alerts) > limit:
+        alerts = alerts[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(alerts[-1].created_at, alerts[-1].id)
+    return alerts
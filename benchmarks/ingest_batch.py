@@ -0,0 +1,74 @@
+# benchmarks/ingest_batch.py
+"""Compares readings/sec of POST /ingest/reading against POST /ingest/readings.
+
+Runs in-process through Flask's test client against a throwaway SQLite file,
+with the WebSocket broadcasts and SMS hooks disabled so only ingest is measured.
+
+    python -m benchmarks.ingest_batch --readings 500 --batch-size 100
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_reading(i):
+    return {
+        "sensor_type": "tide",
+        "source": f"tide_gauge_{i % 8}",
+        "values": {
+            "sea_level": random.uniform(0.0, 2.0),
+            "wind_speed": random.uniform(0.0, 40.0),
+            "salinity": random.uniform(30.0, 38.0),
+            "temp": random.uniform(20.0, 30.0),
+            "chl_a": random.uniform(0.0, 1.5),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--readings", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    # app/database.py points at ./local_dev.db, so run from a scratch directory
+    sys.path.insert(0, REPO_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix="ingest_bench_"))
+
+    from app.main import app
+    from app.routes import ingest
+
+    ingest.broadcast_reading = lambda payload: None
+    ingest.broadcast_alert = lambda payload: None
+    ingest.send_sms_if_needed = lambda alert_id, prob: None
+
+    client = app.test_client()
+    readings = [make_reading(i) for i in range(args.readings)]
+
+    start = time.perf_counter()
+    for reading in readings:
+        client.post("/ingest/reading", json=reading)
+    single = args.readings / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for i in range(0, len(readings), args.batch_size):
+        client.post("/ingest/readings", json=readings[i:i + args.batch_size])
+    batched = args.readings / (time.perf_counter() - start)
+
+    print(json.dumps({
+        "readings": args.readings,
+        "batch_size": args.batch_size,
+        "single_readings_per_sec": round(single, 1),
+        "batch_readings_per_sec": round(batched, 1),
+        "speedup": round(batched / single, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# benchmarks/startup.py
+"""Measures cold-start cost of the Flask backend in a fresh interpreter.
+
+Reports the time to import app.main, the time until the first request to /
+is answered, and the time until /ready reports a warm model.
+
+    python -m benchmarks.startup --runs 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Executed in a child process so that every run pays the full import cost
+CHILD = r"""
+import json, os, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+os.chdir(sys.argv[2])
+from app.main import app
+t_import = time.perf_counter()
+client = app.test_client()
+client.get("/")
+t_first = time.perf_counter()
+while client.get("/ready").status_code != 200:
+    time.sleep(0.01)
+t_ready = time.perf_counter()
+print(json.dumps({
+    "import_s": t_import - t0,
+    "first_request_s": t_first - t0,
+    "model_ready_s": t_ready - t0,
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    # Run from a scratch directory so local_dev.db is created there, with model paths pinned to the repo
+    workdir = tempfile.mkdtemp(prefix="startup_bench_")
+    env = dict(os.environ)
+    env.setdefault("MODEL_PATH", os.path.join(REPO_ROOT, "app", "ml", "saved_model.keras"))
+    env.setdefault("NUMPY_MODEL_PATH", os.path.join(REPO_ROOT, "app", "ml", "saved_model.npz"))
+
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD, REPO_ROOT, workdir],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    summary = {key: round(statistics.median(r[key] for r in runs), 3) for key in runs[0]}
+    print(json.dumps({"runs": runs, "median": summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
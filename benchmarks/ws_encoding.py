@@ -0,0 +1,105 @@
+# benchmarks/ws_encoding.py
+"""Compares the relay's wire protocols on bytes per message and encoding CPU.
+
+Generates a stream of readings from --sources gauges (random walks, like a live
+deployment) and encodes it with each protocol the relay can negotiate, starting
+from the plain json.dumps path. Sizes are reported before and after
+permessage-deflate, which is simulated with the relay's window size and context
+takeover.
+
+    python -m benchmarks.ws_encoding --messages 20000 --sources 20
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websocket_server
+from websocket_server import Frame, reading_delta, msgpack
+
+
+def make_readings(n, n_sources, seed=0):
+    rng = random.Random(seed)
+    state = {f"tide_gauge_{i}": {"sea_level": 1.0 + rng.random(), "wind_speed": 10 * rng.random(),
+                                  "pressure": 1010.0, "rainfall": 0.0, "temperature": 20.0,
+                                  "latitude": 29.3 + i * 0.01, "longitude": -94.8 - i * 0.01}
+             for i in range(n_sources)}
+    readings = []
+    for i in range(n):
+        source = f"tide_gauge_{i % n_sources}"
+        values = state[source]
+        values["sea_level"] = round(values["sea_level"] + rng.gauss(0, 0.01), 3)
+        values["wind_speed"] = round(max(0.0, values["wind_speed"] + rng.gauss(0, 0.2)), 2)
+        if rng.random() < 0.1:
+            values["pressure"] = round(values["pressure"] + rng.gauss(0, 0.5), 1)
+        readings.append({"type": "reading", "sensor_type": "tide", "source": source,
+                         "timestamp": f"2026-10-18T12:{(i // 60) % 60:02d}:{i % 60:02d}+00:00",
+                         "values": dict(values), "seq": i + 1})
+    return readings
+
+
+def encode_all(readings, protocol):
+    """Encodes readings the way a client on `protocol` would receive them."""
+    encoding, _, delta = protocol.partition(".")
+    last_sent = {}
+    out = []
+    for message in readings:
+        if delta:
+            previous = last_sent.get(message["source"])
+            last_sent[message["source"]] = message
+            if previous is not None:
+                d = reading_delta(previous, message)
+                out.append(msgpack.packb(d) if encoding == "msgpack" else json.dumps(d))
+                continue
+        frame = Frame(message)
+        out.append(frame.msgpack if encoding == "msgpack" else frame.json)
+    return out
+
+
+def deflated_sizes(payloads):
+    """Per-message sizes under permessage-deflate with context takeover (12-bit window)."""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -12)
+    total = 0
+    for payload in payloads:
+        data = payload.encode("utf-8") if isinstance(payload, str) else payload
+        # The trailing 00 00 ff ff of each sync flush is not sent on the wire
+        total += len(compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)) - 4
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--sources", type=int, default=20)
+    args = parser.parse_args()
+
+    readings = make_readings(args.messages, args.sources)
+    protocols = ["json"] + [p.replace("coastal.", "") for p in websocket_server.SUBPROTOCOLS]
+    results = {}
+    for protocol in protocols:
+        best = float("inf")
+        for _ in range(3):
+            started = time.perf_counter()
+            payloads = encode_all(readings, protocol)
+            best = min(best, time.perf_counter() - started)
+        raw = sum(len(p.encode("utf-8") if isinstance(p, str) else p) for p in payloads)
+        results[protocol] = {
+            "bytes_per_message": round(raw / len(payloads), 1),
+            "deflated_bytes_per_message": round(deflated_sizes(payloads) / len(payloads), 1),
+            "encode_us_per_message": round(1e6 * best / len(payloads), 2),
+        }
+    baseline = results["json"]
+    for result in results.values():
+        result["bytes_vs_json"] = round(result["bytes_per_message"] / baseline["bytes_per_message"], 3)
+        result["cpu_vs_json"] = round(result["encode_us_per_message"] / baseline["encode_us_per_message"], 3)
+    print(json.dumps({"messages": args.messages, "sources": args.sources,
+                      "msgpack_available": msgpack is not None, "protocols": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# benchmarks/ws_fanout.py
+"""Measures WebSocket relay fan-out latency with many connected clients.
+
+Starts websocket_server's handler on an ephemeral port in-process, connects
+--clients dashboards (a --slow-fraction of which read slowly), broadcasts
+--messages readings and reports how long broadcast_message blocks the caller
+and how long delivery to the fast clients takes.
+
+    python -m benchmarks.ws_fanout --clients 1000 --messages 200 --slow-fraction 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import websockets
+import websocket_server
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100.0 * len(values)))] if values else None
+
+
+async def run_client(url, slow, expected, latencies, done):
+    async with websockets.connect(url, max_queue=None) as ws:
+        received = 0
+        async for raw in ws:
+            msg = json.loads(raw)
+            if not slow:
+                latencies.append(time.perf_counter() - msg["sent_at"])
+            else:
+                await asyncio.sleep(0.05) # Simulates a dashboard on a bad link
+            received += 1
+            if received >= expected:
+                break
+    done.append(received)
+
+
+async def main_async(args):
+    server = await websockets.serve(websocket_server.websocket_handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    url = f"ws://127.0.0.1:{port}"
+
+    latencies = []
+    done = []
+    n_slow = int(args.clients * args.slow_fraction)
+    tasks = [
+        asyncio.create_task(run_client(url, i < n_slow, args.messages, latencies, done))
+        for i in range(args.clients)
+    ]
+    while len(websocket_server.CONNECTED_CLIENTS) < args.clients:
+        await asyncio.sleep(0.05)
+
+    enqueue_times = []
+    started = time.perf_counter()
+    for i in range(args.messages):
+        message = {"type": "reading", "source": "bench", "values": {"sea_level": i}, "sent_at": time.perf_counter()}
+        t0 = time.perf_counter()
+        await websocket_server.broadcast_message(message)
+        enqueue_times.append(time.perf_counter() - t0)
+        await asyncio.sleep(1.0 / args.rate)
+
+    # Wait for the fast clients; slow ones are expected to fall behind
+    fast_expected = (args.clients - n_slow) * args.messages
+    deadline = time.perf_counter() + 60
+    while len(latencies) < fast_expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    dropped = sum(c.dropped for c in websocket_server.CONNECTED_CLIENTS.values())
+    for task in tasks:
+        task.cancel()
+    server.close()
+
+    return {
+        "clients": args.clients,
+        "slow_clients": n_slow,
+        "messages": args.messages,
+        "broadcast_call_ms_p50": 1000 * statistics.median(enqueue_times),
+        "broadcast_call_ms_max": 1000 * max(enqueue_times),
+        "delivery_ms_p50": 1000 * percentile(latencies, 50),
+        "delivery_ms_p99": 1000 * percentile(latencies, 99),
+        "fast_deliveries": len(latencies),
+        "fast_deliveries_expected": fast_expected,
+        "deliveries_per_sec": len(latencies) / elapsed,
+        "dropped_for_slow_clients": dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=50.0, help="broadcasts per second")
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--conflate-hz", type=float, default=0.0,
+                        help="relay conflation rate; 0 (default) measures raw fan-out of every reading")
+    args = parser.parse_args()
+
+    # Each client needs a socket on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = 4 * args.clients + 256
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(hard, wanted)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, wanted), hard))
+    websocket_server.logging.getLogger().setLevel("WARNING")
+    websocket_server.CONFLATE_HZ = args.conflate_hz
+
+    result = asyncio.run(main_async(args))
+    print(json.dumps({k: round(v, 3) if isinstance(v, float) else v for k, v in result.items()}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+# benchmarks/ws_loadtest.py
+"""End-to-end load test of the WebSocket relay through its HTTP broadcast port.
+
+Starts websocket_server.py as a subprocess, opens --clients simulated dashboards
+spread over --client-procs processes (a --slow-fraction of them read slowly), and
+POSTs readings plus a share of alerts at --rate messages per second. Reports
+delivery throughput, end-to-end latency percentiles per message type, relay memory
+per connection and the relay's own drop counters as JSON, so runs can be compared
+between releases.
+
+    python -m benchmarks.ws_loadtest --clients 2000 --rate 200 --duration 20 -o loadtest.json
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from benchmarks.ws_workers import ROOT, free_port, raise_fd_limit
+
+
+def client_proc(url, n_clients, slow_ids, slow_delay, ready, stop, results):
+    """Runs n_clients connections and reports received counts and latencies by type."""
+    import websockets
+    raise_fd_limit(2 * n_clients + 256)
+
+    async def run():
+        latencies = {"reading": array("d"), "alert": array("d")}
+        received = {"fast": 0, "slow": 0}
+        connected = []
+
+        async def one(i):
+            slow = i in slow_ids
+            async with websockets.connect(url, max_queue=None) as ws:
+                connected.append(i)
+                async for raw in ws:
+                    msg = json.loads(raw)
+                    if "sent_at" not in msg:
+                        continue
+                    if slow:
+                        received["slow"] += 1
+                        await asyncio.sleep(slow_delay) # A dashboard on a bad link
+                    else:
+                        received["fast"] += 1
+                        latencies.get(msg["type"], latencies["reading"]).append(time.time() - msg["sent_at"])
+
+        tasks = [asyncio.create_task(one(i)) for i in range(n_clients)]
+        while len(connected) < n_clients:
+            if any(t.done() for t in tasks):
+                break
+            await asyncio.sleep(0.01)
+        ready.release()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        for task in tasks:
+            task.cancel()
+        results.put({"received": received, "connected": len(connected),
+                     "latencies": {k: v.tolist() for k, v in latencies.items()}})
+
+    asyncio.run(run())
+
+
+def process_rss_kb(pid) -> int:
+    """Resident memory of a process and all of its descendants (Linux /proc)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        p = pending.pop()
+        try:
+            with open(f"/proc/{p}/status") as f:
+                total += next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pending.extend(int(c) for c in f.read().split())
+        except (OSError, StopIteration):
+            continue
+    return total
+
+
+def scrape_metrics(http_port) -> dict:
+    """Parses the relay's /metrics into {name or name{labels}: value}, skipping histogram buckets."""
+    conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+    conn.request("GET", "/metrics")
+    text = conn.getresponse().read().decode("utf-8")
+    conn.close()
+    metrics = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#") and "_bucket{" not in line:
+            name, value = line.rsplit(" ", 1)
+            metrics[name] = float(value)
+    return metrics
+
+
+def wait_for_relay(http_port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            return scrape_metrics(http_port)
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("relay did not start")
+
+
+def percentiles(values) -> dict:
+    if not values:
+        return {}
+    values = sorted(values)
+
+    def pick(q):
+        return round(1000 * values[min(len(values) - 1, int(q * len(values)))], 3)
+    return {"p50_ms": pick(0.50), "p90_ms": pick(0.90), "p99_ms": pick(0.99), "p999_ms": pick(0.999),
+            "max_ms": round(1000 * values[-1], 3), "samples": len(values)}
+
+
+def publish(http_port, rate, duration, batch, alert_fraction, sources):
+    """POSTs messages at `rate` per second in batches; returns counts by type."""
+    conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=30)
+    rng = random.Random(0)
+    counts = {"reading": 0, "alert": 0}
+    interval = batch / rate
+    started = time.perf_counter()
+    next_send = started
+    while time.perf_counter() - started < duration:
+        messages = []
+        for _ in range(batch):
+            n = counts["reading"] + counts["alert"]
+            if rng.random() < alert_fraction:
+                message = {"type": "alert", "alert_type": "threat", "severity": "high", "message": "load test",
+                           "payload": {"probability": 0.9}}
+            else:
+                message = {"type": "reading", "sensor_type": "tide", "source": f"gauge_{n % sources}",
+                           "values": {"sea_level": rng.random(), "wind_speed": 10 * rng.random()}}
+            message["sent_at"] = time.time()
+            counts[message["type"]] += 1
+            messages.append(message)
+        conn.request("POST", "/broadcast", body=json.dumps(messages), headers={"Content-Type": "application/json"})
+        conn.getresponse().read()
+        next_send += interval
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+    conn.close()
+    return counts, time.perf_counter() - started
+
+
+def run(args):
+    ws_port, http_port = free_port(), free_port()
+    env = dict(os.environ, WS_WORKERS=str(args.workers), WEBSOCKET_PORT=str(ws_port),
+               HTTP_BROADCAST_PORT=str(http_port), WS_CONFLATE_HZ=str(args.conflate_hz),
+               WS_BROKER_SOCKET=os.path.join(tempfile.mkdtemp(), "broker.sock"), WS_LOG_LEVEL="WARNING")
+    relay = subprocess.Popen([sys.executable, os.path.join(ROOT, "websocket_server.py")], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                             preexec_fn=lambda: raise_fd_limit(2 * args.clients + 1024))
+    ctx = multiprocessing.get_context("spawn")
+    ready, stop, results = ctx.Semaphore(0), ctx.Event(), ctx.Queue()
+    procs = []
+    try:
+        wait_for_relay(http_port)
+        time.sleep(0.5) # Workers bind after the broker's HTTP port opens
+        rss_idle_kb = process_rss_kb(relay.pid)
+
+        n_slow = int(args.clients * args.slow_fraction)
+        per_proc = [args.clients // args.client_procs + (1 if i < args.clients % args.client_procs else 0)
+                    for i in range(args.client_procs)]
+        offset = 0
+        for n in per_proc:
+            # Slow clients are spread evenly over the client processes
+            slow_ids = {i for i in range(n) if (offset + i) * n_slow // args.clients
+                        != (offset + i + 1) * n_slow // args.clients}
+            procs.append(ctx.Process(target=client_proc, daemon=True,
+                                     args=(f"ws://127.0.0.1:{ws_port}", n, slow_ids, args.slow_delay,
+                                           ready, stop, results)))
+            offset += n
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.acquire()
+        deadline = time.time() + 60
+        while scrape_metrics(http_port).get("relay_connected_clients", 0) < args.clients and time.time() < deadline:
+            time.sleep(0.2)
+        connected = int(scrape_metrics(http_port).get("relay_connected_clients", 0))
+        rss_connected_kb = process_rss_kb(relay.pid)
+
+        posted, publish_s = publish(http_port, args.rate, args.duration, args.batch, args.alert_fraction, args.sources)
+        time.sleep(args.drain) # Let queued messages reach the fast clients
+        rss_peak_kb = process_rss_kb(relay.pid)
+        metrics = scrape_metrics(http_port)
+        stop.set()
+        reports = [results.get(timeout=60) for _ in procs]
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
+        relay.terminate()
+        relay.wait(timeout=10)
+
+    latencies = {"reading": [], "alert": []}
+    received = {"fast": 0, "slow": 0}
+    for report in reports:
+        for kind, values in report["latencies"].items():
+            latencies[kind].extend(values)
+        for kind, n in report["received"].items():
+            received[kind] += n
+    total_posted = posted["reading"] + posted["alert"]
+    n_fast = connected - n_slow
+    elapsed = publish_s + args.drain
+    return {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "clients_connected": connected,
+        "slow_clients": n_slow,
+        "messages_posted": posted,
+        "publish_rate_achieved": round(total_posted / publish_s, 1),
+        "throughput": {
+            "deliveries_per_sec": round((received["fast"] + received["slow"]) / elapsed, 1),
+            "fast_deliveries": received["fast"],
+            "fast_deliveries_expected": n_fast * total_posted,
+            "slow_deliveries": received["slow"],
+        },
+        "latency": {kind: percentiles(values) for kind, values in latencies.items()},
+        "memory": {
+            "relay_rss_idle_kb": rss_idle_kb,
+            "relay_rss_connected_kb": rss_connected_kb,
+            "relay_rss_after_load_kb": rss_peak_kb,
+            "kb_per_connection": round((rss_connected_kb - rss_idle_kb) / max(connected, 1), 2),
+        },
+        "drops": {
+            "dropped": int(metrics.get("relay_messages_dropped_total", 0)),
+            "conflated": int(metrics.get("relay_messages_conflated_total", 0)),
+            "laggards_disconnected": int(metrics.get("relay_laggards_disconnected_total", 0)),
+            "send_failures": int(metrics.get("relay_send_failures_total", 0)),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=0.05, help="seconds a slow client spends per message")
+    parser.add_argument("--rate", type=float, default=200.0, help="messages per second through the HTTP port")
+    parser.add_argument("--batch", type=int, default=10, help="messages per POST")
+    parser.add_argument("--alert-fraction", type=float, default=0.02)
+    parser.add_argument("--sources", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--drain", type=float, default=2.0, help="seconds to wait for delivery after publishing")
+    parser.add_argument("--workers", type=int, default=1, help="relay worker processes (WS_WORKERS)")
+    parser.add_argument("--conflate-hz", type=float, default=0.0)
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("-o", "--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    raise_fd_limit(4 * args.clients + 1024)
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
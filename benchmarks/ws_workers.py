@@ -0,0 +1,169 @@
+# benchmarks/ws_workers.py
+"""Measures relay throughput as WebSocket worker processes are added.
+
+For each worker count the relay is started as a subprocess with WS_WORKERS set,
+--clients dashboards are spread over --client-procs load-generator processes, and
+readings are POSTed in batches to the broker's HTTP port for --duration seconds.
+Reports messages delivered per second per worker count and the speedup over the
+first count. Client processes need CPU too, so run it on a machine with spare cores.
+
+    python -m benchmarks.ws_workers --workers 1 2 4 --clients 2000 --duration 10
+"""
+import argparse
+import asyncio
+import http.client
+import json
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def raise_fd_limit(n):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = n if hard == resource.RLIM_INFINITY else min(hard, n)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, wanted), hard))
+
+
+def client_proc(url, n_clients, ready, start, stop, results):
+    """Holds n_clients connections open and counts the messages they receive."""
+    import websockets
+    raise_fd_limit(2 * n_clients + 256)
+
+    async def run():
+        counts = []
+
+        async def one():
+            received = 0
+            counts.append(0)
+            slot = len(counts) - 1
+            async with websockets.connect(url, max_queue=None) as ws:
+                async for _ in ws:
+                    received += 1
+                    counts[slot] = received
+
+        tasks = [asyncio.create_task(one()) for _ in range(n_clients)]
+        while len(counts) < n_clients:
+            await asyncio.sleep(0.01)
+        ready.release()
+        while not start.is_set():
+            await asyncio.sleep(0.01)
+        baseline = sum(counts)
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        results.put(sum(counts) - baseline)
+        for task in tasks:
+            task.cancel()
+
+    asyncio.run(run())
+
+
+def post(conn, messages):
+    body = json.dumps(messages)
+    conn.request("POST", "/broadcast", body=body, headers={"Content-Type": "application/json"})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def wait_for_clients(http_port, expected, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=5)
+            conn.request("GET", "/clients")
+            clients = json.loads(conn.getresponse().read())["clients"]
+            conn.close()
+            if len(clients) >= expected:
+                return len({c.get("worker") for c in clients})
+        except (OSError, ValueError, KeyError):
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"only some of {expected} clients connected")
+
+
+def run_one(workers, args):
+    ws_port, http_port = free_port(), free_port()
+    env = dict(os.environ, WS_WORKERS=str(workers), WEBSOCKET_PORT=str(ws_port),
+               HTTP_BROADCAST_PORT=str(http_port), WS_CONFLATE_HZ="0",
+               WS_BROKER_SOCKET=os.path.join(tempfile.mkdtemp(), "broker.sock"))
+    relay = subprocess.Popen([sys.executable, os.path.join(ROOT, "websocket_server.py")], env=env,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                             preexec_fn=lambda: raise_fd_limit(2 * args.clients + 1024))
+    ctx = multiprocessing.get_context("spawn")
+    ready, start, stop, results = ctx.Semaphore(0), ctx.Event(), ctx.Event(), ctx.Queue()
+    procs = []
+    try:
+        time.sleep(1.0) # Let the broker and workers bind
+        per_proc = args.clients // args.client_procs
+        procs = [ctx.Process(target=client_proc, daemon=True,
+                             args=(f"ws://127.0.0.1:{ws_port}", per_proc, ready, start, stop, results))
+                 for _ in range(args.client_procs)]
+        for p in procs:
+            p.start()
+        for _ in procs:
+            ready.acquire()
+        workers_seen = wait_for_clients(http_port, per_proc * args.client_procs)
+
+        conn = http.client.HTTPConnection("127.0.0.1", http_port, timeout=30)
+        start.set()
+        started = time.perf_counter()
+        posted = 0
+        while time.perf_counter() - started < args.duration:
+            batch = [{"type": "reading", "source": f"gauge_{(posted + i) % 50}", "values": {"sea_level": i}}
+                     for i in range(args.batch)]
+            post(conn, batch)
+            posted += len(batch)
+        time.sleep(1.0) # Let queued messages drain
+        stop.set()
+        delivered = sum(results.get(timeout=30) for _ in procs)
+        elapsed = time.perf_counter() - started
+        return {
+            "workers": workers,
+            "workers_with_clients": workers_seen,
+            "clients": per_proc * args.client_procs,
+            "messages_posted": posted,
+            "messages_delivered": delivered,
+            "delivered_per_sec": round(delivered / elapsed, 1),
+        }
+    finally:
+        stop.set()
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        relay.terminate()
+        relay.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=2000)
+    parser.add_argument("--client-procs", type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing per worker count")
+    parser.add_argument("--batch", type=int, default=100, help="messages per POST")
+    args = parser.parse_args()
+    raise_fd_limit(4 * args.clients + 1024)
+
+    runs = [run_one(n, args) for n in args.workers]
+    base = runs[0]["delivered_per_sec"] or 1
+    for run in runs:
+        run["speedup"] = round(run["delivered_per_sec"] / base, 2)
+    print(json.dumps({"cpu_count": os.cpu_count(), "runs": runs}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import Alert
+from app.alerts_cache import invalidate_alerts_cache
+import app.routes.alerts as alerts
+
+START = datetime(2026, 10, 1, 10, 0, tzinfo=timezone.utc)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'alerts.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    db.add_all(Alert(alert_type="coastal_threat", severity="high", message=f"alert {i}", payload={},
+                     created_at=START + timedelta(hours=i)) for i in range(3))
+    db.commit()
+    db.close()
+    monkeypatch.setattr(alerts, "SessionLocal", factory)
+    invalidate_alerts_cache()
+    app = Flask(__name__)
+    app.register_blueprint(alerts.alerts_bp)
+    yield app.test_client()
+    invalidate_alerts_cache()
+    engine.dispose()
+
+def test_offset_bounds_are_converted_to_utc(client):
+    # 11:00+02:00 is 09:00Z, before every alert; 13:00+02:00 is 11:00Z
+    r = client.get("/alerts/", query_string={"from": "2026-10-01T11:00:00+02:00", "to": "2026-10-01T13:00:00+02:00"})
+    assert r.status_code == 200
+    assert [a["message"] for a in r.json] == ["alert 0"]
+
+def test_cursor_pages(client):
+    r = client.get("/alerts/", query_string={"limit": 2})
+    assert [a["message"] for a in r.json] == ["alert 2", "alert 1"]
+    r = client.get("/alerts/", query_string={"limit": 2, "cursor": r.headers["X-Next-Cursor"]})
+    assert [a["message"] for a in r.json] == ["alert 0"]
+    assert "X-Next-Cursor" not in r.headers
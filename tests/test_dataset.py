@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import SensorReading, READING_FEATURES
+from app.ml.dataset import iter_reading_chunks, with_history, shuffle_chunks, parse_chunk, threat_label
+from app.ml.temporal import TemporalFeatureStore, TEMPORAL_FEATURE_KEYS
+from app.timeutils import parse_utc
+
+START = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'readings.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    for i in range(10):
+        db.add(SensorReading.from_values({"sea_level": float(i), "wind_speed": 10.0 + i, "note": "x"},
+                                         source=f"gauge_{i % 2}", timestamp=START + timedelta(minutes=10 * i)))
+    # A legacy row that still keeps its payload in the JSON column
+    db.add(SensorReading(values={"sea_level": 0.5, "chl_a": "n/a"}, source="gauge_0",
+                         timestamp=START + timedelta(minutes=100)))
+    db.commit()
+    db.close()
+    yield factory
+    engine.dispose()
+
+def test_iter_reading_chunks(session_factory):
+    chunks = list(iter_reading_chunks(chunk_size=4, session_factory=session_factory))
+    assert [len(X) for _, _, X in chunks] == [4, 4, 3]
+
+    sources, epochs, X = (np.concatenate(parts) for parts in zip(*chunks))
+    assert X.shape == (11, len(READING_FEATURES))
+    assert list(X[:10, 0]) == [float(i) for i in range(10)]
+    assert list(sources[:2]) == ["gauge_0", "gauge_1"]
+    assert epochs[1] - epochs[0] == 600
+    # Legacy row: numeric values read from JSON, anything else missing
+    assert X[10, 0] == 0.5 and np.isnan(X[10, 1]) and np.isnan(X[10, 4])
+
+def test_iter_reading_chunks_time_range(session_factory):
+    chunks = list(iter_reading_chunks(chunk_size=3, since=START + timedelta(minutes=20),
+                                      until=START + timedelta(minutes=60), session_factory=session_factory))
+    X = np.concatenate([X for _, _, X in chunks])
+    assert list(X[:, 0]) == [2.0, 3.0, 4.0, 5.0]
+
+def test_iter_reading_chunks_offset_bounds(session_factory):
+    # 02:20+02:00 .. 03:00+02:00 is 00:20Z .. 01:00Z
+    chunks = list(iter_reading_chunks(since=parse_utc("2026-01-01T02:20:00+02:00"),
+                                      until=parse_utc("2026-01-01T03:00:00+02:00"), session_factory=session_factory))
+    X = np.concatenate([X for _, _, X in chunks])
+    assert list(X[:, 0]) == [2.0, 3.0, 4.0, 5.0]
+
+def test_with_history_carries_over_chunks(session_factory):
+    store = TemporalFeatureStore()
+    chunked = np.concatenate([with_history(s, e, X, store)
+                              for s, e, X in iter_reading_chunks(chunk_size=3, session_factory=session_factory)])
+    (s, e, X), = iter_reading_chunks(chunk_size=100, session_factory=session_factory)
+    whole = with_history(s, e, X, TemporalFeatureStore())
+    assert chunked.shape == (11, len(READING_FEATURES) + len(TEMPORAL_FEATURE_KEYS))
+    np.testing.assert_array_equal(chunked, whole)
+
+def test_shuffle_chunks_mixes_across_chunks():
+    chunks = [np.arange(start, start + 10, dtype=np.float64)[:, None] for start in range(0, 100, 10)]
+    out = list(shuffle_chunks(iter(chunks), buffer_rows=30, seed=0))
+
+    rows = np.concatenate(out)[:, 0]
+    assert sorted(rows) == list(range(100)) # every row exactly once
+    assert all(len(chunk) <= 30 for chunk in out)
+    # Emitted chunks draw on several source chunks rather than one id range
+    assert any(len(set(chunk[:, 0] // 10)) > 1 for chunk in out[:-1])
+    assert not np.array_equal(rows, np.arange(100))
+
+def test_shuffle_chunks_empty():
+    assert list(shuffle_chunks(iter([]), buffer_rows=10)) == []
+
+def test_parse_chunk_fills_missing_values():
+    X = np.array([[1.0, np.nan, 34.0, 25.0, 0.5]])
+    features, labels = parse_chunk(X)
+    assert features.dtype == np.float32 and labels.dtype == np.float32
+    assert features[0, 1] == 0.0
+    assert labels[0] == pytest.approx(threat_label(np.nan_to_num(X))[0])
@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import SensorReading
+from app.export import iter_readings
+from app.timeutils import parse_utc
+
+START = datetime(2026, 10, 1, 10, 0, tzinfo=timezone.utc)
+
+def test_offset_bounds_select_utc_window(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'export.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all(SensorReading.from_values({"sea_level": float(i)}, source="g1", timestamp=START + timedelta(hours=i))
+               for i in range(4))
+    db.commit()
+    db.close()
+
+    # 13:00+02:00 .. 15:00+02:00 is 11:00Z .. 13:00Z
+    rows = list(iter_readings(start=parse_utc("2026-10-01T13:00:00+02:00"), end=parse_utc("2026-10-01T15:00:00+02:00"),
+                              session_factory=factory))
+    assert [row["sea_level"] for row in rows] == [1.0, 2.0]
+    engine.dispose()
@@ -0,0 +1,62 @@
+import json
+import pytest
+from flask import Flask
+from sqlalchemy import create_engine, select, func
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import SensorReading, Alert
+from app.ml.model import CoastalThreatModel
+import app.routes.ingest as ingest
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ingest.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # No model files: scoring falls back to the heuristic
+    model = CoastalThreatModel(model_path=str(tmp_path / "missing.keras"), numpy_path=None)
+    monkeypatch.setattr(ingest, "SessionLocal", factory)
+    monkeypatch.setattr(ingest, "get_model", lambda: model)
+    monkeypatch.setattr(ingest, "broadcast_reading", lambda message: None)
+    monkeypatch.setattr(ingest, "broadcast_alert", lambda message: None)
+    monkeypatch.setattr(ingest, "WRITE_BEHIND_ENABLED", False)
+    app = Flask(__name__)
+    app.register_blueprint(ingest.ingest_bp)
+    client = app.test_client()
+    client.session_factory = factory
+    yield client
+    engine.dispose()
+
+def count(factory, model):
+    with factory() as db:
+        return db.execute(select(func.count()).select_from(model)).scalar()
+
+def test_null_feature_single_reading(client):
+    r = client.post("/ingest/reading", json={"sensor_type": "tide", "source": "g1",
+                                             "values": {"sea_level": None, "wind_speed": 5}})
+    assert r.status_code == 200
+    assert r.json["model_version"] == "heuristic"
+    assert r.json["probability"] == pytest.approx(5 / 50 * 0.3)
+    assert count(client.session_factory, SensorReading) == 1
+
+def test_null_feature_batch(client):
+    body = json.dumps([{"sensor_type": "tide", "source": "g1", "values": {"sea_level": None, "wind_speed": 5}}])
+    r = client.post("/ingest/readings", data=body)
+    assert r.status_code == 200
+    assert r.json["results"][0]["probability"] == pytest.approx(5 / 50 * 0.3)
+    assert count(client.session_factory, SensorReading) == 1
+
+def test_single_reading_stores_alert_with_reading(client):
+    r = client.post("/ingest/reading", json={"sensor_type": "tide", "source": "g1",
+                                             "values": {"sea_level": 2.0, "wind_speed": 50, "chl_a": 2.0}})
+    assert r.status_code == 200 and r.json["probability"] == pytest.approx(1.0)
+    assert count(client.session_factory, SensorReading) == 1
+    assert count(client.session_factory, Alert) == 1
+
+def test_scoring_error_stores_nothing(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError("scoring failed")
+    monkeypatch.setattr(ingest, "classify_threat", fail)
+    r = client.post("/ingest/reading", json={"sensor_type": "tide", "source": "g1", "values": {"sea_level": 1.0}})
+    assert r.status_code == 500
+    assert count(client.session_factory, SensorReading) == 0
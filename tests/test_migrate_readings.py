@@ -0,0 +1,35 @@
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import SensorReading
+from app.migrate_readings import backfill
+
+def make_db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all(SensorReading(values={"sea_level": float(i), "lat": 1.5}, source="g1") for i in range(5))
+    db.commit()
+    db.close()
+    return engine, factory
+
+def test_backfill_moves_payload_once(tmp_path):
+    engine, factory = make_db(tmp_path)
+    assert backfill(chunk_size=2, session_factory=factory) == 5
+    assert backfill(chunk_size=2, session_factory=factory) == 0
+    with factory() as db:
+        rows = db.execute(select(SensorReading).order_by(SensorReading.id)).scalars().all()
+        assert [(r.values, r.sea_level, r.extra) for r in rows][0] == (None, 0.0, {"lat": 1.5})
+    engine.dispose()
+
+def test_backfill_keep_json_is_rerunnable(tmp_path):
+    engine, factory = make_db(tmp_path)
+    assert backfill(chunk_size=2, keep_json=True, session_factory=factory) == 5
+    assert backfill(chunk_size=2, keep_json=True, session_factory=factory) == 0
+    with factory() as db:
+        row = db.execute(select(SensorReading).order_by(SensorReading.id)).scalars().first()
+        assert (row.values, row.sea_level) == ({"sea_level": 0.0, "lat": 1.5}, 0.0)
+    # A later run without --keep-json still clears the kept payloads
+    assert backfill(chunk_size=2, session_factory=factory) == 5
+    engine.dispose()
@@ -0,0 +1,53 @@
+import threading
+import numpy as np
+import pytest
+from concurrent.futures import TimeoutError
+from app.ml.model import MicroBatcher, CoastalThreatModel
+
+def double(x):
+    return x[:, 0] * 2
+
+def test_microbatcher_scores_rows():
+    batcher = MicroBatcher(double, max_size=8, wait_ms=1)
+    assert batcher.submit(np.array([1.5])) == 3.0
+    batcher.close()
+
+def test_submit_after_close_runs_inline():
+    batcher = MicroBatcher(double, max_size=8, wait_ms=1)
+    batcher.close()
+    batcher._worker.join(timeout=1)
+    assert not batcher._worker.is_alive()
+    assert batcher.submit(np.array([2.0])) == 4.0
+
+def test_close_drains_queued_rows():
+    release = threading.Event()
+    def slow(x):
+        release.wait(1)
+        return double(x)
+    batcher = MicroBatcher(slow, max_size=1, wait_ms=0)
+    results = []
+    threads = [threading.Thread(target=lambda v=v: results.append(batcher.submit(np.array([v])))) for v in (1.0, 2.0, 3.0)]
+    for t in threads:
+        t.start()
+    batcher.close()
+    release.set()
+    for t in threads:
+        t.join(timeout=2)
+    assert sorted(results) == [2.0, 4.0, 6.0]
+
+def test_submit_times_out():
+    release = threading.Event()
+    batcher = MicroBatcher(lambda x: (release.wait(2), double(x))[1], max_size=1, wait_ms=0, timeout_s=0.05)
+    with pytest.raises(TimeoutError):
+        batcher.submit(np.array([1.0]))
+    release.set()
+    batcher.close()
+
+def test_predict_falls_back_to_heuristic_on_timeout(tmp_path):
+    model = CoastalThreatModel(model_path=str(tmp_path / "missing.keras"), numpy_path=None)
+    release = threading.Event()
+    model.model = object() # any loaded model: scoring goes through the batcher
+    model.batcher = MicroBatcher(lambda x: (release.wait(2), double(x))[1], max_size=1, wait_ms=0, timeout_s=0.05)
+    assert model.predict({"wind_speed": 50}) == pytest.approx(0.3)
+    release.set()
+    model.close()
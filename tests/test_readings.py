@@ -0,0 +1,53 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from flask import Flask
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.database import Base
+from app.models import SensorReading
+from app.rollups import RollupJob
+import app.routes.readings as readings
+
+START = datetime(2026, 10, 1, tzinfo=timezone.utc)
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'readings.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = factory()
+    # One reading every 10 minutes for two days, value = minutes since START
+    db.add_all(SensorReading.from_values({"sea_level": float(10 * i)}, source="g1",
+                                         timestamp=START + timedelta(minutes=10 * i))
+               for i in range(288))
+    db.commit()
+    db.close()
+    while RollupJob(session_factory=factory).run_once():
+        pass
+    monkeypatch.setattr(readings, "SessionLocal", factory)
+    app = Flask(__name__)
+    app.register_blueprint(readings.readings_bp)
+    yield app.test_client()
+    engine.dispose()
+
+def aggregate(client, start, end, bucket):
+    r = client.get("/readings/aggregate", query_string={
+        "source": "g1", "feature": "sea_level", "from": start, "to": end, "bucket": bucket})
+    assert r.status_code == 200, r.json
+    return r.json
+
+def test_unaligned_rollup_matches_raw(client):
+    # 1h reads the hourly rollup, 30s is finer than any rollup and reads raw rows
+    start, end = "2026-10-01T01:25:00+00:00", "2026-10-01T05:35:00+00:00"
+    rolled = aggregate(client, start, end, "1h")
+    raw = aggregate(client, start, end, "30s")
+    assert rolled["rollup"] == "1h" and raw["rollup"] == "raw"
+    assert sum(b["count"] for b in rolled["buckets"]) == sum(b["count"] for b in raw["buckets"]) == 25
+    assert rolled["buckets"][0]["min"] == 90 # 01:30, not 01:00
+    assert rolled["buckets"][-1]["max"] == 330 # 05:30, not 05:50
+
+def test_offset_bounds_are_converted_to_utc(client):
+    # 03:00+02:00 is 01:00Z
+    result = aggregate(client, "2026-10-01T03:00:00+02:00", "2026-10-01T04:00:00+02:00", "1h")
+    assert result["from"] == "2026-10-01T01:00:00+00:00"
+    assert [(b["min"], b["max"], b["count"]) for b in result["buckets"]] == [(60, 110, 6)]
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+from app.ml import registry
+from app.ml.model import CoastalThreatModel
+from app.ml.numpy_engine import ACTIVATIONS
+
+def relu(z):
+    return ACTIVATIONS["relu"](z)
+
+def sigmoid(z):
+    return ACTIVATIONS["sigmoid"](z)
+
+class Dense:
+    def __init__(self, name, kernel, bias, activation):
+        self.name = name
+        self.kernel = kernel.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.activation = activation
+
+    def get_weights(self):
+        return [self.kernel, self.bias]
+
+class FakeKerasModel:
+    """Stands in for a trained Keras Dense stack, so publishing runs without TensorFlow."""
+
+    def __init__(self, n_features=5, seed=0):
+        rng = np.random.default_rng(seed)
+        self.layers = [
+            Dense("dense", rng.normal(size=(n_features, 8)), rng.normal(size=8), relu),
+            Dense("dense_1", rng.normal(size=(8, 1)), rng.normal(size=1), sigmoid),
+        ]
+        self.input_shape = (None, n_features)
+
+    def predict(self, x, batch_size=None, verbose=0):
+        h = np.asarray(x, dtype=np.float32)
+        for layer in self.layers:
+            h = layer.activation(h @ layer.kernel + layer.bias)
+        return h
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(b"fake keras model")
+
+def test_publish_and_activate_with_numpy_engine(tmp_path):
+    registry_dir = str(tmp_path / "registry")
+    first = registry.publish(FakeKerasModel(seed=1), registry_dir, metadata={"note": "first"})
+    second = registry.publish(FakeKerasModel(seed=2), registry_dir, make_current=False)
+
+    assert (first, second) == ("v0001", "v0002")
+    assert registry.current_version(registry_dir) == "v0001"
+    assert [v["version"] for v in registry.list_versions(registry_dir)] == ["v0001", "v0002"]
+    assert registry.list_versions(registry_dir)[0]["note"] == "first"
+
+    registry.activate(second, registry_dir)
+    assert registry.current_version(registry_dir) == "v0002"
+
+    keras_path, numpy_path = registry.version_paths(second, registry_dir)
+    model = CoastalThreatModel(model_path=keras_path, numpy_path=numpy_path, version=second)
+    assert (model.backend, model.version) == ("numpy", "v0002")
+    x = np.array([[0.5, 10.0, 34.0, 25.0, 0.5]])
+    expected = FakeKerasModel(seed=2).predict(x)[0, 0]
+    assert model.predict(dict(zip(model.feature_keys, x[0]))) == pytest.approx(expected, abs=1e-5)
+
+def test_activate_unknown_version(tmp_path):
+    with pytest.raises(ValueError):
+        registry.activate("v0042", str(tmp_path))
+
+def test_list_versions_sorts_numerically(tmp_path):
+    for name in ("v9999", "v10000", "v0002", "notes"):
+        (tmp_path / name).mkdir()
+    assert [v["version"] for v in registry.list_versions(str(tmp_path))] == ["v0002", "v9999", "v10000"]
+
+def test_admin_reload_conflict_leaves_current(tmp_path, monkeypatch):
+    from flask import Flask
+    import app.ml.model as model_module
+    import app.routes.admin as admin
+
+    registry_dir = str(tmp_path / "registry")
+    for seed in (1, 2):
+        registry.publish(FakeKerasModel(seed=seed), registry_dir)
+    registry.activate("v0001", registry_dir)
+    activate, has_version = registry.activate, registry.has_version
+    monkeypatch.setattr(registry, "activate", lambda version, _=None: activate(version, registry_dir))
+    monkeypatch.setattr(registry, "has_version", lambda version, _=None: has_version(version, registry_dir))
+    monkeypatch.setattr(admin, "ADMIN_TOKEN", "secret")
+    monkeypatch.setitem(model_module._reload_status, "state", "loading")
+
+    app = Flask(__name__)
+    app.register_blueprint(admin.admin_bp)
+    r = app.test_client().post("/admin/model/reload", json={"version": "v0002"}, headers={"X-Admin-Token": "secret"})
+    assert r.status_code == 409
+    assert registry.current_version(registry_dir) == "v0001"
@@ -2,105 +2,954 @@
 import asyncio
 import websockets
 import json
-from http.server import BaseHTTPRequestHandler, HTTPServer
-import threading
 import logging
+import multiprocessing
+import os
+import time
+from bisect import bisect_left
+from collections import deque
+from heapq import merge
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import msgpack # Optional: enables the binary wire protocol
+except ImportError:
+    msgpack = None
 
 # Configure logging
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=os.getenv("WS_LOG_LEVEL", "INFO").upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Per-message log lines cost CPU even when filtered (the f-string is still built), so they are opt-in
+LOG_MESSAGES = os.getenv("WS_LOG_MESSAGES", "0").lower() in ("1", "true", "yes")
+
+WEBSOCKET_PORT = int(os.getenv("WEBSOCKET_PORT", "8001"))
+HTTP_BROADCAST_PORT = int(os.getenv("HTTP_BROADCAST_PORT", "8002"))
+
+# Per-client outbound queue policy
+CLIENT_QUEUE_SIZE = int(os.getenv("WS_CLIENT_QUEUE_SIZE", "256"))         # readings kept per client before dropping the oldest
+CLIENT_MAX_PENDING_ALERTS = int(os.getenv("WS_CLIENT_MAX_ALERTS", "1024")) # alerts are never dropped; past this the client is cut off
+LAGGARD_TIMEOUT_S = float(os.getenv("WS_LAGGARD_TIMEOUT_S", "10"))        # disconnect clients whose queue stays full this long
+
+# Multi-process mode: WS_WORKERS > 1 runs that many worker processes sharing WEBSOCKET_PORT,
+# fed by a broker (the parent process) over a Unix-domain socket
+WS_WORKERS = int(os.getenv("WS_WORKERS", "1"))
+BROKER_SOCKET = os.getenv("WS_BROKER_SOCKET", "/tmp/coastal_relay_broker.sock")
+
+# permessage-deflate for clients that offer it ("deflate") or never ("none"). Compression runs per connection.
+WS_COMPRESSION = os.getenv("WS_COMPRESSION", "deflate")
+
+# Wire protocols a client may request as a WebSocket subprotocol; clients that ask for none get plain JSON.
+# ".delta" variants send readings as changes against the previous reading of the same source.
+SUBPROTOCOLS = (["coastal.msgpack.delta", "coastal.msgpack"] if msgpack else []) + ["coastal.json.delta"]
+
+# Recent messages kept per topic (message type + source) for clients that reconnect
+REPLAY_SIZE = int(os.getenv("WS_REPLAY_SIZE", "500"))
+
+# Opt-in: readings are conflated per (source, client) and flushed at most this many times per
+# second. Conflated clients miss intermediate readings and may see an alert before the reading
+# behind it, so the default of 0 sends every reading in order.
+CONFLATE_HZ = float(os.getenv("WS_CONFLATE_HZ", "0"))
+
+# Maps each connected websocket to its Client state
+CONNECTED_CLIENTS = {}
+
+# Subscription dimensions matched by exact value: message type, reading sensor_type/source, alert severity
+FILTER_DIMENSIONS = ("type", "sensor_type", "source", "severity")
+
+def message_coordinates(message: dict):
+    """Returns (lat, lon) from a reading's values or an alert's payload, if present."""
+    body = message.get("values") or message.get("payload") or {}
+    lat, lon = body.get("latitude"), body.get("longitude")
+    if isinstance(lat, (int, float)) and isinstance(lon, (int, float)):
+        return lat, lon
+    return None
+
+class SubscriptionIndex:
+    """Index from topic values to the clients subscribed to them.
+
+    For each dimension a client either lists accepted values (indexed under each value)
+    or accepts anything (kept in that dimension's wildcard set). A broadcast starts from
+    the smallest candidate set among the dimensions present on the message and checks
+    the remaining dimensions per candidate, so its cost follows the number of plausible
+    subscribers rather than the total number of connections. A dimension that a message
+    does not carry (e.g. severity on a reading) does not filter it, and a bounding box
+    only filters messages that carry coordinates.
+    """
+
+    def __init__(self):
+        self.by_value = {dim: {} for dim in FILTER_DIMENSIONS}
+        self.wildcard = {dim: set() for dim in FILTER_DIMENSIONS}
+
+    def add(self, client):
+        for dim in FILTER_DIMENSIONS:
+            values = client.filters.get(dim)
+            if values is None:
+                self.wildcard[dim].add(client)
+            else:
+                for value in values:
+                    self.by_value[dim].setdefault(value, set()).add(client)
+
+    def remove(self, client):
+        for dim in FILTER_DIMENSIONS:
+            values = client.filters.get(dim)
+            if values is None:
+                self.wildcard[dim].discard(client)
+                continue
+            for value in values:
+                subscribers = self.by_value[dim].get(value)
+                if subscribers is not None:
+                    subscribers.discard(client)
+                    if not subscribers:
+                        del self.by_value[dim][value]
+
+    def match(self, message: dict):
+        """Returns the clients whose subscription accepts the message."""
+        present = [(dim, message[dim]) for dim in FILTER_DIMENSIONS if message.get(dim) is not None]
+        if not present:
+            return list(CONNECTED_CLIENTS.values())
+
+        # Pick the dimension with the fewest candidates, then verify the others per client
+        def candidates(item):
+            dim, value = item
+            return self.by_value[dim].get(value, ()), self.wildcard[dim]
+        best = min(present, key=lambda item: sum(len(group) for group in candidates(item)))
+        others = [item for item in present if item is not best]
+        coords = message_coordinates(message)
+
+        matched = []
+        for group in candidates(best):
+            for client in group:
+                if all(client.filters.get(dim) is None or value in client.filters[dim] for dim, value in others) \
+                        and (client.bbox is None or coords is None or client.in_bbox(coords)):
+                    matched.append(client)
+        return matched
+
+SUBSCRIPTIONS = SubscriptionIndex()
+
+class Histogram:
+    """Cumulative-bucket histogram in the shape Prometheus expects."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        return {"buckets": self.buckets, "counts": list(self.counts), "sum": self.sum}
+
+FANOUT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+DELIVERY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RelayMetrics:
+    """Counters and histograms served at GET /metrics in Prometheus text format.
+
+    Gauges (clients, queue depths) are computed at scrape time. In multi-worker mode
+    the broker merges its own snapshot with one from every worker.
+    """
+
+    def __init__(self):
+        self.received = {} # message type -> messages accepted on the broadcast port
+        self.sent = {}     # message type -> frames written to client sockets
+        self.send_failures = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.laggards_disconnected = 0
+        self.fanout = Histogram(FANOUT_BUCKETS)     # broadcast_message duration
+        self.delivery = Histogram(DELIVERY_BUCKETS) # broadcast to socket write, per client
+
+    @staticmethod
+    def count(counter: dict, message_type):
+        message_type = message_type if isinstance(message_type, str) else "unknown"
+        counter[message_type] = counter.get(message_type, 0) + 1
+
+    def snapshot(self) -> dict:
+        depths = [len(client.queue) for client in CONNECTED_CLIENTS.values()]
+        return {
+            "clients": len(CONNECTED_CLIENTS),
+            "queue_depth": sum(depths),
+            "queue_depth_max": max(depths, default=0),
+            "pending_alerts": sum(client.pending_alerts for client in CONNECTED_CLIENTS.values()),
+            "received": dict(self.received),
+            "sent": dict(self.sent),
+            "send_failures": self.send_failures,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "laggards_disconnected": self.laggards_disconnected,
+            "fanout": self.fanout.snapshot(),
+            "delivery": self.delivery.snapshot(),
+        }
+
+    @staticmethod
+    def merge(snapshots: list) -> dict:
+        """Adds worker snapshots together (queue_depth_max takes the maximum)."""
+        merged = snapshots[0]
+        for snap in snapshots[1:]:
+            for key, value in snap.items():
+                if key == "queue_depth_max":
+                    merged[key] = max(merged[key], value)
+                elif isinstance(value, dict) and "counts" in value:
+                    merged[key]["counts"] = [a + b for a, b in zip(merged[key]["counts"], value["counts"])]
+                    merged[key]["sum"] += value["sum"]
+                elif isinstance(value, dict):
+                    for label, n in value.items():
+                        merged[key][label] = merged[key].get(label, 0) + n
+                else:
+                    merged[key] += value
+        return merged
+
+    @staticmethod
+    def render(snap: dict) -> bytes:
+        lines = []
+
+        def label(value: str) -> str:
+            return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        metric("relay_connected_clients", "gauge", "Connected WebSocket clients.",
+               [f"relay_connected_clients {snap['clients']}"])
+        metric("relay_client_queue_depth", "gauge", "Messages waiting in client queues.",
+               [f"relay_client_queue_depth {snap['queue_depth']}"])
+        metric("relay_client_queue_depth_max", "gauge", "Deepest single client queue.",
+               [f"relay_client_queue_depth_max {snap['queue_depth_max']}"])
+        metric("relay_client_pending_alerts", "gauge", "Alerts waiting in client queues.",
+               [f"relay_client_pending_alerts {snap['pending_alerts']}"])
+        metric("relay_messages_received_total", "counter", "Messages accepted for broadcast, by type.",
+               [f'relay_messages_received_total{{type="{label(t)}"}} {n}' for t, n in sorted(snap["received"].items())])
+        metric("relay_messages_sent_total", "counter", "Messages written to client sockets, by type.",
+               [f'relay_messages_sent_total{{type="{label(t)}"}} {n}' for t, n in sorted(snap["sent"].items())])
+        metric("relay_send_failures_total", "counter", "Socket writes that failed.",
+               [f"relay_send_failures_total {snap['send_failures']}"])
+        metric("relay_messages_dropped_total", "counter", "Readings dropped from full client queues.",
+               [f"relay_messages_dropped_total {snap['dropped']}"])
+        metric("relay_messages_conflated_total", "counter", "Readings replaced by a newer one before sending.",
+               [f"relay_messages_conflated_total {snap['conflated']}"])
+        metric("relay_laggards_disconnected_total", "counter", "Clients disconnected for falling behind.",
+               [f"relay_laggards_disconnected_total {snap['laggards_disconnected']}"])
+        for name, key, help_text in (
+                ("relay_fanout_seconds", "fanout", "Time to queue one broadcast for all subscribers."),
+                ("relay_delivery_seconds", "delivery", "Time from broadcast to the socket write, per client.")):
+            hist = snap[key]
+            samples, cumulative = [], 0
+            for bound, n in zip(list(hist["buckets"]) + ["+Inf"], hist["counts"]):
+                cumulative += n
+                samples.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+            samples.append(f"{name}_sum {hist['sum']}")
+            samples.append(f"{name}_count {cumulative}")
+            metric(name, "histogram", help_text, samples)
+        return ("\n".join(lines) + "\n").encode('utf-8')
+
+METRICS = RelayMetrics()
+
+class Frame:
+    """One outbound message, serialized lazily and at most once per wire format."""
+    __slots__ = ("message", "created", "_json", "_msgpack")
+
+    def __init__(self, message: dict):
+        self.message = message
+        self.created = time.monotonic()
+        self._json = None
+        self._msgpack = None
+
+    @property
+    def json(self) -> str:
+        if self._json is None:
+            self._json = json.dumps(self.message)
+        return self._json
+
+    @property
+    def msgpack(self) -> bytes:
+        if self._msgpack is None:
+            self._msgpack = msgpack.packb(self.message)
+        return self._msgpack
+
+    @property
+    def is_alert(self) -> bool:
+        return self.message.get("type") == "alert"
+
+def reading_delta(previous: dict, message: dict) -> dict:
+    """Encodes a reading as the fields that changed since the previous reading of its source.
+
+    The client applies `values` (and any other top-level field present) over its copy of
+    the last reading and deletes the keys listed in `removed`.
+    """
+    delta = {"type": "reading_delta", "source": message["source"]}
+    for key, value in message.items():
+        if key not in ("type", "source", "values") and previous.get(key) != value:
+            delta[key] = value
+    old = previous.get("values") or {}
+    new = message.get("values") or {}
+    delta["values"] = {k: v for k, v in new.items() if k not in old or old[k] != v}
+    removed = [k for k in old if k not in new]
+    if removed:
+        delta["removed"] = removed
+    return delta
+
+class ReplayBuffer:
+    """Per-topic rings of recent broadcasts, stamped with a relay-wide sequence number.
+
+    A reconnecting dashboard asks for everything after the last `seq` it saw, or for
+    the last N messages, and is served from memory instead of querying /alerts.
+    """
+
+    def __init__(self, size=REPLAY_SIZE):
+        self.size = size
+        self.topics = {} # (type, source) -> deque of (seq, message, frame)
+        self.last_seq = 0
+
+    def stamp(self, message: dict) -> int:
+        """Assigns the next sequence number unless the broker already did.
+
+        A `seq` is only ever present on messages from the broker socket: the HTTP
+        handler strips it from posted messages.
+        """
+        if "seq" not in message:
+            self.last_seq += 1
+            message["seq"] = self.last_seq
+        else:
+            self.last_seq = max(self.last_seq, message["seq"])
+        return message["seq"]
+
+    def append(self, frame: Frame):
+        if self.size <= 0:
+            return
+        message = frame.message
+        topic = (message.get("type"), message.get("source"))
+        ring = self.topics.get(topic)
+        if ring is None:
+            ring = self.topics[topic] = deque(maxlen=self.size)
+        ring.append((message["seq"], message, frame))
+
+    def select(self, client, since=None, last=None) -> list:
+        """Returns (seq, message, frame) entries the client subscribes to, oldest first.
+
+        A `since` newer than anything buffered comes from before a relay restart, so the
+        whole buffer is replayed.
+        """
+        if since is not None and since > self.last_seq:
+            since = None
+        streams = []
+        for ring in self.topics.values():
+            if since is None:
+                streams.append(ring)
+                continue
+            # Rings are in seq order: walk back from the newest entry
+            newer = []
+            for entry in reversed(ring):
+                if entry[0] <= since:
+                    break
+                newer.append(entry)
+            newer.reverse()
+            streams.append(newer)
+        entries = [entry for entry in merge(*streams, key=lambda entry: entry[0]) if client.accepts(entry[1])]
+        return entries[-last:] if last else entries
+
+REPLAY = ReplayBuffer()
+
+def replay_to(client, since=None, last=None):
+    """Queues buffered messages for a client, followed by a marker with the newest seq."""
+    # Unflushed conflated readings are already in the buffer; drop them to avoid duplicates
+    client.latest_readings.clear()
+    entries = REPLAY.select(client, since=since, last=last)
+    for _, _, frame in entries:
+        client.enqueue(frame)
+    client.enqueue(Frame({"type": "replayed", "count": len(entries), "last_seq": REPLAY.last_seq}))
+
+def parse_filters(raw: dict):
+    """Validates a subscribe request's filters; returns (filters, bbox)."""
+    if not isinstance(raw, dict):
+        raise ValueError("filters must be an object")
+    filters = {}
+    for dim in FILTER_DIMENSIONS:
+        value = raw.get("types" if dim == "type" else dim)
+        if value is None:
+            continue
+        values = [value] if isinstance(value, str) else value
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"{dim} filter must be a string or a list of strings")
+        filters[dim] = frozenset(values)
+    bbox = raw.get("bbox")
+    if bbox is not None:
+        if not (isinstance(bbox, list) and len(bbox) == 4 and all(isinstance(v, (int, float)) for v in bbox)):
+            raise ValueError("bbox must be [min_lat, min_lon, max_lat, max_lon]")
+        bbox = tuple(bbox)
+    return filters, bbox
+
+class Client:
+    """A connected dashboard with its own bounded outbound queue and writer task.
+
+    Broadcasts only append to the queue, so a slow socket delays nobody but itself.
+    When the queue is full the oldest reading is dropped; alerts are never dropped,
+    and a client whose queue stays full for LAGGARD_TIMEOUT_S is disconnected.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        protocol = getattr(websocket, "subprotocol", None) or "coastal.json"
+        self.encoding = "msgpack" if protocol.startswith("coastal.msgpack") else "json"
+        self.delta = protocol.endswith(".delta")
+        self.last_sent = {} # source -> last reading sent, the base for delta encoding
+        self.queue = deque()
+        self.pending_alerts = 0
+        self.dropped = 0
+        self.sent = 0
+        self.full_since = None
+        self.filters = {} # dimension -> frozenset of accepted values; missing means any
+        self.bbox = None  # (min_lat, min_lon, max_lat, max_lon) or None
+        self.latest_readings = {} # source -> newest unflushed reading frame
+        self.conflated = 0
+        self._wakeup = asyncio.Event()
+        self.writer = asyncio.create_task(self._write_loop())
+
+    def accepts(self, message: dict) -> bool:
+        """Checks one message against this client's subscription (used for replay)."""
+        for dim, values in self.filters.items():
+            value = message.get(dim)
+            if value is not None and value not in values:
+                return False
+        coords = message_coordinates(message) if self.bbox is not None else None
+        return coords is None or self.in_bbox(coords)
+
+    def in_bbox(self, coords) -> bool:
+        min_lat, min_lon, max_lat, max_lon = self.bbox
+        return min_lat <= coords[0] <= max_lat and min_lon <= coords[1] <= max_lon
+
+    def subscribe(self, filters: dict, bbox):
+        """Replaces this client's subscription, keeping the index consistent."""
+        SUBSCRIPTIONS.remove(self)
+        self.filters = filters
+        self.bbox = bbox
+        SUBSCRIPTIONS.add(self)
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Queues a message; returns False if the client should be disconnected."""
+        is_alert = frame.is_alert
+        if is_alert:
+            self.pending_alerts += 1
+            if self.pending_alerts > CLIENT_MAX_PENDING_ALERTS:
+                return False
+        elif len(self.queue) - self.pending_alerts >= CLIENT_QUEUE_SIZE:
+            if not self._drop_oldest_reading():
+                return False
+        self.queue.append((frame, is_alert))
+        self._wakeup.set()
+
+        if len(self.queue) >= CLIENT_QUEUE_SIZE:
+            now = time.monotonic()
+            if self.full_since is None:
+                self.full_since = now
+            elif now - self.full_since > LAGGARD_TIMEOUT_S:
+                return False
+        return True
+
+    def _drop_oldest_reading(self) -> bool:
+        for i, (_, is_alert) in enumerate(self.queue):
+            if not is_alert:
+                del self.queue[i]
+                self.dropped += 1
+                METRICS.dropped += 1
+                return True
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                frame, is_alert = self.queue.popleft()
+                if is_alert:
+                    self.pending_alerts -= 1
+                if len(self.queue) < CLIENT_QUEUE_SIZE // 2:
+                    self.full_since = None
+                await self.websocket.send(self.encode(frame))
+                self.sent += 1
+                METRICS.count(METRICS.sent, frame.message.get("type"))
+                METRICS.delivery.observe(time.monotonic() - frame.created)
+        except websockets.exceptions.ConnectionClosed:
+            METRICS.send_failures += 1
+            logging.debug(f"Writer stopped, client closed: {self.websocket.remote_address}")
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            METRICS.send_failures += 1
+            logging.error(f"Error sending to {self.websocket.remote_address}: {e}")
+
+    def encode(self, frame: Frame):
+        """Returns the bytes or text to send in this client's negotiated protocol.
+
+        Plain frames are shared between clients (serialized once per format); only
+        delta-encoded readings are built per client, since each client's base differs.
+        """
+        message = frame.message
+        if self.delta and message.get("type") == "reading" and message.get("source") is not None:
+            previous = self.last_sent.get(message["source"])
+            self.last_sent[message["source"]] = message
+            if previous is not None:
+                delta = reading_delta(previous, message)
+                return msgpack.packb(delta) if self.encoding == "msgpack" else json.dumps(delta)
+        return frame.msgpack if self.encoding == "msgpack" else frame.json
 
-CONNECTED_CLIENTS = set()
+    def stats(self) -> dict:
+        return {
+            "address": str(self.websocket.remote_address),
+            "protocol": self.encoding + (".delta" if self.delta else ""),
+            "queue_depth": len(self.queue),
+            "pending_alerts": self.pending_alerts,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "conflated": self.conflated,
+            "filters": {dim: sorted(values) for dim, values in self.filters.items()},
+        }
 
-async def websocket_handler(websocket, path):
+def handle_client_message(client, raw: str):
+    """Handles a control message from a dashboard, e.g.
+
+    {"action": "subscribe", "filters": {"types": ["reading"], "sensor_type": "tide",
+     "source": ["tide_gauge_1"], "severity": ["high"], "bbox": [29.4, -95.6, 29.9, -95.1]}}
+    {"action": "unsubscribe"}  (back to receiving everything)
+    {"action": "replay", "since": 1234} or {"action": "replay", "last": 50}
+    """
+    try:
+        request = json.loads(raw)
+        action = request.get("action")
+        if action == "replay":
+            since, last = parse_replay(request.get("since"), request.get("last"))
+            replay_to(client, since=since, last=last)
+            return
+        if action == "subscribe":
+            filters, bbox = parse_filters(request.get("filters", {}))
+        elif action == "unsubscribe":
+            filters, bbox = {}, None
+        else:
+            raise ValueError(f"unknown action {action!r}")
+    except (ValueError, TypeError, AttributeError) as e:
+        client.enqueue(Frame({"type": "error", "message": str(e)}))
+        return
+    client.subscribe(filters, bbox)
+    client.enqueue(Frame({"type": "subscribed", "filters": client.stats()["filters"],
+                          "bbox": list(bbox) if bbox else None}))
+
+def parse_replay(since, last):
+    """Validates replay bounds from a control message or the connect URL's query string."""
+    since = int(since) if since not in (None, "") else None
+    last = int(last) if last not in (None, "") else None
+    if last is not None and last <= 0:
+        raise ValueError("last must be positive")
+    return since, last
+
+async def websocket_handler(websocket, path=None):
     """Handles WebSocket connections and messages."""
-    CONNECTED_CLIENTS.add(websocket)
+    client = Client(websocket)
+    CONNECTED_CLIENTS[websocket] = client
+    SUBSCRIPTIONS.add(client)
     logging.info(f"Client connected: {websocket.remote_address}. Total clients: {len(CONNECTED_CLIENTS)}")
+
+    # Resume on connect: ws://host:8001/?since=<seq> or ?last=<n>
+    request = getattr(websocket, "request", None)
+    query = parse_qs(urlsplit(request.path if request else (path or "")).query)
+    if "since" in query or "last" in query:
+        try:
+            since, last = parse_replay(query.get("since", [None])[0], query.get("last", [None])[0])
+            replay_to(client, since=since, last=last)
+        except ValueError as e:
+            client.enqueue(Frame({"type": "error", "message": str(e)}))
     try:
         async for message in websocket:
-            logging.info(f"Received message from client {websocket.remote_address}: {message}")
-            # In this setup, clients don't send messages to the server for broadcasting.
-            # They only receive. If you need client-to-client, add logic here.
+            if LOG_MESSAGES:
+                logging.info(f"Received message from client {websocket.remote_address}: {message}")
+            # Clients only send control messages (subscriptions); nothing is relayed client-to-client
+            handle_client_message(client, message)
     except websockets.exceptions.ConnectionClosedOK:
         logging.info(f"Client disconnected normally: {websocket.remote_address}")
     except websockets.exceptions.ConnectionClosedError as e:
         logging.error(f"Client disconnected with error: {websocket.remote_address} - {e}")
     finally:
-        CONNECTED_CLIENTS.remove(websocket)
+        client.writer.cancel()
+        CONNECTED_CLIENTS.pop(websocket, None)
+        SUBSCRIPTIONS.remove(client)
         logging.info(f"Client removed. Total clients: {len(CONNECTED_CLIENTS)}")
 
+def disconnect_laggard(client):
+    logging.warning(f"Disconnecting slow client {client.websocket.remote_address} "
+                    f"(queue depth {len(client.queue)}, dropped {client.dropped})")
+    METRICS.laggards_disconnected += 1
+    CONNECTED_CLIENTS.pop(client.websocket, None)
+    SUBSCRIPTIONS.remove(client)
+    client.writer.cancel()
+    asyncio.create_task(client.websocket.close(code=1008, reason="client too slow"))
+
+class Conflator:
+    """Holds the newest reading per (source, client) and flushes them at CONFLATE_HZ.
+
+    A gauge reporting at 10 Hz then costs each dashboard at most CONFLATE_HZ messages
+    per second; intermediate readings are replaced in place and counted as conflated.
+    """
+
+    def __init__(self):
+        self.dirty = set() # clients holding unflushed readings
+        self.task = None
+
+    def offer(self, client, source, frame: Frame):
+        if source in client.latest_readings:
+            client.conflated += 1
+            METRICS.conflated += 1
+        client.latest_readings[source] = frame
+        self.dirty.add(client)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self.dirty:
+            await asyncio.sleep(1.0 / CONFLATE_HZ)
+            self.flush()
+
+    def flush(self):
+        dirty, self.dirty = self.dirty, set()
+        for client in dirty:
+            pending, client.latest_readings = client.latest_readings, {}
+            if client.websocket not in CONNECTED_CLIENTS:
+                continue
+            for frame in pending.values():
+                if not client.enqueue(frame):
+                    disconnect_laggard(client)
+                    break
+
+CONFLATOR = Conflator()
+
 async def broadcast_message(message: dict):
-    """Sends a JSON message to all connected WebSocket clients."""
+    """Queues a message for every subscribed WebSocket client without waiting on any of them."""
+    # One frame shared by all clients (serialized at most once per wire format);
+    # buffered for replay even if nobody is listening now
+    REPLAY.stamp(message)
+    frame = Frame(message)
+    REPLAY.append(frame)
     if not CONNECTED_CLIENTS:
-        logging.warning("No WebSocket clients connected to broadcast message.")
+        if LOG_MESSAGES:
+            logging.info("No WebSocket clients connected to broadcast message.")
+        return
+
+    targets = SUBSCRIPTIONS.match(message)
+    if not targets:
         return
 
-    message_json = json.dumps(message)
-    # Send to all connected clients
-    disconnected_clients = set()
-    for websocket in CONNECTED_CLIENTS:
+    source = message.get("source")
+    if CONFLATE_HZ > 0 and message.get("type") == "reading" and source is not None:
+        # Readings wait for the next flush; alerts below are never conflated
+        for client in targets:
+            CONFLATOR.offer(client, source, frame)
+    else:
+        laggards = [client for client in targets if not client.enqueue(frame)]
+        for client in laggards:
+            disconnect_laggard(client)
+    METRICS.fanout.observe(time.monotonic() - frame.created)
+    if LOG_MESSAGES:
+        logging.info(f"Broadcast queued for {len(targets)} of {len(CONNECTED_CLIENTS)} clients")
+
+async def client_stats() -> list:
+    """Snapshot of per-client queue depth and counters."""
+    return [client.stats() for client in CONNECTED_CLIENTS.values()]
+
+
+HTTP_STATUS_TEXT = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+                    411: "Length Required", 413: "Payload Too Large", 500: "Internal Server Error",
+                    501: "Not Implemented"}
+HTTP_MAX_BODY = int(os.getenv("HTTP_MAX_BODY_BYTES", str(16 * 1024 * 1024)))
+HTTP_IDLE_TIMEOUT_S = float(os.getenv("HTTP_IDLE_TIMEOUT_S", "60"))
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+async def write_http_response(writer, status: int, payload, keep_alive: bool, content_type="application/json"):
+    """Writes one HTTP/1.1 response; payload is JSON-encoded unless it is already bytes."""
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    head = (f"HTTP/1.1 {status} {HTTP_STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    writer.write(head.encode('latin-1') + body)
+    await writer.drain()
+
+async def handle_broadcast_post(body: bytes) -> dict:
+    """Broadcasts a JSON message, or each message of a JSON array, in order."""
+    try:
+        data = json.loads(body.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        logging.error("Invalid JSON received via HTTP POST.")
+        raise HTTPError(400, "Invalid JSON")
+    messages = data if isinstance(data, list) else [data]
+    if not all(isinstance(m, dict) for m in messages):
+        raise HTTPError(400, "Each message must be a JSON object")
+
+    for message in messages:
+        # Sequence numbers are assigned by this relay only; a posted `seq` could skip or jam the counter
+        message.pop("seq", None)
+        METRICS.count(METRICS.received, message.get("type"))
+
+    if BROKER is not None:
+        # Workers own the clients; hand the batch to all of them
+        await BROKER.publish(messages)
+        return {"status": "success", "message": "Broadcast published", "count": len(messages)}
+
+    for i, message in enumerate(messages, 1):
+        if LOG_MESSAGES:
+            logging.info(f"Received HTTP POST for broadcast: {message.get('type', 'unknown')}")
+        await broadcast_message(message)
+        if i % 64 == 0:
+            await asyncio.sleep(0) # Let client writers drain between slices of a large batch
+    return {"status": "success", "message": "Broadcast scheduled", "count": len(messages)}
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+async def handle_http_request(method: str, path: str, body: bytes):
+    """Routes one request; returns (status, payload, content_type)."""
+    route = path.split("?", 1)[0].rstrip("/") or "/"
+    if route == "/metrics":
+        if method != "GET":
+            raise HTTPError(405, "Use GET")
+        snapshot = await BROKER.metrics() if BROKER is not None else METRICS.snapshot()
+        return 200, RelayMetrics.render(snapshot), PROMETHEUS_CONTENT_TYPE
+    if route == "/clients":
+        if method != "GET":
+            raise HTTPError(405, "Use GET")
+        stats = await BROKER.client_stats() if BROKER is not None else await client_stats()
+        return 200, {"clients": stats}, "application/json"
+    if route in ("/", "/broadcast"):
+        if method != "POST":
+            raise HTTPError(405, "Use POST")
+        return 200, await handle_broadcast_post(body), "application/json"
+    raise HTTPError(404, "Not found")
+
+async def http_connection_handler(reader, writer):
+    """Serves HTTP/1.1 requests on one keep-alive connection, directly on the event loop.
+
+    The backend can reuse a single connection for many POSTs, each carrying one
+    message or a JSON array of messages; there is no thread hand-off.
+    """
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HTTP_IDLE_TIMEOUT_S)
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                return
+            except asyncio.LimitOverrunError:
+                await write_http_response(writer, 413, {"status": "error", "message": "Headers too large"}, False)
+                return
+
+            lines = head.decode('latin-1').split("\r\n")
+            try:
+                method, path, version = lines[0].split(" ", 2)
+            except ValueError:
+                await write_http_response(writer, 400, {"status": "error", "message": "Bad request line"}, False)
+                return
+            headers = {}
+            for line in lines[1:]:
+                if ":" in line:
+                    name, value = line.split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+            content_type = "application/json"
+            try:
+                if "chunked" in headers.get("transfer-encoding", "").lower():
+                    raise HTTPError(501, "Chunked request bodies are not supported")
+                try:
+                    length = int(headers.get("content-length", "0"))
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    keep_alive = False # Cannot tell where this body ends
+                    raise HTTPError(400, "Bad Content-Length")
+                if length > HTTP_MAX_BODY:
+                    keep_alive = False # The unread body would corrupt the next request
+                    raise HTTPError(413, "Body too large")
+                body = await reader.readexactly(length) if length else b""
+                status, payload, content_type = await handle_http_request(method.upper(), path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"status": "error", "message": str(e)}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                return
+            except Exception as e:
+                logging.error(f"Error handling HTTP {method} {path}: {e}")
+                status, payload = 500, {"status": "error", "message": str(e)}
+
+            await write_http_response(writer, status, payload, keep_alive, content_type)
+            if not keep_alive:
+                return
+    finally:
+        writer.close()
+
+class Broker:
+    """Local pub/sub hub for multi-process mode.
+
+    Worker processes connect over a Unix-domain socket. Each published batch is written
+    once per worker as a newline-delimited JSON frame; workers answer stats and metrics
+    requests on the same connection. Awaiting drain() pushes back on the HTTP poster when a worker
+    falls behind instead of buffering without bound in the broker.
+    """
+
+    def __init__(self):
+        self.workers = set()
+        self.pending = {} # request id -> _Replies collecting worker answers
+        self.next_id = 0
+
+    async def handle_worker(self, reader, writer):
+        self.workers.add(writer)
+        logging.info(f"Relay worker attached. Workers: {len(self.workers)}")
         try:
-            await websocket.send(message_json)
-            logging.info(f"Broadcasted to {websocket.remote_address}: {message['type']}")
-        except websockets.exceptions.ConnectionClosed:
-            logging.warning(f"Client {websocket.remote_address} found disconnected during broadcast.")
-            disconnected_clients.add(websocket)
-        except Exception as e:
-            logging.error(f"Error broadcasting to {websocket.remote_address}: {e}")
-            disconnected_clients.add(websocket)
-    
-    # Clean up disconnected clients
-    for client in disconnected_clients:
-        CONNECTED_CLIENTS.remove(client)
-    logging.info(f"Broadcast complete. Remaining clients: {len(CONNECTED_CLIENTS)}")
-
-
-class HTTPBroadcastHandler(BaseHTTPRequestHandler):
-    """Handles HTTP POST requests to broadcast messages."""
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
+            async for line in reader:
+                reply = json.loads(line)
+                waiter = self.pending.get(reply.get("id"))
+                if waiter is not None:
+                    waiter.append(reply["result"])
+                    if len(waiter) >= waiter.expected:
+                        waiter.done.set()
+        except (ConnectionError, json.JSONDecodeError) as e:
+            logging.error(f"Relay worker connection failed: {e}")
+        finally:
+            self.workers.discard(writer)
+            writer.close()
+            logging.warning(f"Relay worker detached. Workers: {len(self.workers)}")
+
+    async def _send(self, frame: dict):
+        line = (json.dumps(frame) + "\n").encode('utf-8')
+        workers = list(self.workers)
+        for writer in workers:
+            writer.write(line)
+        for writer in workers:
+            try:
+                await writer.drain()
+            except ConnectionError:
+                self.workers.discard(writer)
+        return len(workers)
+
+    async def publish(self, messages: list):
+        # Sequence numbers are assigned here so every worker's replay buffer agrees
+        for message in messages:
+            REPLAY.stamp(message)
+        await self._send({"messages": messages})
+
+    async def _gather(self, kind: str) -> list:
+        """Asks every worker for `kind` ("stats" or "metrics") and returns their answers."""
+        self.next_id += 1
+        request_id = self.next_id
+        waiter = _Replies(len(self.workers))
+        self.pending[request_id] = waiter
         try:
-            message = json.loads(post_data.decode('utf-8'))
-            logging.info(f"Received HTTP POST for broadcast: {message.get('type', 'unknown')}")
-            
-            # Schedule the broadcast in the asyncio event loop
-            asyncio.run_coroutine_threadsafe(broadcast_message(message), asyncio.get_event_loop())
-            
-            self.send_response(200)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "success", "message": "Broadcast scheduled"}).encode('utf-8'))
-        except json.JSONDecodeError:
-            self.send_response(400)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "error", "message": "Invalid JSON"}).encode('utf-8'))
-            logging.error("Invalid JSON received via HTTP POST.")
-        except Exception as e:
-            self.send_response(500)
-            self.send_header('Content-type', 'application/json')
-            self.end_headers()
-            self.wfile.write(json.dumps({"status": "error", "message": str(e)}).encode('utf-8'))
-            logging.error(f"Error handling HTTP POST: {e}")
-
-def run_http_server(host, port):
-    """Runs the HTTP server in a separate thread."""
-    server_address = (host, port)
-    httpd = HTTPServer(server_address, HTTPBroadcastHandler)
-    logging.info(f"HTTP Broadcast Server listening on http://{host}:{port}")
-    httpd.serve_forever()
+            if await self._send({"request": request_id, "kind": kind}):
+                await asyncio.wait_for(waiter.done.wait(), 5)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.pending.pop(request_id, None)
+        return list(waiter)
+
+    async def client_stats(self) -> list:
+        """Collects per-client stats from every worker, tagged with the worker's pid."""
+        return [client for clients in await self._gather("stats") for client in clients]
+
+    async def metrics(self) -> dict:
+        """The broker's own counters (messages received) merged with every worker's."""
+        return RelayMetrics.merge([METRICS.snapshot(), *await self._gather("metrics")])
+
+class _Replies(list):
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self.done = asyncio.Event()
+
+# Set in the broker process only
+BROKER = None
+
+def select_subprotocol(connection, offered):
+    """Picks the client's first supported protocol; clients offering none get JSON instead of a 400."""
+    return next((protocol for protocol in offered if protocol in SUBPROTOCOLS), None)
+
+def serve_websockets(host, port, **kwargs):
+    """Starts the WebSocket listener with the configured compression and wire protocols."""
+    return websockets.serve(websocket_handler, host, port, select_subprotocol=select_subprotocol,
+                            compression=None if WS_COMPRESSION == "none" else "deflate", **kwargs)
+
+async def worker_main(index: int):
+    """Serves a share of the WebSocket clients and relays the broker's broadcasts to them."""
+    ws_server = await serve_websockets("0.0.0.0", WEBSOCKET_PORT, reuse_port=True)
+    reader, writer = await asyncio.open_unix_connection(BROKER_SOCKET, limit=2 * HTTP_MAX_BODY)
+    logging.info(f"Relay worker {index} (pid {os.getpid()}) listening on ws://0.0.0.0:{WEBSOCKET_PORT}")
+    try:
+        async for line in reader:
+            frame = json.loads(line)
+            if "request" in frame:
+                if frame["kind"] == "metrics":
+                    result = METRICS.snapshot()
+                else:
+                    result = [dict(client, worker=os.getpid()) for client in await client_stats()]
+                writer.write((json.dumps({"id": frame["request"], "result": result}) + "\n").encode('utf-8'))
+                continue
+            for i, message in enumerate(frame["messages"], 1):
+                await broadcast_message(message)
+                if i % 64 == 0:
+                    await asyncio.sleep(0)
+    finally:
+        # Broker gone: stop serving so the supervisor notices
+        ws_server.close()
+        logging.warning(f"Relay worker {index} lost the broker; exiting")
+
+def run_worker(index: int):
+    try:
+        asyncio.run(worker_main(index))
+    except KeyboardInterrupt:
+        pass
+
+async def broker_main():
+    global BROKER
+    BROKER = Broker()
+    broker_server = await asyncio.start_unix_server(BROKER.handle_worker, BROKER_SOCKET, limit=2 * HTTP_MAX_BODY)
+
+    # Spawned rather than forked so workers start with a clean event loop
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=run_worker, args=(i,), daemon=True) for i in range(WS_WORKERS)]
+    for worker in workers:
+        worker.start()
+    logging.info(f"Started {WS_WORKERS} relay workers sharing ws://0.0.0.0:{WEBSOCKET_PORT}")
+
+    http_server = await asyncio.start_server(http_connection_handler, "0.0.0.0", HTTP_BROADCAST_PORT)
+    logging.info(f"HTTP Broadcast Server listening on http://0.0.0.0:{HTTP_BROADCAST_PORT}")
+
+    try:
+        async with broker_server, http_server:
+            while all(worker.is_alive() for worker in workers):
+                await asyncio.sleep(1)
+            logging.critical("A relay worker exited; shutting down")
+    finally:
+        for worker in workers:
+            worker.terminate()
 
 async def main():
+    if WS_WORKERS > 1:
+        await broker_main()
+        return
+
     # Start WebSocket server
-    ws_server = await websockets.serve(websocket_handler, "0.0.0.0", 8001)
-    logging.info("WebSocket Server listening on ws://0.0.0.0:8001")
+    ws_server = await serve_websockets("0.0.0.0", WEBSOCKET_PORT)
+    logging.info(f"WebSocket Server listening on ws://0.0.0.0:{WEBSOCKET_PORT}")
 
-    # Start HTTP server in a separate thread
-    http_thread = threading.Thread(target=run_http_server, args=("0.0.0.0", 8002))
-    http_thread.daemon = True # Allow main program to exit even if thread is running
-    http_thread.start()
+    # Start the HTTP broadcast ingress on the same event loop
+    http_server = await asyncio.start_server(http_connection_handler, "0.0.0.0", HTTP_BROADCAST_PORT)
+    logging.info(f"HTTP Broadcast Server listening on http://0.0.0.0:{HTTP_BROADCAST_PORT}")
 
-    await ws_server.wait_closed()
+    async with http_server:
+        await ws_server.wait_closed()
 
 if __name__ == "__main__":
     # Ensure there's an event loop for asyncio.run